@@ -0,0 +1,80 @@
+import random
+from datetime import date, timedelta
+from typing import List
+
+from sqlalchemy import func, insert, select, update
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from model.entities.hospital import Hospital
+from model.entities.patient import CancerType, Patient
+from model.entities.table_version import TableVersion
+
+CANCER_TYPES = list(CancerType)
+FIRST_BIRTH_DATE = date(1930, 1, 1)
+
+def _patients(rng: random.Random, start: int, count: int, hospitals: int, assigned_ratio: float) -> List[dict]:
+    rows = []
+    for i in range(start, start + count):
+        oncological = rng.random() < 0.3
+        age = rng.randint(0, 95)
+        rows.append({
+            "id": i,
+            "name": f"Patient {i}",
+            "age": age,
+            "oncological": oncological,
+            "birth_date": FIRST_BIRTH_DATE + timedelta(days=rng.randint(0, 35000)),
+            "cancer_type": rng.choice(CANCER_TYPES) if oncological else None,
+            "hospital_id": rng.randint(1, hospitals) if hospitals and rng.random() < assigned_ratio else None,
+        })
+    return rows
+
+async def is_empty(engine: AsyncEngine) -> bool:
+    async with engine.connect() as conn:
+        return not (await conn.scalar(select(func.count()).select_from(Hospital))) \
+            and not (await conn.scalar(select(func.count()).select_from(Patient)))
+
+async def reset(engine: AsyncEngine) -> None:
+    async with engine.begin() as conn:
+        await conn.execute(Patient.__table__.delete())
+        await conn.execute(Hospital.__table__.delete())
+        await conn.execute(update(TableVersion).values(version=TableVersion.version + 1))
+
+async def seed(
+    engine: AsyncEngine,
+    hospitals: int,
+    patients: int,
+    assigned_ratio: float = 0.8,
+    batch_size: int = 5000,
+    random_seed: int = 42,
+) -> None:
+    """
+    Fill an empty database with `hospitals` hospitals and `patients` patients.
+
+    Data is generated from a fixed seed so runs are comparable. Capacities leave
+    room for the assignment scenarios, and occupancy counters are computed from
+    the inserted rows in one UPDATE at the end.
+    """
+    rng = random.Random(random_seed)
+    per_hospital = patients // hospitals if hospitals else 0
+    async with engine.begin() as conn:
+        for start in range(1, hospitals + 1, batch_size):
+            await conn.execute(insert(Hospital), [
+                {"id": i, "name": f"Hospital {i}", "address": f"{i} Benchmark Street", "capacity": per_hospital * 2 + 100}
+                for i in range(start, min(start + batch_size, hospitals + 1))
+            ])
+    for start in range(1, patients + 1, batch_size):
+        count = min(batch_size, patients + 1 - start)
+        async with engine.begin() as conn:
+            await conn.execute(insert(Patient), _patients(rng, start, count, hospitals, assigned_ratio))
+    async with engine.begin() as conn:
+        occupancy = (
+            select(func.count())
+            .where(Patient.hospital_id == Hospital.id)
+            .scalar_subquery()
+        )
+        await conn.execute(update(Hospital).values(current_patients=occupancy))
+        if engine.dialect.name == "postgresql":
+            # Explicit ids bypass the sequences; move them past the seeded rows
+            for table in ("hospitals", "patients"):
+                await conn.exec_driver_sql(f"SELECT setval(pg_get_serial_sequence('{table}', 'id'), (SELECT coalesce(max(id), 0) + 1 FROM {table}), false)")
+                await conn.exec_driver_sql(f"ANALYZE {table}")
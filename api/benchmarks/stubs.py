@@ -0,0 +1,89 @@
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List
+
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
+from jose import jwk, jwt
+
+REGION = "us-east-1"
+USER_POOL_ID = "benchmark-pool"
+APP_CLIENT_ID = "benchmark-client"
+ISSUER = f"https://cognito-idp.{REGION}.amazonaws.com/{USER_POOL_ID}"
+KEY_ID = "benchmark-kid"
+
+class AuthStub:
+    """
+    Local stand-in for Cognito: serves the JWKS document and answers InitiateAuth.
+
+    Tokens are signed with a throwaway RSA key, so the API verifies them through
+    its real code path (JWKS fetch, RS256 check, token cache).
+    """
+
+    def __init__(self):
+        self._private_key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+        self._private_pem = self._private_key.private_bytes(
+            serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8, serialization.NoEncryption()
+        )
+        public_pem = self._private_key.public_key().public_bytes(
+            serialization.Encoding.PEM, serialization.PublicFormat.SubjectPublicKeyInfo
+        )
+        public_jwk = jwk.construct(public_pem, "RS256").to_dict()
+        self.jwks = {"keys": [dict(public_jwk, kid=KEY_ID, alg="RS256", use="sig")]}
+        self._server = None
+
+    def mint_token(self, subject: str, ttl: int = 24 * 3600) -> str:
+        claims = {"sub": subject, "iss": ISSUER, "aud": APP_CLIENT_ID, "token_use": "id", "exp": int(time.time()) + ttl}
+        return jwt.encode(claims, self._private_pem, algorithm="RS256", headers={"kid": KEY_ID})
+
+    def mint_tokens(self, users: int) -> List[str]:
+        return [self.mint_token(f"benchmark-user-{i}") for i in range(users)]
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self._server.server_port}"
+
+    def start(self) -> None:
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def _reply(self, body: dict, content_type: str):
+                payload = json.dumps(body).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def do_GET(self):
+                self._reply(stub.jwks, "application/json")
+
+            def do_POST(self):
+                request = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+                token = stub.mint_token(request["AuthParameters"]["USERNAME"])
+                self._reply({"AuthenticationResult": {"AccessToken": token, "IdToken": token}}, "application/x-amz-json-1.1")
+
+            def log_message(self, *args):
+                pass
+
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+
+    def stop(self) -> None:
+        if self._server is not None:
+            self._server.shutdown()
+            self._server = None
+
+    def api_environment(self) -> Dict[str, str]:
+        """Environment pointing the API's token verification and logins at this stub."""
+        return {
+            "AWS_REGION": REGION,
+            "USER_POOL_ID": USER_POOL_ID,
+            "APP_CLIENT_ID": APP_CLIENT_ID,
+            "JWKS_URL": f"{self.url}/.well-known/jwks.json",
+            "COGNITO_ENDPOINT_URL": self.url,
+            "AWS_ACCESS_KEY_ID": "benchmark",
+            "AWS_SECRET_ACCESS_KEY": "benchmark",
+        }
@@ -1,9 +1,24 @@
 # FastAPI app
 from contextlib import asynccontextmanager
-from fastapi import FastAPI
+from fastapi import Depends, FastAPI, Response, status
 from fastapi.middleware.cors import CORSMiddleware
-from model.entities.database import shutdown, startup
-from routers import auth_router, hospital_router, patient_router
+from fastapi.responses import JSONResponse
+from prometheus_client import CONTENT_TYPE_LATEST, generate_latest
+from model.entities.database import engine, shutdown, startup
+from routers import auth_router, change_router, hospital_router, job_router, patient_router, stats_router
+from service.auth_service import key_store, token_cache, verify_token
+from service.cache_service import response_cache
+from service.change_feed_service import change_feed
+from service.compression_utils import CompressionMiddleware
+from service.job_service import job_runner
+from service.lifecycle_service import Lifecycle
+from service.metrics_service import MetricsMiddleware, instrument_engine, register_caches
+from service.rate_limit_service import RateLimitMiddleware, admission, rate_limit_backend
+from service import query_inspection_service
+
+lifecycle = Lifecycle(key_store)
+instrument_engine(engine)
+register_caches({"responses": response_cache.stats, "tokens": token_cache.stats})
 
 
 # Create FastAPI app
@@ -13,12 +28,21 @@ async def lifespan(app: FastAPI):
     Lifespan context manager for FastAPI application.
     
     Handles startup and shutdown events for the application:
-    - Startup: Initializes database connection
-    - Shutdown: Closes database connection
+    - Startup: Verifies the schema version, warms up the connection pool and JWKS cache,
+      then starts the change feed and the background job runner, which resumes
+      unfinished jobs
+    - Shutdown: Runs once uvicorn has finished the in-flight requests; ends the
+      change feed, interrupts running jobs (handed back to be resumed), then
+      closes the database pool
     """
-    startup()
+    await lifecycle.start(startup)
+    await change_feed.start(engine)
+    await job_runner.start()
     yield
-    shutdown()
+    await change_feed.stop()
+    await job_runner.stop()
+    await shutdown()
+    await key_store.aclose()
 
 
 app = FastAPI(
@@ -28,6 +52,10 @@ app = FastAPI(
     lifespan=lifespan
 )
 
+# Per-client rate limits and the global concurrency cap; added first so CORS answers
+# preflights itself and adds its headers to the 429 and 503 responses
+app.add_middleware(RateLimitMiddleware, backend=rate_limit_backend, admission=admission, token_cache=token_cache, key_store=key_store)
+
 # CORS middleware
 app.add_middleware(
     CORSMiddleware,
@@ -35,12 +63,22 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "ETag", "Retry-After"],
 )
+app.add_middleware(CompressionMiddleware)
+app.add_middleware(MetricsMiddleware)
+if query_inspection_service.QUERY_INSPECTION:
+    # Opt-in: logs N+1 patterns, slow queries with their plan and requests over QUERY_BUDGET
+    query_inspection_service.instrument_engine(engine)
+    app.add_middleware(query_inspection_service.QueryInspectionMiddleware)
 
 # Include routers
 app.include_router(auth_router.router, prefix="/auth")
 app.include_router(patient_router.router, prefix="/patients", tags=["Patients"])
 app.include_router(hospital_router.router, prefix="/hospitals")
+app.include_router(stats_router.router, prefix="/stats")
+app.include_router(job_router.router, prefix="/jobs")
+app.include_router(change_router.router, prefix="/changes")
 
 # Root endpoint
 @app.get("/", tags=["General"])
@@ -57,10 +95,11 @@ async def root():
 @app.get("/health", tags=["General"])
 async def health_check():
     """
-    Health check endpoint to verify API status.
+    Readiness check used by the load balancer to route traffic to this instance.
     
-    This endpoint is used to monitor the health and availability of the API service.
-    It returns the current status of the service.
+    The service reports ready once the database schema was verified, the connection
+    pool is warm and the JWKS signing keys are cached. It returns 503 while starting
+    up; on shutdown uvicorn stops accepting connections.
     
     Returns:
         dict: A dictionary containing:
@@ -68,12 +107,55 @@ async def health_check():
             - service: Service status
             - message: Descriptive message about the service state
     """
+    if not await lifecycle.check_ready():
+        return JSONResponse(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            content={
+                "status": "unhealthy",
+                "service": "starting",
+                "message": "Service is not ready to receive traffic"
+            },
+        )
     return {
         "status": "healthy",
         "service": "up",
         "message": "Service is running"
     }
 
+# Liveness check endpoint
+@app.get("/health/live", tags=["General"])
+async def liveness_check():
+    """
+    Liveness check: the process is up and serving, whether or not it is ready.
+    
+    Returns:
+        dict: The service status.
+    """
+    return {"status": "alive"}
+
+# Metrics endpoint
+@app.get("/metrics", tags=["General"], include_in_schema=False)
+async def metrics():
+    """
+    Prometheus metrics of this process: per-route request counts, errors and latency,
+    SQL statements per request, connection pool usage, token verification and JWKS
+    fetch timings, and cache hit counters.
+    """
+    return Response(generate_latest(), media_type=CONTENT_TYPE_LATEST)
+
+# Cache statistics endpoint
+@app.get("/cache/stats", tags=["General"])
+async def cache_stats(token: dict = Depends(verify_token)):
+    """
+    Hit-rate statistics of this process's caches.
+    
+    Returns:
+        dict: A dictionary containing:
+            - responses: Response cache backend, hits, misses and hit rate, overall and per namespace
+            - tokens: Verified token cache size, hits and misses
+    """
+    return {"responses": response_cache.stats(), "tokens": token_cache.stats()}
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8000)
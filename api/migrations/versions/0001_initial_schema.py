@@ -0,0 +1,59 @@
+"""Initial hospitals and patients schema
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-18 09:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import context, op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0001'
+down_revision: Union[str, Sequence[str], None] = None
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Deployments that predate migrations already have these tables from create_all
+    existing_tables = [] if context.is_offline_mode() else sa.inspect(op.get_bind()).get_table_names()
+
+    if 'hospitals' not in existing_tables:
+        op.create_table(
+            'hospitals',
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('name', sa.String(), nullable=False),
+            sa.Column('address', sa.String(), nullable=True),
+            sa.Column('capacity', sa.Integer(), nullable=True),
+            sa.PrimaryKeyConstraint('id'),
+        )
+
+    if 'patients' not in existing_tables:
+        op.create_table(
+            'patients',
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('name', sa.String(), nullable=False),
+            sa.Column('age', sa.Integer(), nullable=True),
+            sa.Column('oncological', sa.Boolean(), nullable=False),
+            sa.Column('birth_date', sa.Date(), nullable=True),
+            sa.Column('hospital_id', sa.Integer(), nullable=True),
+            sa.Column('cancer_type', sa.Enum('breast', 'lung', 'colon', 'prostate', 'skin', name='cancertype'), nullable=True),
+            sa.CheckConstraint(
+                "(oncological = TRUE AND cancer_type IS NOT NULL) OR (oncological = FALSE AND cancer_type IS NULL)",
+                name='check_oncological_cancer_type',
+            ),
+            sa.ForeignKeyConstraint(['hospital_id'], ['hospitals.id']),
+            sa.PrimaryKeyConstraint('id'),
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('patients')
+    op.drop_table('hospitals')
+    sa.Enum(name='cancertype').drop(op.get_bind(), checkfirst=True)
@@ -0,0 +1,42 @@
+"""Maintained hospital occupancy counter
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-18 09:10:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import context, op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0002'
+down_revision: Union[str, Sequence[str], None] = '0001'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Databases created by create_all after the column was added already have it
+    if not context.is_offline_mode():
+        columns = {column['name'] for column in sa.inspect(op.get_bind()).get_columns('hospitals')}
+        if 'current_patients' in columns:
+            return
+
+    # A server default makes adding the NOT NULL column a metadata-only change on Postgres
+    op.add_column('hospitals', sa.Column('current_patients', sa.Integer(), server_default='0', nullable=False))
+    op.execute(
+        """
+        UPDATE hospitals SET current_patients = (
+            SELECT count(*) FROM patients WHERE patients.hospital_id = hospitals.id
+        )
+        """
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('hospitals', 'current_patients')
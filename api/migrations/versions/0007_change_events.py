@@ -0,0 +1,42 @@
+"""Change feed events
+
+Revision ID: 0007
+Revises: 0006
+Create Date: 2026-10-18 18:10:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0007'
+down_revision: Union[str, Sequence[str], None] = '0006'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        'change_events',
+        sa.Column('id', sa.BigInteger(), autoincrement=False, nullable=False),
+        sa.Column('table_name', sa.String(length=32), nullable=False),
+        sa.Column('operation', sa.Enum('created', 'updated', 'deleted', name='changeoperation'), nullable=False),
+        sa.Column('entity_id', sa.Integer(), nullable=False),
+        sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=False),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    op.create_index('ix_change_events_created_at', 'change_events', ['created_at'])
+    # The counter numbering the events
+    op.execute("INSERT INTO table_versions (table_name, version) VALUES ('change_events', 0)")
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.execute("DELETE FROM table_versions WHERE table_name = 'change_events'")
+    op.drop_index('ix_change_events_created_at', table_name='change_events')
+    op.drop_table('change_events')
+    sa.Enum(name='changeoperation').drop(op.get_bind(), checkfirst=True)
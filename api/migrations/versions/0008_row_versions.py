@@ -0,0 +1,36 @@
+"""Row versions for optimistic concurrency
+
+Revision ID: 0008
+Revises: 0007
+Create Date: 2026-10-18 19:20:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import context, op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0008'
+down_revision: Union[str, Sequence[str], None] = '0007'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    for table in ('hospitals', 'patients'):
+        # Databases created by create_all after the column was added already have it
+        if not context.is_offline_mode():
+            columns = {column['name'] for column in sa.inspect(op.get_bind()).get_columns(table)}
+            if 'version' in columns:
+                continue
+        # A server default makes adding the NOT NULL column a metadata-only change on Postgres
+        op.add_column(table, sa.Column('version', sa.Integer(), server_default='1', nullable=False))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('patients', 'version')
+    op.drop_column('hospitals', 'version')
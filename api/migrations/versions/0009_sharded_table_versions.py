@@ -0,0 +1,66 @@
+"""Shard the table version counters
+
+Revision ID: 0009
+Revises: 0008
+Create Date: 2026-10-18 21:40:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import context, op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0009'
+down_revision: Union[str, Sequence[str], None] = '0008'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+VERSIONED_TABLES = ('hospitals', 'patients')
+VERSION_SHARDS = 16
+
+
+def _create_table_versions(*primary_key: str) -> sa.Table:
+    columns = [
+        sa.Column('table_name', sa.String(), nullable=False),
+        sa.Column('version', sa.BigInteger(), server_default='0', nullable=False),
+    ]
+    if 'shard' in primary_key:
+        columns.insert(1, sa.Column('shard', sa.SmallInteger(), server_default='0', nullable=False))
+    return op.create_table('table_versions', *columns, sa.PrimaryKeyConstraint(*primary_key))
+
+
+def _rename_table_versions(new_name: str) -> None:
+    op.rename_table('table_versions', new_name)
+    if context.get_context().dialect.name == 'postgresql':
+        # Free the primary key's name for the rebuilt table
+        op.execute(f"ALTER INDEX table_versions_pkey RENAME TO {new_name}_pkey")
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # The primary key changes, so rebuild the (tiny) table instead of altering it:
+    # this works the same on every dialect and in offline mode
+    _rename_table_versions('table_versions_unsharded')
+    table_versions = _create_table_versions('table_name', 'shard')
+    op.execute(
+        "INSERT INTO table_versions (table_name, shard, version) "
+        "SELECT table_name, 0, version FROM table_versions_unsharded"
+    )
+    op.drop_table('table_versions_unsharded')
+    op.bulk_insert(table_versions, [
+        {'table_name': table, 'shard': shard, 'version': 0}
+        for table in VERSIONED_TABLES for shard in range(1, VERSION_SHARDS)
+    ])
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    _rename_table_versions('table_versions_sharded')
+    _create_table_versions('table_name')
+    op.execute(
+        "INSERT INTO table_versions (table_name, version) "
+        "SELECT table_name, SUM(version) FROM table_versions_sharded GROUP BY table_name"
+    )
+    op.drop_table('table_versions_sharded')
@@ -0,0 +1,40 @@
+"""Leases on background jobs
+
+Revision ID: 0010
+Revises: 0009
+Create Date: 2026-10-18 22:15:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import context, op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0010'
+down_revision: Union[str, Sequence[str], None] = '0009'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+COLUMNS = (
+    sa.Column('claimed_by', sa.String(length=255), nullable=True),
+    sa.Column('lease_expires_at', sa.DateTime(timezone=True), nullable=True),
+)
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    existing = set()
+    # Databases created by create_all after the columns were added already have them
+    if not context.is_offline_mode():
+        existing = {column['name'] for column in sa.inspect(op.get_bind()).get_columns('jobs')}
+    for column in COLUMNS:
+        if column.name not in existing:
+            op.add_column('jobs', column)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    for column in reversed(COLUMNS):
+        op.drop_column('jobs', column.name)
@@ -0,0 +1,33 @@
+"""Storage of background job files
+
+Revision ID: 0011
+Revises: 0010
+Create Date: 2026-10-18 22:50:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import context, op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0011'
+down_revision: Union[str, Sequence[str], None] = '0010'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Databases created by create_all after the column was added already have it
+    if not context.is_offline_mode():
+        columns = {column['name'] for column in sa.inspect(op.get_bind()).get_columns('jobs')}
+        if 'storage_id' in columns:
+            return
+    op.add_column('jobs', sa.Column('storage_id', sa.String(length=32), nullable=True))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('jobs', 'storage_id')
@@ -0,0 +1,78 @@
+"""Number change events from a sequence
+
+Revision ID: 0012
+Revises: 0011
+Create Date: 2026-10-18 23:20:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import context, op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0012'
+down_revision: Union[str, Sequence[str], None] = '0011'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+COUNTER = "(SELECT version FROM table_versions WHERE table_name = 'change_events')"
+
+
+def _create_change_events(name: str, id_type: sa.types.TypeEngine, **kwargs) -> None:
+    op.create_table(
+        name,
+        sa.Column('id', id_type, nullable=False),
+        sa.Column('table_name', sa.String(length=32), nullable=False),
+        sa.Column('operation', sa.Enum('created', 'updated', 'deleted', name='changeoperation'), nullable=False),
+        sa.Column('entity_id', sa.Integer(), nullable=False),
+        sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=False),
+        sa.PrimaryKeyConstraint('id'),
+        **kwargs,
+    )
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    if context.get_context().dialect.name == 'postgresql':
+        # The name BIGSERIAL gives it, as in databases created by create_all
+        op.execute("CREATE SEQUENCE change_events_id_seq OWNED BY change_events.id")
+        op.execute(
+            "SELECT setval('change_events_id_seq', "
+            f"GREATEST(COALESCE({COUNTER}, 0), COALESCE((SELECT MAX(id) FROM change_events), 0)) + 1, false)"
+        )
+        op.execute("ALTER TABLE change_events ALTER COLUMN id SET DEFAULT nextval('change_events_id_seq')")
+    else:
+        # SQLite only numbers an INTEGER PRIMARY KEY, and never reuses ids with
+        # AUTOINCREMENT, so rebuild the table
+        op.drop_index('ix_change_events_created_at', table_name='change_events')
+        op.rename_table('change_events', 'change_events_counted')
+        _create_change_events('change_events', sa.Integer(), sqlite_autoincrement=True)
+        op.execute("INSERT INTO change_events SELECT id, table_name, operation, entity_id, created_at FROM change_events_counted")
+        op.drop_table('change_events_counted')
+        op.create_index('ix_change_events_created_at', 'change_events', ['created_at'])
+        # Continue after the counter even when its events were all pruned
+        op.execute(f"UPDATE sqlite_sequence SET seq = {COUNTER} WHERE name = 'change_events' AND seq < {COUNTER}")
+        op.execute(
+            f"INSERT INTO sqlite_sequence (name, seq) SELECT 'change_events', {COUNTER} "
+            "WHERE NOT EXISTS (SELECT 1 FROM sqlite_sequence WHERE name = 'change_events')"
+        )
+    op.execute("DELETE FROM table_versions WHERE table_name = 'change_events'")
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    if context.get_context().dialect.name == 'postgresql':
+        op.execute(
+            "INSERT INTO table_versions (table_name, shard, version) "
+            "SELECT 'change_events', 0, CASE WHEN is_called THEN last_value ELSE last_value - 1 END FROM change_events_id_seq"
+        )
+        op.execute("ALTER TABLE change_events ALTER COLUMN id DROP DEFAULT")
+        op.execute("DROP SEQUENCE change_events_id_seq")
+    else:
+        # The rebuilt table takes the explicit ids of the counter just as well
+        op.execute(
+            "INSERT INTO table_versions (table_name, shard, version) SELECT 'change_events', 0, "
+            "COALESCE((SELECT seq FROM sqlite_sequence WHERE name = 'change_events'), 0)"
+        )
@@ -0,0 +1,15 @@
+from pydantic import BaseModel
+from typing import Any, Dict, Optional
+from datetime import datetime
+
+from model.entities.change_event import ChangeOperation, ChangeTable
+
+class ChangeEventDTO(BaseModel):
+    id: int
+    table: ChangeTable
+    operation: ChangeOperation
+    entity_id: int
+    # The hospital or patient as `GET /hospitals/{id}` or `GET /patients/{id}` returns it
+    # when the event was read; None once it is deleted
+    data: Optional[Dict[str, Any]] = None
+    created_at: datetime
@@ -1,5 +1,5 @@
-from pydantic import BaseModel, EmailStr
-from typing import Optional, List
+from pydantic import BaseModel, ConfigDict, EmailStr, Field, field_validator
+from typing import Literal, Optional, List
 from datetime import datetime
 
 class HospitalBase(BaseModel):
@@ -13,20 +13,38 @@ class HospitalDTO(HospitalBase):
     updated_at: datetime
     is_active: bool = True
 
-    class Config:
-        from_attributes = True
-        
+    model_config = ConfigDict(from_attributes=True)
+
 class HospitalUpdateDTO(BaseModel):
+    """Partial update: omitted fields keep their value."""
     name: Optional[str] = None
     address: Optional[str] = None
     capacity: Optional[int] = None
-    
+
+    @field_validator("name", "address", "capacity")
+    @classmethod
+    def not_null(cls, value):
+        if value is None:
+            raise ValueError("may be omitted, but not null")
+        return value
+
 class HospitalCreateDTO(HospitalBase):
     pass
 
 class HospitalResponseDTO(HospitalBase):
     id: int
+    current_patients: int = 0
+    version: int
+
+    model_config = ConfigDict(from_attributes=True)
+
+class HospitalAssignPatientsDTO(BaseModel):
+    patient_ids: List[int] = Field(..., min_length=1, max_length=10000)
 
-    class Config:
-        orm_mode = True
+class PatientAssignmentResultDTO(BaseModel):
+    patient_id: int
+    status: Literal["assigned", "already_assigned", "not_found", "over_capacity"]
 
+class HospitalAssignPatientsResponseDTO(BaseModel):
+    assigned: int
+    results: List[PatientAssignmentResultDTO]
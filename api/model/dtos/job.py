@@ -0,0 +1,28 @@
+from pydantic import BaseModel, ConfigDict, Field
+from typing import Any, Dict, List, Optional
+from datetime import datetime
+
+from model.dtos.patient import ExportFormat, PatientFilterDTO
+from model.entities.job import JobKind, JobStatus
+
+class ExportJobDTO(BaseModel):
+    format: ExportFormat = ExportFormat.ndjson
+    filters: PatientFilterDTO = Field(default_factory=PatientFilterDTO)
+
+class ReassignJobDTO(BaseModel):
+    hospital_id: int
+    patient_ids: List[int] = Field(..., min_length=1, max_length=1000000)
+
+class JobDTO(BaseModel):
+    id: str
+    kind: JobKind
+    status: JobStatus
+    progress: int
+    total: Optional[int] = None
+    result: Optional[Dict[str, Any]] = None
+    error: Optional[str] = None
+    created_at: datetime
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+
+    model_config = ConfigDict(from_attributes=True)
@@ -1,6 +1,7 @@
-from pydantic import BaseModel
-from typing import Optional
+from pydantic import BaseModel, ConfigDict, Field, field_validator
+from typing import List, Literal, Optional
 from datetime import date
+from enum import Enum
 
 from model.entities.patient import CancerType
 
@@ -15,12 +16,31 @@ class PatientCreateDTO(PatientBaseDTO):
     pass
 
 class PatientUpdateDTO(BaseModel):
+    """Partial update: omitted fields keep their value; only `cancer_type` may be set to null."""
     name: Optional[str] = None
     age: Optional[int] = None
     oncological:Optional[bool] = None
     birth_date:Optional[date]= None
     cancer_type: Optional[CancerType] = None
 
+    @field_validator("name", "age", "oncological", "birth_date")
+    @classmethod
+    def not_null(cls, value):
+        if value is None:
+            raise ValueError("may be omitted, but not null")
+        return value
+
+class PatientFilterDTO(BaseModel):
+    oncological: Optional[bool] = None
+    cancer_type: Optional[CancerType] = None
+    hospital_id: Optional[int] = None
+    min_age: Optional[int] = Field(None, ge=0)
+    max_age: Optional[int] = Field(None, ge=0)
+
+class ExportFormat(str, Enum):
+    ndjson = "ndjson"
+    csv = "csv"
+
 class PatientResponseDTO(PatientBaseDTO):
     id: int
     hospital_id: Optional[int] = None 
@@ -29,16 +49,34 @@ class PatientResponseDTO(PatientBaseDTO):
     oncological:bool
     birth_date:date
     cancer_type: Optional[CancerType] 
+    version: int
 
-    class Config:
-        orm_mode = True
-        schema_extra = {
+    model_config = ConfigDict(
+        from_attributes=True,
+        json_schema_extra={
             "example": {
                 "id": 1,
                 "name": "John Doe",
                 "age": 30,
                 "hospital_id": 2,
                 "oncological": True,
-                "birth_date": "1993-05-20"
+                "birth_date": "1993-05-20",
+                "cancer_type": "Lung",
+                "version": 1
             }
-        }
\ No newline at end of file
+        },
+    )
+
+class PatientSearchResultDTO(PatientResponseDTO):
+    score: float = Field(..., description="Similarity of the name to the query, from 0 to 1")
+
+class PatientBulkResultDTO(BaseModel):
+    index: int
+    status: Literal["created", "error"]
+    id: Optional[int] = None
+    error: Optional[str] = None
+
+class PatientBulkResponseDTO(BaseModel):
+    created: int
+    failed: int
+    results: List[PatientBulkResultDTO]
@@ -0,0 +1,28 @@
+from pydantic import BaseModel
+from typing import Dict, List, Optional
+
+from model.entities.patient import CancerType
+
+class CancerTypeCountDTO(BaseModel):
+    cancer_type: CancerType
+    patients: int
+
+class RegistryStatsDTO(BaseModel):
+    hospitals: int
+    total_capacity: int
+    patients: int
+    assigned_patients: int
+    unassigned_patients: int
+    oncological_patients: int
+    occupancy_rate: Optional[float] = None
+    by_cancer_type: List[CancerTypeCountDTO]
+
+class HospitalStatsDTO(BaseModel):
+    id: int
+    name: str
+    capacity: Optional[int] = None
+    patients: int
+    free_beds: Optional[int] = None
+    occupancy_rate: Optional[float] = None
+    oncological_patients: int
+    by_cancer_type: Dict[CancerType, int]
@@ -0,0 +1,30 @@
+from enum import Enum
+from sqlalchemy import BigInteger, Column, DateTime, Index, Integer, String, func
+from sqlalchemy import Enum as SqlEnum
+from .base import Base
+
+class ChangeTable(str, Enum):
+    hospitals = "hospitals"
+    patients = "patients"
+
+class ChangeOperation(str, Enum):
+    created = "created"
+    updated = "updated"
+    deleted = "deleted"
+
+class ChangeEvent(Base):
+    __tablename__ = 'change_events'
+
+    # Taken from a sequence (AUTOINCREMENT on SQLite, so pruning never lets an id be
+    # reused). Concurrent writers may commit out of id order; the ChangeFeed only
+    # moves past a missing id once the transaction holding it can no longer commit
+    id = Column(BigInteger().with_variant(Integer, "sqlite"), primary_key=True, autoincrement=True)
+    table_name = Column(String(32), nullable=False)
+    operation = Column(SqlEnum(ChangeOperation), nullable=False)
+    entity_id = Column(Integer, nullable=False)
+    created_at = Column(DateTime(timezone=True), nullable=False, server_default=func.now())
+
+    __table_args__ = (
+        Index("ix_change_events_created_at", "created_at"),
+        {"sqlite_autoincrement": True},
+    )
@@ -1,23 +1,82 @@
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
+from alembic.runtime.migration import MigrationContext
+from alembic.script import ScriptDirectory
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncEngine, AsyncSession, async_sessionmaker, create_async_engine
 from .base import Base
 
 # Database Configuration for RDS
+import asyncio
 import os
 
-DATABASE_URL = f"postgresql+psycopg2://{os.getenv('RDS_USERNAME')}:{os.getenv('RDS_PASSWORD')}@{os.getenv('RDS_ENDPOINT')}:5432/{os.getenv('RDS_DB_NAME')}"
-engine = create_engine(DATABASE_URL)
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+DATABASE_URL = os.getenv("DATABASE_URL") or f"postgresql+asyncpg://{os.getenv('RDS_USERNAME')}:{os.getenv('RDS_PASSWORD')}@{os.getenv('RDS_ENDPOINT')}:5432/{os.getenv('RDS_DB_NAME')}"
 
-def startup():
-    Base.metadata.create_all(engine)
+# Connection pool configuration
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "10"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "20"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "true").lower() in ("1", "true", "yes")
+DB_STATEMENT_TIMEOUT_MS = int(os.getenv("DB_STATEMENT_TIMEOUT_MS", "30000"))
 
-def shutdown():
-    Base.metadata.drop_all(engine)
+# Startup checks
+DB_SCHEMA_CHECK = os.getenv("DB_SCHEMA_CHECK", "true").lower() in ("1", "true", "yes")
+DB_POOL_WARMUP = int(os.getenv("DB_POOL_WARMUP", str(DB_POOL_SIZE)))
+MIGRATIONS_DIR = os.path.normpath(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "migrations"))
 
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close() 
\ No newline at end of file
+def engine_options(url: str = DATABASE_URL) -> dict:
+    """Build the create_async_engine keyword arguments for the given database URL."""
+    if url.startswith("sqlite"):
+        # SQLite has no server side pool or statement timeout to configure
+        return {}
+    options = {
+        "pool_size": DB_POOL_SIZE,
+        "max_overflow": DB_MAX_OVERFLOW,
+        "pool_timeout": DB_POOL_TIMEOUT,
+        "pool_recycle": DB_POOL_RECYCLE,
+        "pool_pre_ping": DB_POOL_PRE_PING,
+    }
+    if DB_STATEMENT_TIMEOUT_MS > 0:
+        options["connect_args"] = {"server_settings": {"statement_timeout": str(DB_STATEMENT_TIMEOUT_MS)}}
+    return options
+
+engine = create_async_engine(DATABASE_URL, **engine_options())
+AsyncSessionLocal = async_sessionmaker(bind=engine, class_=AsyncSession, autoflush=False, expire_on_commit=False)
+
+class SchemaVersionError(RuntimeError):
+    """The database is not at the migration revision this build expects."""
+
+async def verify_schema_version(conn: AsyncConnection) -> None:
+    """Check the database's Alembic revision against the migration heads shipped with the app."""
+    expected = set(ScriptDirectory(MIGRATIONS_DIR).get_heads())
+    current = set(await conn.run_sync(lambda sync_conn: MigrationContext.configure(sync_conn).get_current_heads()))
+    if current != expected:
+        raise SchemaVersionError(
+            f"Database schema is at {sorted(current) or 'no revision'}, expected {sorted(expected)}; "
+            "run `alembic upgrade head` before starting the API."
+        )
+
+async def warm_up_pool(db_engine: AsyncEngine = engine, connections: int = DB_POOL_WARMUP) -> None:
+    """Open `connections` pooled connections concurrently so the first requests skip the connect handshake."""
+    async def ping():
+        async with db_engine.connect() as conn:
+            await conn.execute(text("SELECT 1"))
+    await asyncio.gather(*(ping() for _ in range(max(connections, 1))))
+
+async def startup():
+    """Verify the schema version and warm up the connection pool; the schema itself is owned by Alembic."""
+    if DB_SCHEMA_CHECK:
+        async with engine.connect() as conn:
+            await verify_schema_version(conn)
+    await warm_up_pool()
+
+async def shutdown():
+    await engine.dispose()
+
+async def get_db():
+    """Yield a session scoped to a single request, rolling it back if the request fails."""
+    async with AsyncSessionLocal() as db:
+        try:
+            yield db
+        except Exception:
+            await db.rollback()
+            raise
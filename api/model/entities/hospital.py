@@ -9,9 +9,9 @@ class Hospital(Base):
     name = Column(String, nullable=False)
     address = Column(String)
     capacity = Column(Integer)
+    # Maintained by service.occupancy_service so admissions never count patients
+    current_patients = Column(Integer, nullable=False, default=0, server_default="0")
+    # Row version for optimistic concurrency (If-Match); every write to the row increments it
+    version = Column(Integer, nullable=False, default=1, server_default="1")
 
-    patients = relationship("Patient", back_populates="hospital") 
-
-    @property
-    def current_patients(self):
-        return len(self.patients)
\ No newline at end of file
+    patients = relationship("Patient", back_populates="hospital") 
\ No newline at end of file
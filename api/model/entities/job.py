@@ -0,0 +1,43 @@
+from enum import Enum
+from sqlalchemy import JSON, Column, DateTime, Index, Integer, String, Text, func
+from sqlalchemy import Enum as SqlEnum
+from .base import Base
+
+class JobKind(str, Enum):
+    export = "export"
+    bulk_import = "bulk_import"
+    reassign = "reassign"
+
+class JobStatus(str, Enum):
+    queued = "queued"
+    running = "running"
+    succeeded = "succeeded"
+    failed = "failed"
+
+class Job(Base):
+    __tablename__ = 'jobs'
+
+    id = Column(String(32), primary_key=True)
+    kind = Column(SqlEnum(JobKind), nullable=False)
+    status = Column(SqlEnum(JobStatus), nullable=False, default=JobStatus.queued)
+    params = Column(JSON, nullable=False, default=dict)
+    # Units of work committed so far (rows exported, records imported, patients reassigned);
+    # a resumed job continues after them
+    progress = Column(Integer, nullable=False, default=0, server_default="0")
+    total = Column(Integer)
+    result = Column(JSON)
+    error = Column(Text)
+    created_at = Column(DateTime(timezone=True), nullable=False, server_default=func.now())
+    started_at = Column(DateTime(timezone=True))
+    finished_at = Column(DateTime(timezone=True))
+    # Runner executing the job and the end of its lease, renewed while the job runs;
+    # another runner only takes a running job over once its lease has expired
+    claimed_by = Column(String(255))
+    lease_expires_at = Column(DateTime(timezone=True))
+    # Storage holding the job's upload and result file (see service.job_service.results_storage_id);
+    # only runners with the same storage may run it. None for jobs without files
+    storage_id = Column(String(32))
+
+    __table_args__ = (
+        Index("ix_jobs_status", "status"),
+    )
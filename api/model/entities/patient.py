@@ -1,5 +1,5 @@
 from enum import Enum
-from sqlalchemy import Column, Integer, String, ForeignKey, Boolean, Date, CheckConstraint
+from sqlalchemy import Column, Integer, String, ForeignKey, Boolean, Date, CheckConstraint, Index
 from sqlalchemy import Enum as SqlEnum 
 from sqlalchemy.orm import relationship
 
@@ -22,6 +22,8 @@ class Patient(Base):
     birth_date = Column(Date)
     hospital_id = Column(Integer, ForeignKey('hospitals.id'), nullable=True)
     cancer_type = Column(SqlEnum(CancerType), nullable=True)
+    # Row version for optimistic concurrency (If-Match); every write to the row increments it
+    version = Column(Integer, nullable=False, default=1, server_default="1")
 
     hospital = relationship("Hospital", back_populates="patients")
 
@@ -30,4 +32,13 @@ class Patient(Base):
             "(oncological = TRUE AND cancer_type IS NOT NULL) OR (oncological = FALSE AND cancer_type IS NULL)",
             name="check_oncological_cancer_type"
         ),
+        Index("ix_patients_hospital_id", "hospital_id"),
+        Index("ix_patients_oncological_cancer_type", "oncological", "cancer_type"),
+        Index("ix_patients_name", "name"),
+        # Trigram index behind the fuzzy name search; other dialects search in memory
+        Index(
+            "ix_patients_name_trgm", "name",
+            postgresql_using="gin", postgresql_ops={"name": "gin_trgm_ops"},
+            info={"dialect": "postgresql"},
+        ).ddl_if(dialect="postgresql"),
     )
\ No newline at end of file
@@ -0,0 +1,23 @@
+from sqlalchemy import BigInteger, Column, DDL, SmallInteger, String, event
+from .base import Base
+
+# Tables whose changes are published through table_versions
+VERSIONED_TABLES = ("hospitals", "patients")
+# Counter rows per versioned table. Each write increments one of them, so concurrent
+# writers rarely wait on the same row; a table's version is the sum of its shards
+VERSION_SHARDS = 16
+
+class TableVersion(Base):
+    __tablename__ = 'table_versions'
+
+    # Change counters per table, maintained by service.version_service
+    table_name = Column(String, primary_key=True)
+    shard = Column(SmallInteger, primary_key=True, default=0, server_default="0")
+    version = Column(BigInteger, nullable=False, default=0, server_default="0")
+
+# Seed the counters when the schema is created without migrations (tests, local scripts)
+event.listen(
+    TableVersion.__table__,
+    "after_create",
+    DDL("INSERT INTO table_versions (table_name, shard, version) VALUES " + ", ".join(f"('{table}', {shard}, 0)" for table in VERSIONED_TABLES for shard in range(VERSION_SHARDS))),
+)
@@ -1,17 +1,10 @@
-import boto3
 from fastapi import APIRouter, HTTPException, status
 from pydantic import BaseModel
-import os
 
 from model.dtos.auth import Token
 from service.auth_service import authenticate_user
 
-COGNITO_REGION = os.getenv("AWS_REGION")
-USER_POOL_ID = os.getenv("USER_POOL_ID")
-APP_CLIENT_ID = os.getenv("APP_CLIENT_ID")
-
 router = APIRouter()
-client = boto3.client("cognito-idp", region_name=COGNITO_REGION)
 
 class RequestLogin(BaseModel):
     email: str
@@ -37,6 +30,8 @@ async def login_for_access_token(request: RequestLogin):
             
     Raises:
         HTTPException: 401 Unauthorized if credentials are invalid
+        HTTPException: 503 Service Unavailable if too many logins are in flight
+        HTTPException: 504 Gateway Timeout if Cognito does not answer in time
     """
     auth_result = await authenticate_user(request.email, request.password)
     if not auth_result:
@@ -0,0 +1,46 @@
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, status
+from fastapi.responses import StreamingResponse
+from typing import List, Optional
+
+from model.entities.change_event import ChangeTable
+from service.auth_service import verify_token
+from service.change_feed_service import change_feed
+
+router = APIRouter()
+
+@router.get("/", response_class=StreamingResponse, tags=["Changes"])
+async def stream_changes(
+    cursor: Optional[int] = Query(None, ge=0),
+    tables: List[ChangeTable] = Query(list(ChangeTable)),
+    last_event_id: Optional[int] = Header(None, alias="Last-Event-ID", ge=0),
+    token: dict = Depends(verify_token),
+):
+    """
+    Subscribe to hospital and patient changes as server-sent events.
+
+    Open the stream before loading the lists it keeps up to date. Each `change`
+    event carries the table, the operation (`created`, `updated`, `deleted`), the
+    row id and the row's current state. To resume after a disconnect, send the
+    last event id received as `Last-Event-ID` (browsers do this on reconnect) or
+    as `cursor`; a `reset` event means the changes since then are no longer
+    available and the lists must be reloaded.
+
+    Args:
+        cursor (int, optional): Id of the last event received; defaults to the latest event
+        tables (List[ChangeTable]): Tables to receive changes for; all by default
+        last_event_id (int, optional): Same as `cursor`, and takes precedence over it
+        token (dict): JWT token for authentication (automatically handled by FastAPI)
+
+    Returns:
+        StreamingResponse: A `text/event-stream` of `ready`, `change` and `reset` events
+
+    Raises:
+        HTTPException: 503 Service Unavailable if the change feed is not running
+    """
+    if not change_feed.running:
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="The change feed is not available")
+    return StreamingResponse(
+        change_feed.stream(last_event_id if last_event_id is not None else cursor, tables),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
@@ -1,17 +1,26 @@
-from fastapi import APIRouter, HTTPException, Depends
-from typing import List
+from fastapi import APIRouter, Depends, Header, Response
+from typing import List, Optional
 
-from model.dtos.hospital import HospitalResponseDTO, HospitalCreateDTO, HospitalUpdateDTO
-from model.dtos.patient import PatientCreateDTO, PatientResponseDTO
-from service.hospital_service import HospitalService
+from model.dtos.hospital import HospitalAssignPatientsDTO, HospitalAssignPatientsResponseDTO, HospitalResponseDTO, HospitalCreateDTO, HospitalUpdateDTO
+from model.dtos.patient import PatientCreateDTO, PatientFilterDTO, PatientResponseDTO
+from model.dtos.pagination import PaginationDTO
+from service.query_utils import NEXT_CURSOR_HEADER, get_pagination, get_patient_filters, next_cursor
+from service.hospital_service import HOSPITAL_PAGE_ADAPTER, HospitalService
 from service.auth_service import verify_token
+from service.cache_service import response_cache
+from service.etag_utils import conditional_get, parse_if_match, row_etag
+from service.serialization_utils import encode_rows, json_response
+from model.entities.database import get_db
+from sqlalchemy.ext.asyncio import AsyncSession
 
 router = APIRouter()
-hospital_service = HospitalService()
+
+def get_hospital_service(db: AsyncSession = Depends(get_db)) -> HospitalService:
+    return HospitalService(db, response_cache)
 
 # Hospital endpoints
 @router.post("/", response_model=HospitalResponseDTO, tags=["Hospitals"])
-async def create_hospital(hospital: HospitalCreateDTO, token: dict = Depends(verify_token)):
+async def create_hospital(hospital: HospitalCreateDTO, token: dict = Depends(verify_token), hospital_service: HospitalService = Depends(get_hospital_service)):
     """
     Create a new hospital.
     
@@ -22,28 +31,39 @@ async def create_hospital(hospital: HospitalCreateDTO, token: dict = Depends(ver
     Returns:
         HospitalResponseDTO: Created hospital object with assigned ID
     """
-    return hospital_service.create_hospital(hospital)
+    return await hospital_service.create_hospital(hospital)
 
 @router.get("/", response_model=List[HospitalResponseDTO], tags=["Hospitals"])
-async def get_hospitals(token: dict = Depends(verify_token)):
+async def get_hospitals(response: Response, pagination: PaginationDTO = Depends(get_pagination), token: dict = Depends(verify_token), etag: str = Depends(conditional_get("hospitals")), hospital_service: HospitalService = Depends(get_hospital_service)):
     """
-    Retrieve all hospitals.
+    Retrieve a page of hospitals.
     
-    Returns a list of all hospitals in the system.
+    Returns hospitals ordered by id. When more hospitals are available the
+    `X-Next-Cursor` response header holds the `cursor` for the next page.
+    Responses carry an `ETag`; send it back in `If-None-Match` to get a
+    `304 Not Modified` while no hospital has changed.
     
     Args:
+        pagination (PaginationDTO): Page size (`limit`) and the `cursor` to continue from
         token (dict): JWT token for authentication (automatically handled by FastAPI)
         
     Returns:
         List[HospitalResponseDTO]: List of hospital objects
     """
-    return hospital_service.get_all_hospitals()
+    hospitals = await hospital_service.get_all_hospitals(pagination)
+    cursor = next_cursor(hospitals, pagination)
+    if cursor is not None:
+        response.headers[NEXT_CURSOR_HEADER] = str(cursor)
+    return json_response(HOSPITAL_PAGE_ADAPTER.dump_json(hospitals), response)
 
 @router.get("/{hospital_id}", response_model=HospitalResponseDTO, tags=["Hospitals"])
-async def get_hospital(hospital_id: int, token: dict = Depends(verify_token)):
+async def get_hospital(hospital_id: int, response: Response, token: dict = Depends(verify_token), hospital_service: HospitalService = Depends(get_hospital_service)):
     """
     Retrieve a specific hospital by ID.
     
+    The `ETag` response header identifies the hospital's version; send it as
+    `If-Match` when updating the hospital.
+    
     Args:
         hospital_id (int): The unique identifier of the hospital
         token (dict): JWT token for authentication (automatically handled by FastAPI)
@@ -54,32 +74,40 @@ async def get_hospital(hospital_id: int, token: dict = Depends(verify_token)):
     Raises:
         HTTPException: 404 Not Found if hospital doesn't exist
     """
-    return hospital_service.get_hospital_by_id(hospital_id)
+    hospital = await hospital_service.get_hospital_by_id(hospital_id)
+    response.headers["ETag"] = row_etag(hospital.version)
+    return hospital
 
+@router.patch("/{hospital_id}", response_model=HospitalResponseDTO, tags=["Hospitals"])
 @router.put("/{hospital_id}", response_model=HospitalResponseDTO, tags=["Hospitals"])
-async def update_hospital(hospital_id: int, hospital: HospitalUpdateDTO, token: dict = Depends(verify_token)):
+async def update_hospital(hospital_id: int, hospital: HospitalUpdateDTO, response: Response, if_match: Optional[str] = Header(None), token: dict = Depends(verify_token), hospital_service: HospitalService = Depends(get_hospital_service)):
     """
     Update an existing hospital.
     
+    Only the fields present in the body are changed. Send the hospital's `ETag`
+    as `If-Match` to apply the update only if nobody changed the hospital since
+    it was read; otherwise the response is `412 Precondition Failed`.
+    
     Args:
         hospital_id (int): The unique identifier of the hospital to update
-        hospital (HospitalCreateDTO): Updated hospital data
+        hospital (HospitalUpdateDTO): The fields to change
+        if_match (str, optional): ETag of the version the update is based on
         token (dict): JWT token for authentication (automatically handled by FastAPI)
         
     Returns:
-        HospitalResponseDTO: Updated hospital object
+        HospitalResponseDTO: Updated hospital object, with its new `ETag`
         
     Raises:
         HTTPException: 404 Not Found if hospital doesn't exist
+        HTTPException: 412 Precondition Failed if the hospital is no longer at the If-Match version
     """
-    updated_hospital = hospital_service.update_hospital(hospital_id, hospital)
-    if not updated_hospital:
-        raise HTTPException(status_code=404, detail="Hospital not found")
+    updated_hospital = await hospital_service.update_hospital(hospital_id, hospital, parse_if_match(if_match))
+    response.headers["ETag"] = row_etag(updated_hospital.version)
     return updated_hospital
 
 
 @router.delete("/{hospital_id}", tags=["Hospitals"])
-async def delete_hospital(hospital_id: int, token: dict = Depends(verify_token)):
+async def delete_hospital(hospital_id: int, token: dict = Depends(verify_token), hospital_service: HospitalService = Depends(get_hospital_service)):
     """
     Delete a hospital.
     
@@ -93,12 +121,12 @@ async def delete_hospital(hospital_id: int, token: dict = Depends(verify_token))
     Raises:
         HTTPException: 404 Not Found if hospital doesn't exist
     """
-    hospital_service.delete_hospital(hospital_id)
+    await hospital_service.delete_hospital(hospital_id)
     return {"message": "Hospital deleted successfully"}
 
 # Patient management endpoints
 @router.post("/{hospital_id}/patients/{patient_id}", response_model=PatientResponseDTO, tags=["Hospital Patients"])
-async def add_patient_to_hospital(hospital_id: int, patient_id: int, token: dict = Depends(verify_token)):
+async def add_patient_to_hospital(hospital_id: int, patient_id: int, token: dict = Depends(verify_token), hospital_service: HospitalService = Depends(get_hospital_service)):
     """
     Assign an existing patient to a specific hospital.
     
@@ -113,15 +141,40 @@ async def add_patient_to_hospital(hospital_id: int, patient_id: int, token: dict
     Raises:
         HTTPException: 404 Not Found if either hospital or patient doesn't exist
     """
-    return hospital_service.add_patient_to_hospital(hospital_id, patient_id)
+    return await hospital_service.add_patient_to_hospital(hospital_id, patient_id)
+
+@router.post("/{hospital_id}/patients", response_model=HospitalAssignPatientsResponseDTO, tags=["Hospital Patients"])
+async def add_patients_to_hospital(hospital_id: int, assignment: HospitalAssignPatientsDTO, token: dict = Depends(verify_token), hospital_service: HospitalService = Depends(get_hospital_service)):
+    """
+    Assign a batch of existing patients to a specific hospital in one transaction.
+    
+    Patients are admitted in the order given until the hospital is full.
+    
+    Args:
+        hospital_id (int): The unique identifier of the hospital
+        assignment (HospitalAssignPatientsDTO): The ids of the patients to assign
+        token (dict): JWT token for authentication (automatically handled by FastAPI)
+        
+    Returns:
+        HospitalAssignPatientsResponseDTO: Number of patients assigned and the outcome per patient
+        (assigned, already_assigned, not_found or over_capacity)
+        
+    Raises:
+        HTTPException: 404 Not Found if hospital doesn't exist
+    """
+    return await hospital_service.add_patients_to_hospital(hospital_id, assignment.patient_ids)
 
 @router.get("/{hospital_id}/patients", response_model=List[PatientResponseDTO], tags=["Hospital Patients"])
-async def get_hospital_patients(hospital_id: int, token: dict = Depends(verify_token)):
+async def get_hospital_patients(hospital_id: int, response: Response, pagination: PaginationDTO = Depends(get_pagination), filters: PatientFilterDTO = Depends(get_patient_filters), token: dict = Depends(verify_token), etag: str = Depends(conditional_get("patients")), hospital_service: HospitalService = Depends(get_hospital_service)):
     """
-    Retrieve all patients in a specific hospital.
+    Retrieve a page of patients in a specific hospital.
+    
+    Supports `If-None-Match` with the `ETag` of a previous response (304 when unchanged).
     
     Args:
         hospital_id (int): The unique identifier of the hospital
+        pagination (PaginationDTO): Page size (`limit`) and the `cursor` to continue from
+        filters (PatientFilterDTO): Optional oncological, cancer_type and age range filters
         token (dict): JWT token for authentication (automatically handled by FastAPI)
         
     Returns:
@@ -130,4 +183,8 @@ async def get_hospital_patients(hospital_id: int, token: dict = Depends(verify_t
     Raises:
         HTTPException: 404 Not Found if hospital doesn't exist
     """
-    return hospital_service.get_hospital_patients(hospital_id)
+    rows = await hospital_service.get_hospital_patient_rows(hospital_id, pagination, filters)
+    cursor = next_cursor(rows, pagination)
+    if cursor is not None:
+        response.headers[NEXT_CURSOR_HEADER] = str(cursor)
+    return json_response(encode_rows(rows), response)
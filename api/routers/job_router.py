@@ -0,0 +1,123 @@
+from fastapi import APIRouter, Depends, Query, Request, Response, status
+from fastapi.responses import FileResponse
+from typing import List
+
+from model.dtos.job import ExportJobDTO, JobDTO, ReassignJobDTO
+from model.entities.job import JobKind
+from service.auth_service import verify_token
+from service.ingest_utils import is_ndjson
+from service.job_service import RESULT_MEDIA_TYPES, JobService, job_runner
+from model.entities.database import get_db
+from sqlalchemy.ext.asyncio import AsyncSession
+
+router = APIRouter()
+
+def get_job_service(db: AsyncSession = Depends(get_db)) -> JobService:
+    return JobService(db)
+
+def _accepted(job: JobDTO, response: Response) -> JobDTO:
+    job_runner.submit(job.id)
+    response.headers["Location"] = f"/jobs/{job.id}"
+    return job
+
+@router.post("/export", response_model=JobDTO, status_code=status.HTTP_202_ACCEPTED, tags=["Jobs"])
+async def submit_export(export: ExportJobDTO, response: Response, token: dict = Depends(verify_token), job_service: JobService = Depends(get_job_service)):
+    """
+    Queue an export of the patient registry to a downloadable file.
+
+    Args:
+        export (ExportJobDTO): The `format` (`ndjson` or `csv`) and the patient `filters`
+        token (dict): JWT token for authentication (automatically handled by FastAPI)
+
+    Returns:
+        JobDTO: The queued job; poll `GET /jobs/{job_id}` and download `GET /jobs/{job_id}/result`
+    """
+    return _accepted(await job_service.create_job(JobKind.export, export.model_dump(mode="json")), response)
+
+@router.post("/import", response_model=JobDTO, status_code=status.HTTP_202_ACCEPTED, tags=["Jobs"])
+async def submit_import(request: Request, response: Response, token: dict = Depends(verify_token), job_service: JobService = Depends(get_job_service)):
+    """
+    Queue a bulk patient import.
+
+    Takes the same body as `POST /patients/bulk` (a JSON array, or NDJSON with
+    `Content-Type: application/x-ndjson`). The upload is stored and imported in
+    the background; the per-record outcomes are the job's result file.
+
+    Args:
+        request (Request): The upload, as a JSON array or NDJSON
+        token (dict): JWT token for authentication (automatically handled by FastAPI)
+
+    Returns:
+        JobDTO: The queued job
+    """
+    return _accepted(await job_service.create_import_job(request.stream(), is_ndjson(request)), response)
+
+@router.post("/reassign", response_model=JobDTO, status_code=status.HTTP_202_ACCEPTED, tags=["Jobs"])
+async def submit_reassign(reassign: ReassignJobDTO, response: Response, token: dict = Depends(verify_token), job_service: JobService = Depends(get_job_service)):
+    """
+    Queue the assignment of many patients to a hospital.
+
+    Patients are moved in batches with the same rules as
+    `POST /hospitals/{hospital_id}/patients`; the job's result counts the
+    outcomes (assigned, already_assigned, not_found, over_capacity).
+
+    Args:
+        reassign (ReassignJobDTO): The target `hospital_id` and the `patient_ids` to move
+        token (dict): JWT token for authentication (automatically handled by FastAPI)
+
+    Returns:
+        JobDTO: The queued job
+    """
+    return _accepted(await job_service.create_job(JobKind.reassign, reassign.model_dump()), response)
+
+@router.get("/", response_model=List[JobDTO], tags=["Jobs"])
+async def list_jobs(limit: int = Query(50, ge=1, le=500), token: dict = Depends(verify_token), job_service: JobService = Depends(get_job_service)):
+    """
+    Retrieve the most recent jobs, newest first.
+
+    Args:
+        limit (int): Maximum number of jobs to return
+        token (dict): JWT token for authentication (automatically handled by FastAPI)
+
+    Returns:
+        List[JobDTO]: The jobs with their status and progress
+    """
+    return await job_service.list_jobs(limit)
+
+@router.get("/{job_id}", response_model=JobDTO, tags=["Jobs"])
+async def get_job(job_id: str, token: dict = Depends(verify_token), job_service: JobService = Depends(get_job_service)):
+    """
+    Retrieve the status, progress and result summary of a job.
+
+    Args:
+        job_id (str): The job identifier returned on submission
+        token (dict): JWT token for authentication (automatically handled by FastAPI)
+
+    Returns:
+        JobDTO: The job; `progress` out of `total` units of work are done
+
+    Raises:
+        HTTPException: 404 Not Found if the job doesn't exist
+    """
+    return await job_service.get_job(job_id)
+
+@router.get("/{job_id}/result", tags=["Jobs"])
+async def download_job_result(job_id: str, token: dict = Depends(verify_token), job_service: JobService = Depends(get_job_service)):
+    """
+    Download the result file of a finished export or import job.
+
+    Args:
+        job_id (str): The job identifier returned on submission
+        token (dict): JWT token for authentication (automatically handled by FastAPI)
+
+    Returns:
+        FileResponse: The exported patients, or the per-record outcomes of an import as NDJSON
+
+    Raises:
+        HTTPException: 404 Not Found if the job doesn't exist or has no result file
+        HTTPException: 409 Conflict if the job has not succeeded (yet)
+        HTTPException: 410 Gone if the result file was removed
+    """
+    path = await job_service.get_result_file(job_id)
+    extension = path.rsplit(".", 1)[-1]
+    return FileResponse(path, media_type=RESULT_MEDIA_TYPES[extension], filename=f"job-{job_id}.{extension}")
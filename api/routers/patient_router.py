@@ -1,33 +1,106 @@
-from fastapi import APIRouter, HTTPException, Depends
-from typing import List
+from fastapi import APIRouter, HTTPException, Depends, Header, Query, Request, Response
+from fastapi.responses import StreamingResponse
+from typing import List, Optional
 from model.entities.patient import Patient
 from service.patient_service import PatientService
-from model.dtos.patient import PatientResponseDTO, PatientUpdateDTO, PatientCreateDTO
+from model.dtos.patient import ExportFormat, PatientBulkResponseDTO, PatientFilterDTO, PatientResponseDTO, PatientSearchResultDTO, PatientUpdateDTO, PatientCreateDTO
+from model.dtos.pagination import PaginationDTO
+from service.query_utils import NEXT_CURSOR_HEADER, get_pagination, get_patient_filters, next_cursor
 from service.auth_service import verify_token
+from service.cache_service import response_cache
+from service.etag_utils import conditional_get, parse_if_match, row_etag
+from service.serialization_utils import encode_rows, json_response
+from service.ingest_utils import iter_json_records
+from service.search_service import SEARCH_DEFAULT_LIMIT, SEARCH_MAX_LIMIT
+from model.entities.database import AsyncSessionLocal, get_db
+from sqlalchemy.ext.asyncio import AsyncSession
 
 router = APIRouter()
-patient_service = PatientService()
+
+def get_patient_service(db: AsyncSession = Depends(get_db)) -> PatientService:
+    return PatientService(db, response_cache)
 
 @router.get("/", response_model=List[PatientResponseDTO], tags=["Patients"])
-async def get_patients(token: dict = Depends(verify_token)):
+async def get_patients(response: Response, pagination: PaginationDTO = Depends(get_pagination), filters: PatientFilterDTO = Depends(get_patient_filters), token: dict = Depends(verify_token), etag: str = Depends(conditional_get("patients")), patient_service: PatientService = Depends(get_patient_service)):
     """
-    Retrieve all patients.
+    Retrieve a page of patients.
     
-    Returns a list of all patients in the system.
+    Returns patients ordered by id, narrowed by the optional filters. When more
+    patients are available the `X-Next-Cursor` response header holds the value
+    to pass as `cursor` to fetch the next page. Responses carry an `ETag`;
+    send it back in `If-None-Match` to get a `304 Not Modified` while no
+    patient has changed.
     
     Args:
+        pagination (PaginationDTO): Page size (`limit`) and the `cursor` to continue from
+        filters (PatientFilterDTO): Optional oncological, cancer_type, hospital_id and age range filters
         token (dict): JWT token for authentication (automatically handled by FastAPI)
         
     Returns:
         List[PatientResponseDTO]: List of patient objects containing patient information
     """
-    return patient_service.get_all_patients()
+    rows = await patient_service.get_patient_rows(pagination, filters)
+    cursor = next_cursor(rows, pagination)
+    if cursor is not None:
+        response.headers[NEXT_CURSOR_HEADER] = str(cursor)
+    return json_response(encode_rows(rows), response)
+
+@router.get("/search", response_model=List[PatientSearchResultDTO], tags=["Patients"])
+async def search_patients(q: str = Query(..., min_length=1, max_length=100, description="Name, or part of a name, to look for"), limit: int = Query(SEARCH_DEFAULT_LIMIT, ge=1, le=SEARCH_MAX_LIMIT), token: dict = Depends(verify_token), patient_service: PatientService = Depends(get_patient_service)):
+    """
+    Search patients by name.
+    
+    Matches names that start with or contain `q`, case-insensitively, as well as
+    names similar to it so that typos still find the patient. Names starting with
+    `q` come first, then names containing it, then the rest by similarity.
+    
+    Args:
+        q (str): The name, or part of it, to look for
+        limit (int): Maximum number of results (default 20, at most 100)
+        token (dict): JWT token for authentication (automatically handled by FastAPI)
+        
+    Returns:
+        List[PatientSearchResultDTO]: Matching patients, best match first, each with its similarity `score`
+    """
+    return await patient_service.search_patients(q, limit)
+
+@router.get("/export", tags=["Patients"])
+async def export_patients(format: ExportFormat = ExportFormat.ndjson, filters: PatientFilterDTO = Depends(get_patient_filters), token: dict = Depends(verify_token)):
+    """
+    Stream the full patient registry as NDJSON or CSV.
+    
+    Rows are streamed from a server-side cursor as they are read, so the response
+    starts immediately and memory use stays constant regardless of table size.
+    
+    Args:
+        filters (PatientFilterDTO): Optional oncological, cancer_type, hospital_id and age range filters
+        format (ExportFormat): `ndjson` (default) or `csv`
+        token (dict): JWT token for authentication (automatically handled by FastAPI)
+        
+    Returns:
+        StreamingResponse: The exported patients
+    """
+    async def content():
+        # The export outlives the request handler, so it owns its session
+        async with AsyncSessionLocal() as session:
+            async for chunk in PatientService(session).export_patients(format, filters):
+                yield chunk
+
+    media_type = "text/csv" if format == ExportFormat.csv else "application/x-ndjson"
+    return StreamingResponse(
+        content(),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="patients.{format.value}"'},
+    )
 
 @router.get("/{patient_id}", response_model=PatientResponseDTO, tags=["Patients"])
-async def get_patient(patient_id: int, token: dict = Depends(verify_token)):
+async def get_patient(patient_id: int, response: Response, token: dict = Depends(verify_token), patient_service: PatientService = Depends(get_patient_service)):
     """
     Retrieve a specific patient by ID.
     
+    The `ETag` response header identifies the patient's version; send it as
+    `If-Match` when updating the patient.
+    
     Args:
         patient_id (int): The unique identifier of the patient
         token (dict): JWT token for authentication (automatically handled by FastAPI)
@@ -38,13 +111,14 @@ async def get_patient(patient_id: int, token: dict = Depends(verify_token)):
     Raises:
         HTTPException: 404 Not Found if patient doesn't exist
     """
-    patient = patient_service.get_patient_by_id(patient_id)
+    patient = await patient_service.get_patient_by_id(patient_id)
     if not patient:
         raise HTTPException(status_code=404, detail="Patient not found")
+    response.headers["ETag"] = row_etag(patient.version)
     return patient
 
 @router.post("/", response_model=PatientResponseDTO, tags=["Patients"])
-async def create_patient(patient: PatientCreateDTO, token: dict = Depends(verify_token)):
+async def create_patient(patient: PatientCreateDTO, token: dict = Depends(verify_token), patient_service: PatientService = Depends(get_patient_service)):
     """
     Create a new patient.
     
@@ -55,31 +129,59 @@ async def create_patient(patient: PatientCreateDTO, token: dict = Depends(verify
     Returns:
         PatientResponseDTO: Created patient object with assigned ID
     """
-    return patient_service.create_patient(patient)
+    return await patient_service.create_patient(patient)
 
+@router.post("/bulk", response_model=PatientBulkResponseDTO, tags=["Patients"])
+async def bulk_create_patients(request: Request, token: dict = Depends(verify_token), patient_service: PatientService = Depends(get_patient_service)):
+    """
+    Create many patients in one request.
+    
+    The body is either a JSON array of `PatientCreateDTO` objects or an NDJSON
+    stream (`Content-Type: application/x-ndjson`) with one object per line.
+    Records are inserted in batches; invalid records are reported individually
+    and do not abort the rest of the upload.
+    
+    Args:
+        request (Request): The upload, as a JSON array or NDJSON
+        token (dict): JWT token for authentication (automatically handled by FastAPI)
+        
+    Returns:
+        PatientBulkResponseDTO: Created/failed counts and the outcome of every record, by position
+        
+    Raises:
+        HTTPException: 400 Bad Request if a JSON body is malformed or not an array
+    """
+    return await patient_service.bulk_create_patients(iter_json_records(request))
+
+@router.patch("/{patient_id}", response_model=PatientResponseDTO, tags=["Patients"])
 @router.put("/{patient_id}", response_model=PatientResponseDTO, tags=["Patients"])
-async def update_patient(patient_id: int, patient: PatientUpdateDTO, token: dict = Depends(verify_token)):
+async def update_patient(patient_id: int, patient: PatientUpdateDTO, response: Response, if_match: Optional[str] = Header(None), token: dict = Depends(verify_token), patient_service: PatientService = Depends(get_patient_service)):
     """
     Update an existing patient.
     
+    Only the fields present in the body are changed. Send the patient's `ETag`
+    as `If-Match` to apply the update only if nobody changed the patient since
+    it was read; otherwise the response is `412 Precondition Failed`.
+    
     Args:
         patient_id (int): The unique identifier of the patient to update
-        patient (PatientUpdateDTO): Updated patient data
+        patient (PatientUpdateDTO): The fields to change
+        if_match (str, optional): ETag of the version the update is based on
         token (dict): JWT token for authentication (automatically handled by FastAPI)
         
     Returns:
-        PatientResponseDTO: Updated patient object
+        PatientResponseDTO: Updated patient object, with its new `ETag`
         
     Raises:
         HTTPException: 404 Not Found if patient doesn't exist
+        HTTPException: 412 Precondition Failed if the patient is no longer at the If-Match version
     """
-    updated_patient = patient_service.update_patient(patient_id, patient)
-    if not updated_patient:
-        raise HTTPException(status_code=404, detail="Patient not found")
+    updated_patient = await patient_service.update_patient(patient_id, patient, parse_if_match(if_match))
+    response.headers["ETag"] = row_etag(updated_patient.version)
     return updated_patient
 
 @router.delete("/{patient_id}", tags=["Patients"])
-async def delete_patient(patient_id: int, token: dict = Depends(verify_token)):
+async def delete_patient(patient_id: int, token: dict = Depends(verify_token), patient_service: PatientService = Depends(get_patient_service)):
     """
     Delete a patient.
     
@@ -93,7 +195,7 @@ async def delete_patient(patient_id: int, token: dict = Depends(verify_token)):
     Raises:
         HTTPException: 404 Not Found if patient doesn't exist
     """
-    success = patient_service.delete_patient(patient_id)
+    success = await patient_service.delete_patient(patient_id)
     if not success:
         raise HTTPException(status_code=404, detail="Patient not found")
     return {"message": "Patient deleted successfully"}
@@ -0,0 +1,56 @@
+from fastapi import APIRouter, Depends, Response
+from typing import List
+
+from model.dtos.pagination import PaginationDTO
+from model.dtos.stats import HospitalStatsDTO, RegistryStatsDTO
+from service.query_utils import NEXT_CURSOR_HEADER, get_pagination, next_cursor
+from service.stats_service import StatsService
+from service.auth_service import verify_token
+from service.cache_service import response_cache
+from service.etag_utils import conditional_get
+from model.entities.database import get_db
+from sqlalchemy.ext.asyncio import AsyncSession
+
+router = APIRouter()
+
+def get_stats_service(db: AsyncSession = Depends(get_db)) -> StatsService:
+    return StatsService(db, response_cache)
+
+@router.get("/", response_model=RegistryStatsDTO, tags=["Statistics"])
+async def get_registry_stats(token: dict = Depends(verify_token), etag: str = Depends(conditional_get("hospitals", "patients")), stats_service: StatsService = Depends(get_stats_service)):
+    """
+    Retrieve registry-wide totals for the dashboard.
+    
+    Counts are computed in the database and cached until the next hospital or
+    patient change. Supports `If-None-Match` with the `ETag` of a previous
+    response (304 when unchanged).
+    
+    Args:
+        token (dict): JWT token for authentication (automatically handled by FastAPI)
+        
+    Returns:
+        RegistryStatsDTO: Hospital, capacity and patient totals, overall occupancy and patients per cancer type
+    """
+    return await stats_service.get_registry_stats()
+
+@router.get("/hospitals", response_model=List[HospitalStatsDTO], tags=["Statistics"])
+async def get_hospital_stats(response: Response, pagination: PaginationDTO = Depends(get_pagination), token: dict = Depends(verify_token), etag: str = Depends(conditional_get("hospitals", "patients")), stats_service: StatsService = Depends(get_stats_service)):
+    """
+    Retrieve patient counts for a page of hospitals.
+    
+    Hospitals are ordered by id; when more are available the `X-Next-Cursor`
+    response header holds the `cursor` for the next page. Supports
+    `If-None-Match` like the other listings.
+    
+    Args:
+        pagination (PaginationDTO): Page size (`limit`) and the `cursor` to continue from
+        token (dict): JWT token for authentication (automatically handled by FastAPI)
+        
+    Returns:
+        List[HospitalStatsDTO]: Patients, free beds, occupancy and patients per cancer type of each hospital
+    """
+    stats = await stats_service.get_hospital_stats(pagination)
+    cursor = next_cursor(stats, pagination)
+    if cursor is not None:
+        response.headers[NEXT_CURSOR_HEADER] = str(cursor)
+    return stats
@@ -1,40 +1,220 @@
+import asyncio
+import functools
+import hashlib
+import logging
+import time
 import boto3
+from botocore.config import Config
+from concurrent.futures import ThreadPoolExecutor
 from fastapi import Depends, HTTPException, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from jose import ExpiredSignatureError, jwt 
+from jose import ExpiredSignatureError, JWTError, jwk, jwt
+from jose.backends.base import Key
+from collections import OrderedDict
+from typing import Dict, NamedTuple, Optional
 import httpx
 import os
+from service.metrics_service import JWKS_FETCH, TOKEN_VERIFICATION
 # Configura tu pool
 COGNITO_REGION = os.getenv("AWS_REGION")
 USER_POOL_ID = os.getenv("USER_POOL_ID")
 APP_CLIENT_ID = os.getenv("APP_CLIENT_ID")
 COGNITO_ISSUER = f"https://cognito-idp.{COGNITO_REGION}.amazonaws.com/{USER_POOL_ID}"
 
-JWKS_URL = f"{COGNITO_ISSUER}/.well-known/jwks.json"
+JWKS_URL = os.getenv("JWKS_URL") or f"{COGNITO_ISSUER}/.well-known/jwks.json"
+JWKS_CACHE_TTL = float(os.getenv("JWKS_CACHE_TTL", "3600"))
+JWKS_MIN_REFRESH_INTERVAL = float(os.getenv("JWKS_MIN_REFRESH_INTERVAL", "30"))
+JWKS_HTTP_TIMEOUT = float(os.getenv("JWKS_HTTP_TIMEOUT", "5"))
+TOKEN_CACHE_SIZE = int(os.getenv("TOKEN_CACHE_SIZE", "10000"))
+
+COGNITO_ENDPOINT_URL = os.getenv("COGNITO_ENDPOINT_URL")
+COGNITO_MAX_CONCURRENCY = int(os.getenv("COGNITO_MAX_CONCURRENCY", "10"))
+COGNITO_TIMEOUT = float(os.getenv("COGNITO_TIMEOUT", "10"))
+COGNITO_QUEUE_TIMEOUT = float(os.getenv("COGNITO_QUEUE_TIMEOUT", "2"))
+
+logger = logging.getLogger(__name__)
 
 security = HTTPBearer()
-security = HTTPBearer()
-jwks = {}
 
-client = boto3.client("cognito-idp", region_name=COGNITO_REGION)
+# boto3 is blocking, so Cognito calls run on a dedicated, bounded thread pool
+_cognito_executor = ThreadPoolExecutor(max_workers=COGNITO_MAX_CONCURRENCY, thread_name_prefix="cognito")
+_cognito_slots = asyncio.Semaphore(COGNITO_MAX_CONCURRENCY)
+
+@functools.lru_cache(maxsize=1)
+def get_cognito_client():
+    return boto3.client(
+        "cognito-idp",
+        region_name=COGNITO_REGION,
+        endpoint_url=COGNITO_ENDPOINT_URL,
+        config=Config(
+            connect_timeout=COGNITO_TIMEOUT,
+            read_timeout=COGNITO_TIMEOUT,
+            retries={"max_attempts": 2},
+            max_pool_connections=COGNITO_MAX_CONCURRENCY,
+        ),
+    )
+
+class JWKSKeyStore:
+    """
+    Cache of the Cognito signing keys, indexed by `kid`.
+
+    Keys are parsed once when the JWKS document is fetched and reused until the
+    TTL expires. A token signed with an unknown `kid` triggers a refresh so key
+    rotation is picked up without a restart; refreshes are single-flight (one
+    fetch for any number of concurrent callers) and rate limited so a stream of
+    forged `kid` values cannot hammer the JWKS endpoint.
+    """
+
+    def __init__(
+        self,
+        url: str,
+        ttl: float = JWKS_CACHE_TTL,
+        min_refresh_interval: float = JWKS_MIN_REFRESH_INTERVAL,
+        http_client: Optional[httpx.AsyncClient] = None,
+    ):
+        self.url = url
+        self.ttl = ttl
+        self.min_refresh_interval = min_refresh_interval
+        self._http_client = http_client
+        self._keys: Dict[str, Key] = {}
+        self._fetched_at = float("-inf")
+        self._last_attempt = float("-inf")
+        self._generation = 0
+        self._lock = asyncio.Lock()
+
+    @property
+    def http_client(self) -> httpx.AsyncClient:
+        # Created lazily so the pooled client binds to the running event loop
+        if self._http_client is None:
+            self._http_client = httpx.AsyncClient(timeout=JWKS_HTTP_TIMEOUT)
+        return self._http_client
+
+    @property
+    def is_warm(self) -> bool:
+        return bool(self._keys)
+
+    def has_key(self, kid: str) -> bool:
+        return kid in self._keys
+
+    def _is_stale(self) -> bool:
+        return time.monotonic() - self._fetched_at > self.ttl
+
+    async def get_key(self, kid: Optional[str]) -> Optional[Key]:
+        """Return the parsed public key for `kid`, refreshing the key set when needed."""
+        if kid is None:
+            return None
+        if self._is_stale() or kid not in self._keys:
+            await self.refresh()
+        return self._keys.get(kid)
+
+    async def refresh(self) -> None:
+        """Fetch the JWKS document, sharing one in-flight fetch between concurrent callers."""
+        generation = self._generation
+        async with self._lock:
+            if self._generation != generation:
+                # Another caller refreshed the keys while we were waiting
+                return
+            now = time.monotonic()
+            if now - self._last_attempt < self.min_refresh_interval:
+                return
+            self._last_attempt = now
+            try:
+                response = await self.http_client.get(self.url)
+                response.raise_for_status()
+                keys = {
+                    key["kid"]: jwk.construct(key, key.get("alg", "RS256"))
+                    for key in response.json()["keys"]
+                }
+            except (httpx.HTTPError, KeyError, ValueError, JWTError):
+                # Keep serving the keys we already have until the next attempt
+                JWKS_FETCH.labels("error").observe(time.monotonic() - now)
+                logger.exception("Failed to refresh JWKS from %s", self.url)
+                return
+            JWKS_FETCH.labels("success").observe(time.monotonic() - now)
+            self._keys = keys
+            self._fetched_at = time.monotonic()
+            self._generation += 1
+
+    async def aclose(self) -> None:
+        if self._http_client is not None:
+            await self._http_client.aclose()
+            self._http_client = None
+
+class _VerifiedToken(NamedTuple):
+    claims: dict
+    kid: str
+    expires_at: float
+
+class VerifiedTokenCache:
+    """
+    Bounded LRU cache of claims for tokens whose signature was already verified.
 
-async def get_jwk():
-    global jwks
-    if not jwks:
-        async with httpx.AsyncClient() as client:
-            r = await client.get(JWKS_URL)
-            jwks = r.json()
-    return jwks
+    Entries are keyed by a SHA-256 of the token, dropped once the token's `exp`
+    has passed, and ignored when the signing key is no longer published in the
+    key store, so a rotated-out key cannot keep tokens alive.
+    """
+
+    def __init__(self, max_size: int = TOKEN_CACHE_SIZE):
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[str, _VerifiedToken]" = OrderedDict()
+
+    @staticmethod
+    def _key(token: str) -> str:
+        return hashlib.sha256(token.encode()).hexdigest()
+
+    def get(self, token: str, key_store: JWKSKeyStore) -> Optional[dict]:
+        key = self._key(token)
+        claims = self._lookup(key, key_store)
+        if claims is None:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return claims
+
+    def peek(self, token: str, key_store: JWKSKeyStore) -> Optional[dict]:
+        """Claims of `token` if it was already verified, without counting a lookup or refreshing its LRU position."""
+        return self._lookup(self._key(token), key_store)
+
+    def _lookup(self, key: str, key_store: JWKSKeyStore) -> Optional[dict]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry.expires_at <= time.time() or not key_store.has_key(entry.kid):
+            del self._entries[key]
+            return None
+        return entry.claims
+
+    def put(self, token: str, claims: dict, kid: str) -> None:
+        expires_at = claims.get("exp")
+        if self.max_size <= 0 or not isinstance(expires_at, (int, float)):
+            return
+        key = self._key(token)
+        self._entries[key] = _VerifiedToken(claims, kid, float(expires_at))
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def stats(self) -> dict:
+        return {"size": len(self._entries), "max_size": self.max_size, "hits": self.hits, "misses": self.misses}
+
+key_store = JWKSKeyStore(JWKS_URL)
+token_cache = VerifiedTokenCache()
 
 async def verify_token(credentials: HTTPAuthorizationCredentials = Depends(security)):
+    started_at = time.perf_counter()
     token = credentials.credentials
+    cached_claims = token_cache.get(token, key_store)
+    if cached_claims is not None:
+        TOKEN_VERIFICATION.labels("cached").observe(time.perf_counter() - started_at)
+        return cached_claims
+    result = "rejected"
     try:
-        jwks = await get_jwk()
         unverified_header = jwt.get_unverified_header(token)
-        key = next(
-            (k for k in jwks["keys"] if k["kid"] == unverified_header["kid"]),
-            None
-        )
+        kid = unverified_header.get("kid")
+        key = await key_store.get_key(kid)
         if not key:
             raise HTTPException(status_code=401, detail="Invalid token")
 
@@ -45,26 +225,60 @@ async def verify_token(credentials: HTTPAuthorizationCredentials = Depends(secur
             audience=APP_CLIENT_ID,
             issuer=COGNITO_ISSUER
         )
+        token_cache.put(token, payload, kid)
+        result = "verified"
         return payload
 
     except HTTPException as e:
         raise HTTPException(status_code=401, detail="Token inválido")
     except ExpiredSignatureError as e:
         raise HTTPException(status_code=401, detail="Token expirado")
+    except JWTError as e:
+        raise HTTPException(status_code=401, detail="Token inválido")
+    finally:
+        TOKEN_VERIFICATION.labels(result).observe(time.perf_counter() - started_at)
 
 
 async def authenticate_user(username: str, password: str):
+    """
+    Authenticate against Cognito without blocking the event loop.
+
+    At most COGNITO_MAX_CONCURRENCY calls are in flight. Callers that cannot get
+    a slot within COGNITO_QUEUE_TIMEOUT are rejected with 503, and calls slower
+    than COGNITO_TIMEOUT fail with 504, so a Cognito slowdown cannot tie up the
+    workers serving the data endpoints.
+    """
     try:
-        response = client.initiate_auth(
-            ClientId=APP_CLIENT_ID,
-            AuthFlow='USER_PASSWORD_AUTH',
-            AuthParameters={
-                'USERNAME': username,
-                'PASSWORD': password
-            }
+        await asyncio.wait_for(_cognito_slots.acquire(), COGNITO_QUEUE_TIMEOUT)
+    except asyncio.TimeoutError:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Authentication service is busy, please retry.",
+            headers={"Retry-After": "1"},
+        )
+
+    call = functools.partial(
+        get_cognito_client().initiate_auth,
+        ClientId=APP_CLIENT_ID,
+        AuthFlow='USER_PASSWORD_AUTH',
+        AuthParameters={
+            'USERNAME': username,
+            'PASSWORD': password
+        }
+    )
+    future = asyncio.get_running_loop().run_in_executor(_cognito_executor, call)
+    # Hold the slot until the thread finishes, even if we stop waiting for it
+    future.add_done_callback(lambda _: _cognito_slots.release())
+    try:
+        response = await asyncio.wait_for(asyncio.shield(future), COGNITO_TIMEOUT)
+    except asyncio.TimeoutError:
+        raise HTTPException(
+            status_code=status.HTTP_504_GATEWAY_TIMEOUT,
+            detail="Authentication service timed out."
         )
-        if response.get("ChallengeName") == "NEW_PASSWORD_REQUIRED":
-            raise HTTPException(status_code=400, detail="You need to change your password.")
-        return response['AuthenticationResult']
     except Exception as e:
-        return None
\ No newline at end of file
+        return None
+
+    if response.get("ChallengeName") == "NEW_PASSWORD_REQUIRED":
+        raise HTTPException(status_code=400, detail="You need to change your password.")
+    return response['AuthenticationResult']
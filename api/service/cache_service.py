@@ -0,0 +1,161 @@
+import logging
+import os
+import time
+from collections import OrderedDict, defaultdict
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple, TypeVar
+
+from pydantic import TypeAdapter, ValidationError
+
+CACHE_BACKEND = os.getenv("CACHE_BACKEND", "lru").lower()
+CACHE_TTL = float(os.getenv("CACHE_TTL", "10"))
+CACHE_MAX_ENTRIES = int(os.getenv("CACHE_MAX_ENTRIES", "10000"))
+CACHE_REDIS_URL = os.getenv("CACHE_REDIS_URL", "redis://localhost:6379/0")
+CACHE_KEY_PREFIX = os.getenv("CACHE_KEY_PREFIX", "healthcare:")
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+class LRUCacheBackend:
+    """In-process LRU of serialized values with a per-entry expiry."""
+
+    name = "lru"
+
+    def __init__(self, max_entries: int = CACHE_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, Tuple[bytes, float]]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    async def get(self, key: str) -> Optional[bytes]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        value, expires_at = entry
+        if expires_at <= time.monotonic():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    async def set(self, key: str, value: bytes, ttl: float) -> None:
+        if self.max_entries <= 0:
+            return
+        self._entries[key] = (value, time.monotonic() + ttl)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    async def delete(self, *keys: str) -> None:
+        for key in keys:
+            self._entries.pop(key, None)
+
+class RedisCacheBackend:
+    """
+    Cache backend on any client speaking the redis-py asyncio API (GET/SET/DELETE).
+
+    Shared by every API process, so an invalidation is seen by all of them. Redis
+    errors are logged and treated as misses: the cache must never fail a request.
+    """
+
+    name = "redis"
+
+    def __init__(self, client: Any):
+        self.client = client
+
+    async def get(self, key: str) -> Optional[bytes]:
+        try:
+            return await self.client.get(key)
+        except Exception:
+            logger.exception("Cache read failed for %s", key)
+            return None
+
+    async def set(self, key: str, value: bytes, ttl: float) -> None:
+        try:
+            await self.client.set(key, value, px=int(ttl * 1000))
+        except Exception:
+            logger.exception("Cache write failed for %s", key)
+
+    async def delete(self, *keys: str) -> None:
+        try:
+            await self.client.delete(*keys)
+        except Exception:
+            logger.exception("Cache invalidation failed for %s", keys)
+
+class ReadThroughCache:
+    """
+    Read-through cache of response DTOs in front of the service lookups.
+
+    Values are stored as JSON produced by pydantic and validated back into the
+    DTO on a hit. Single entities are invalidated by key; listings are keyed on
+    the database table versions (see `version_service`), so a committed write by
+    any process moves them to a new key and they need no invalidation. Entries
+    also expire after `ttl` seconds, bounding staleness for single entities
+    written by other processes when the backend is in-process.
+    """
+
+    def __init__(self, backend: Optional[Any], ttl: float = CACHE_TTL, prefix: str = CACHE_KEY_PREFIX):
+        self.backend = backend
+        self.ttl = ttl
+        self.prefix = prefix
+        self.hits: Dict[str, int] = defaultdict(int)
+        self.misses: Dict[str, int] = defaultdict(int)
+
+    @property
+    def enabled(self) -> bool:
+        return self.backend is not None and self.ttl > 0
+
+    async def get_or_load(self, namespace: str, key: Any, adapter: TypeAdapter, loader: Callable[[], Awaitable[T]]) -> T:
+        """Return the cached value for `namespace:key`, calling `loader` and caching its result on a miss."""
+        if not self.enabled:
+            return await loader()
+        cache_key = f"{self.prefix}{namespace}:{key}"
+        cached = await self.backend.get(cache_key)
+        if cached is not None:
+            try:
+                value = adapter.validate_json(cached)
+            except ValidationError:
+                pass  # written by a release with a different DTO shape: reload it
+            else:
+                self.hits[namespace] += 1
+                return value
+        self.misses[namespace] += 1
+        value = await loader()
+        await self.backend.set(cache_key, adapter.dump_json(value), self.ttl)
+        return value
+
+    async def invalidate(self, namespace: str, *keys: Any) -> None:
+        if self.enabled and keys:
+            await self.backend.delete(*(f"{self.prefix}{namespace}:{key}" for key in keys))
+
+    def stats(self) -> dict:
+        hits = sum(self.hits.values())
+        misses = sum(self.misses.values())
+        stats = {
+            "backend": self.backend.name if self.enabled else "none",
+            "hits": hits,
+            "misses": misses,
+            "hit_rate": hits / (hits + misses) if hits + misses else 0.0,
+            "namespaces": {
+                namespace: {"hits": self.hits[namespace], "misses": self.misses[namespace]}
+                for namespace in sorted(set(self.hits) | set(self.misses))
+            },
+        }
+        if isinstance(self.backend, LRUCacheBackend):
+            stats["size"] = len(self.backend)
+            stats["max_size"] = self.backend.max_entries
+        return stats
+
+def create_cache(backend: str = CACHE_BACKEND) -> ReadThroughCache:
+    """Build the response cache selected by CACHE_BACKEND (`lru`, `redis` or `none`)."""
+    if backend == "redis":
+        # Optional dependency, only needed when the shared cache is enabled
+        from redis import asyncio as redis
+        return ReadThroughCache(RedisCacheBackend(redis.from_url(CACHE_REDIS_URL)))
+    if backend == "lru":
+        return ReadThroughCache(LRUCacheBackend())
+    return ReadThroughCache(None)
+
+no_cache = ReadThroughCache(None)
+response_cache = create_cache()
@@ -0,0 +1,372 @@
+import asyncio
+import logging
+import os
+import time
+import weakref
+from collections import deque
+from datetime import datetime, timedelta, timezone
+from typing import Any, AsyncIterator, Deque, Dict, Iterable, List, Optional, Tuple
+
+from pydantic_core import to_json
+from sqlalchemy import delete, event, func, insert, select
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncEngine, AsyncSession, async_sessionmaker
+from sqlalchemy.orm import Session
+
+from model.dtos.change import ChangeEventDTO
+from model.dtos.hospital import HospitalResponseDTO
+from model.dtos.patient import PatientResponseDTO
+from model.entities.change_event import ChangeEvent, ChangeOperation, ChangeTable
+from model.entities.hospital import Hospital
+from model.entities.patient import Patient
+from service.serialization_utils import response_columns
+
+CHANGE_FEED_BUFFER_SIZE = int(os.getenv("CHANGE_FEED_BUFFER_SIZE", "1000"))
+CHANGE_FEED_POLL_INTERVAL = float(os.getenv("CHANGE_FEED_POLL_INTERVAL", "5"))
+CHANGE_FEED_HEARTBEAT = float(os.getenv("CHANGE_FEED_HEARTBEAT", "15"))
+CHANGE_FEED_RETENTION_HOURS = float(os.getenv("CHANGE_FEED_RETENTION_HOURS", "24"))
+CHANGE_FEED_MAX_STREAM_SECONDS = float(os.getenv("CHANGE_FEED_MAX_STREAM_SECONDS", "25"))
+CHANGE_FEED_RETRY_MS = int(os.getenv("CHANGE_FEED_RETRY_MS", "1000"))
+
+# PostgreSQL NOTIFY channel announcing committed events to every API instance
+CHANGE_CHANNEL = "change_events"
+PRUNE_INTERVAL = 3600
+# How soon the tail looks again while a missing event id may still commit
+GAP_RECHECK_INTERVAL = 0.2
+
+ENTITY_COLUMNS = {
+    ChangeTable.hospitals: (Hospital, response_columns(Hospital, HospitalResponseDTO)),
+    ChangeTable.patients: (Patient, response_columns(Patient, PatientResponseDTO)),
+}
+
+# (table, operation, ids of the changed rows); None ids are skipped
+Change = Tuple[ChangeTable, ChangeOperation, Iterable[Optional[int]]]
+# A buffered event: its id, its table and its encoded server-sent event
+FeedEntry = Tuple[int, str, str]
+
+logger = logging.getLogger(__name__)
+
+_RECORDED = "change_feed.recorded"
+
+async def record_changes(session: AsyncSession, *changes: Change) -> None:
+    """
+    Append change events in the caller's transaction.
+
+    Call it after the write, then bump_versions and commit. Event ids come from
+    a sequence, so concurrent writers never wait on each other here, but they
+    may commit out of id order; the ChangeFeed holds its cursor before an id
+    that may still commit. That relies on the transaction holding a transaction
+    id before its events take their ids, which on PostgreSQL is ensured here.
+    """
+    rows = [
+        {"table_name": table.value, "operation": operation, "entity_id": entity_id}
+        for table, operation, ids in changes for entity_id in ids if entity_id is not None
+    ]
+    if not rows:
+        return
+    if session.get_bind().dialect.name == "postgresql":
+        # txid_current assigns the transaction id even when no write was flushed yet;
+        # the notification is delivered on commit, to the feeds of all API instances
+        await session.execute(select(func.txid_current(), func.pg_notify(CHANGE_CHANNEL, "")))
+    await session.execute(insert(ChangeEvent), rows)
+    session.info[_RECORDED] = True
+
+async def read_events(
+    session: AsyncSession, after: int, upto: Optional[int] = None, limit: Optional[int] = None
+) -> List[ChangeEventDTO]:
+    """The first `limit` events with ids in (`after`, `upto`], each with the current state of its row."""
+    query = (
+        select(ChangeEvent.id, ChangeEvent.table_name, ChangeEvent.operation, ChangeEvent.entity_id, ChangeEvent.created_at)
+        .where(ChangeEvent.id > after)
+        .order_by(ChangeEvent.id)
+        .limit(limit)
+    )
+    if upto is not None:
+        query = query.where(ChangeEvent.id <= upto)
+    events = (await session.execute(query)).all()
+    rows: Dict[str, Dict[int, Dict[str, Any]]] = {}
+    for table, (entity, columns) in ENTITY_COLUMNS.items():
+        ids = {change.entity_id for change in events if change.table_name == table.value}
+        if ids:
+            result = await session.execute(select(*columns).where(entity.id.in_(ids)))
+            rows[table.value] = {row.id: row._asdict() for row in result}
+    return [
+        ChangeEventDTO(
+            id=change.id,
+            table=change.table_name,
+            operation=change.operation,
+            entity_id=change.entity_id,
+            data=rows.get(change.table_name, {}).get(change.entity_id),
+            created_at=change.created_at,
+        )
+        for change in events
+    ]
+
+def sse_message(event_type: str, data: Any, event_id: Optional[int] = None) -> str:
+    """Encode one server-sent event; its `id` is what the browser sends back as Last-Event-ID."""
+    lines = [] if event_id is None else [f"id: {event_id}"]
+    lines += [f"event: {event_type}", f"data: {to_json(data).decode()}"]
+    return "\n".join(lines) + "\n\n"
+
+class ChangeFeed:
+    """
+    Fans the committed hospital and patient changes out to this process's subscribers.
+
+    One tail task reads new events into a ring buffer, encoded once, from which
+    every subscriber is served: a burst of writes costs an id lookup and one
+    query per table, however many dashboards are connected. The tail wakes right
+    after this process commits a change, on NOTIFY for changes committed by other
+    instances (PostgreSQL), and every `poll_interval` seconds regardless.
+    Subscribers that fall behind the buffer catch up from the change_events table.
+    """
+
+    def __init__(
+        self,
+        buffer_size: int = CHANGE_FEED_BUFFER_SIZE,
+        poll_interval: float = CHANGE_FEED_POLL_INTERVAL,
+        heartbeat: float = CHANGE_FEED_HEARTBEAT,
+        retention_hours: float = CHANGE_FEED_RETENTION_HOURS,
+        max_stream_seconds: float = CHANGE_FEED_MAX_STREAM_SECONDS,
+    ):
+        self.buffer: Deque[FeedEntry] = deque(maxlen=buffer_size)
+        self.poll_interval = poll_interval
+        self.heartbeat = heartbeat
+        self.retention_hours = retention_hours
+        self.max_stream_seconds = max_stream_seconds
+        # Id of the latest event read by the tail; no event before it can still commit
+        self.cursor = 0
+        # The first missing id after the cursor and the xmax of the snapshot that saw it missing
+        self._gap: Optional[Tuple[int, int]] = None
+        self.running = False
+        self._session_factory: Optional[async_sessionmaker] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._wake: Optional[asyncio.Event] = None
+        self._changed: Optional[asyncio.Condition] = None
+        self._task: Optional[asyncio.Task] = None
+        self._listener: Optional[AsyncConnection] = None
+        self._pruned_at: Optional[float] = None
+
+    async def start(self, engine: AsyncEngine) -> None:
+        self._session_factory = async_sessionmaker(bind=engine, class_=AsyncSession, autoflush=False, expire_on_commit=False)
+        self._loop = asyncio.get_running_loop()
+        self._wake = asyncio.Event()
+        self._changed = asyncio.Condition()
+        async with self._session_factory() as session:
+            self._rewind(await session.scalar(select(func.max(ChangeEvent.id))) or 0)
+        await self.read_new_events()
+        if engine.dialect.name == "postgresql":
+            await self._listen(engine)
+        self.running = True
+        _feeds.add(self)
+        self._task = asyncio.create_task(self._tail())
+
+    async def stop(self) -> None:
+        """Stop the tail and end every subscriber's stream; clients reconnect with their Last-Event-ID."""
+        if not self.running:
+            return
+        self.running = False
+        _feeds.discard(self)
+        self._task.cancel()
+        await asyncio.gather(self._task, return_exceptions=True)
+        async with self._changed:
+            self._changed.notify_all()
+        if self._listener is not None:
+            await self._listener.close()
+            self._listener = None
+
+    async def _listen(self, engine: AsyncEngine) -> None:
+        """LISTEN on a dedicated connection; without it the tail still polls."""
+        try:
+            self._listener = await engine.connect()
+            raw = await self._listener.get_raw_connection()
+            await raw.driver_connection.add_listener(CHANGE_CHANNEL, lambda *args: self._wake.set())
+        except Exception:
+            logger.warning("Could not LISTEN for change events; polling every %ss instead", self.poll_interval, exc_info=True)
+            if self._listener is not None:
+                await self._listener.close()
+                self._listener = None
+
+    def wake(self) -> None:
+        """Have the tail read new events now. Safe to call from any thread."""
+        if self.running:
+            try:
+                self._loop.call_soon_threadsafe(self._wake.set)
+            except RuntimeError:  # the loop is closed
+                pass
+
+    async def _tail(self) -> None:
+        while True:
+            try:
+                await asyncio.wait_for(
+                    self._wake.wait(),
+                    self.poll_interval if self._gap is None else min(self.poll_interval, GAP_RECHECK_INTERVAL),
+                )
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            try:
+                await self.read_new_events()
+                await self._prune()
+            except Exception:
+                logger.exception("Could not read the change events")
+
+    def _rewind(self, latest: int) -> None:
+        """Start over from the events just before `latest`."""
+        self.buffer.clear()
+        self.cursor = max(latest - self.buffer.maxlen, 0)
+        self._gap = None
+
+    async def read_new_events(self) -> None:
+        """Move the buffer up to the latest settled event and wake the subscribers."""
+        async with self._session_factory() as session:
+            snapshot = await self._snapshot(session)
+            latest = await session.scalar(select(func.max(ChangeEvent.id)))
+            if latest is None or latest == self.cursor:
+                return
+            if latest < self.cursor:
+                # Ids went back (a restored database); what was buffered no longer applies
+                self._rewind(latest)
+            events = await read_events(session, self.cursor, limit=self.buffer.maxlen)
+        settled = self._settle(events, snapshot)
+        if settled and len(settled) == self.buffer.maxlen:
+            # A backlog larger than the buffer; read on right away
+            self._wake.set()
+        if not settled:
+            return
+        self.buffer.extend((change.id, change.table.value, sse_message("change", change, change.id)) for change in settled)
+        self.cursor = settled[-1].id
+        async with self._changed:
+            self._changed.notify_all()
+
+    async def _snapshot(self, session: AsyncSession) -> Optional[Tuple[int, int]]:
+        """
+        The xmin and xmax of the PostgreSQL snapshot the session reads events from.
+
+        The session's transaction is made REPEATABLE READ, so its later queries see
+        the same snapshot. None on other databases.
+        """
+        if session.get_bind().dialect.name != "postgresql":
+            return None
+        await session.connection(execution_options={"isolation_level": "REPEATABLE READ"})
+        current = func.txid_current_snapshot()
+        xmin, xmax = (await session.execute(select(func.txid_snapshot_xmin(current), func.txid_snapshot_xmax(current)))).one()
+        return xmin, xmax
+
+    def _settle(self, events: List[ChangeEventDTO], snapshot: Optional[Tuple[int, int]]) -> List[ChangeEventDTO]:
+        """
+        The leading `events` that no event still in flight can come before.
+
+        Ids are taken before commit, so a missing id may belong to a transaction
+        that has yet to commit. That transaction wrote before taking the id, so its
+        xid is below the xmax of the snapshot that saw a later event without it:
+        once the xmin of a later snapshot reaches that xmax, it has ended and the
+        id is gone for good (rolled back). Without snapshots (SQLite, where writers
+        are serialized) a missing id is always gone.
+        """
+        settled: List[ChangeEventDTO] = []
+        cursor = self.cursor
+        for change in events:
+            if change.id > cursor + 1 and snapshot is not None:
+                xmin, xmax = snapshot
+                if self._gap is None or self._gap[0] != cursor + 1:
+                    self._gap = (cursor + 1, xmax)
+                if xmin < self._gap[1]:
+                    break
+            settled.append(change)
+            cursor = change.id
+        if self._gap is not None and self._gap[0] <= cursor:
+            self._gap = None
+        return settled
+
+    async def _prune(self) -> None:
+        if not self.retention_hours or (self._pruned_at is not None and time.monotonic() - self._pruned_at < PRUNE_INTERVAL):
+            return
+        self._pruned_at = time.monotonic()
+        cutoff = datetime.now(timezone.utc) - timedelta(hours=self.retention_hours)
+        async with self._session_factory() as session:
+            await session.execute(delete(ChangeEvent).where(ChangeEvent.created_at < cutoff))
+            await session.commit()
+
+    async def _entries_after(self, cursor: int) -> Tuple[List[FeedEntry], int, bool]:
+        """
+        The next events after `cursor`, the cursor they lead to, and whether none are missing.
+
+        Events are missing once they were pruned: the oldest event left is past the
+        one after `cursor` (which, rarely, is only a rolled-back id).
+        """
+        upto = self.cursor
+        if self.buffer and self.buffer[0][0] <= cursor + 1:
+            entries = [entry for entry in self.buffer if cursor < entry[0] <= upto]
+            return entries, upto, True
+        async with self._session_factory() as session:
+            events = await read_events(session, cursor, upto, limit=self.buffer.maxlen)
+            oldest = await session.scalar(select(func.min(ChangeEvent.id)))
+        if len(events) == self.buffer.maxlen:
+            upto = events[-1].id
+        entries = [(change.id, change.table.value, sse_message("change", change, change.id)) for change in events]
+        return entries, upto, oldest is not None and oldest <= cursor + 1
+
+    async def stream(self, cursor: Optional[int] = None, tables: Iterable[ChangeTable] = tuple(ChangeTable)) -> AsyncIterator[str]:
+        """
+        Server-sent events of the changes after `cursor`, for up to `max_stream_seconds`.
+
+        Without a cursor the stream starts at the latest event. Each `change` event's
+        id is the cursor to resume from. A `reset` event means changes after the
+        client's cursor are no longer available: the client reloads what it shows and
+        continues from the reset's id. Comments are sent while idle to keep proxies
+        from closing the connection.
+
+        Streams end after `max_stream_seconds`, and clients reconnect from their
+        last event id: servers such as uvicorn wait for open responses before
+        shutting down, and reconnecting spreads clients over new instances.
+        """
+        tables = {table.value for table in tables}
+        if cursor is not None and cursor > self.cursor:
+            # Possibly written by another instance this one has not caught up with yet
+            await self.read_new_events()
+        unknown = cursor is not None and cursor > self.cursor
+        if cursor is None or unknown:
+            cursor = self.cursor
+        yield f"retry: {CHANGE_FEED_RETRY_MS}\n" + sse_message("ready", {"cursor": cursor}, cursor)
+        if unknown:
+            yield sse_message("reset", {"cursor": cursor}, cursor)
+
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.max_stream_seconds
+        while self.running and loop.time() < deadline:
+            if cursor >= self.cursor:
+                try:
+                    async with self._changed:
+                        await asyncio.wait_for(
+                            self._changed.wait_for(lambda: not self.running or self.cursor != cursor),
+                            min(self.heartbeat, max(deadline - loop.time(), 0)),
+                        )
+                except asyncio.TimeoutError:
+                    yield ": keepalive\n\n"
+                if cursor > self.cursor:
+                    # Ids went back (a restored database)
+                    cursor = self.cursor
+                    yield sse_message("reset", {"cursor": cursor}, cursor)
+                continue
+            entries, upto, complete = await self._entries_after(cursor)
+            if not complete:
+                cursor = self.cursor
+                yield sse_message("reset", {"cursor": cursor}, cursor)
+                continue
+            cursor = upto
+            messages = [message for _, table, message in entries if table in tables]
+            if messages:
+                yield "".join(messages)
+
+_feeds: "weakref.WeakSet[ChangeFeed]" = weakref.WeakSet()
+
+@event.listens_for(Session, "after_commit")
+def _wake_feeds(session: Session) -> None:
+    if session.info.pop(_RECORDED, False):
+        for feed in list(_feeds):
+            feed.wake()
+
+@event.listens_for(Session, "after_rollback")
+def _discard_recorded(session: Session) -> None:
+    session.info.pop(_RECORDED, None)
+
+change_feed = ChangeFeed()
@@ -0,0 +1,75 @@
+import hashlib
+from typing import Callable, Dict, List, Optional
+
+from fastapi import Depends, HTTPException, Request, Response, status
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from model.entities.database import get_db
+from service.version_service import get_versions
+
+# Suffixes the compression middleware appends to the ETag of an encoded representation
+ENCODING_SUFFIXES = ("-gzip", "-br")
+
+def make_etag(request: Request, versions: Dict[str, int]) -> str:
+    """Strong ETag for the response to `request` given the change counters of the tables it reads."""
+    query = sorted(request.query_params.multi_items())
+    digest = hashlib.sha1(f"{request.url.path}?{query}".encode()).hexdigest()[:16]
+    tag = ".".join(f"{table}.{version}" for table, version in sorted(versions.items()))
+    return f'"{tag}-{digest}"'
+
+def _strip_tag(tag: str) -> str:
+    tag = tag.strip()
+    if tag.startswith("W/"):
+        tag = tag[2:]
+    for suffix in ENCODING_SUFFIXES:
+        if tag.endswith(suffix + '"'):
+            return tag[:-len(suffix) - 1] + '"'
+    return tag
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Weak comparison of an If-None-Match header against `etag`, ignoring content-coding suffixes."""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    return any(_strip_tag(tag) == etag for tag in if_none_match.split(","))
+
+def row_etag(version: int) -> str:
+    """Strong ETag of a single hospital or patient: its row version."""
+    return f'"v{version}"'
+
+def parse_if_match(if_match: Optional[str]) -> Optional[List[int]]:
+    """
+    The row versions an If-Match header accepts, or None when any version is accepted.
+
+    Raises:
+        HTTPException: 412 Precondition Failed if no entity tag is a row ETag, since none can match
+    """
+    if not if_match or if_match.strip() == "*":
+        return None
+    versions = []
+    for tag in if_match.split(","):
+        tag = _strip_tag(tag)
+        if tag.startswith('"v') and tag.endswith('"') and tag[2:-1].isdigit():
+            versions.append(int(tag[2:-1]))
+    if not versions:
+        raise HTTPException(status_code=status.HTTP_412_PRECONDITION_FAILED, detail="If-Match does not name a version of this resource")
+    return versions
+
+def conditional_get(*tables: str) -> Callable:
+    """
+    Build a dependency that answers 304 Not Modified when the client's copy is current.
+
+    The ETag only depends on the change counters of `tables` and the request URL,
+    so an unchanged listing is answered with one primary key lookup, without
+    running the listing query or serializing the response.
+    """
+    async def dependency(request: Request, response: Response, db: AsyncSession = Depends(get_db)) -> str:
+        # Read the versions before the data: the body is then never older than its ETag
+        etag = make_etag(request, await get_versions(db, *tables))
+        headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+        if etag_matches(request.headers.get("if-none-match"), etag):
+            raise HTTPException(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+        response.headers.update(headers)
+        return etag
+    return dependency
@@ -1,82 +1,282 @@
 from fastapi import HTTPException
+from model.entities.change_event import ChangeOperation, ChangeTable
 from model.entities.hospital import Hospital
 from model.entities.patient import Patient
-from model.dtos.hospital import HospitalCreateDTO, HospitalResponseDTO, HospitalUpdateDTO
-from model.dtos.patient import PatientCreateDTO, PatientResponseDTO
-from model.entities.database import  SessionLocal
+from model.dtos.hospital import (
+    HospitalAssignPatientsResponseDTO,
+    HospitalCreateDTO,
+    HospitalResponseDTO,
+    HospitalUpdateDTO,
+    PatientAssignmentResultDTO,
+)
+from model.dtos.patient import PatientCreateDTO, PatientFilterDTO, PatientResponseDTO
+from model.dtos.pagination import PaginationDTO
+from service.patient_service import PATIENT_COLUMNS, PATIENT_PAGE_ADAPTER, filter_patients
+from service.query_utils import paginate
+from service.occupancy_service import lock_hospitals, release_beds, reserve_beds
+from service.cache_service import ReadThroughCache, no_cache
+from service.version_service import bump_versions, get_versions
+from service.change_feed_service import record_changes
+from service.serialization_utils import response_columns
 
-from sqlalchemy import select, func
-from typing import List
+from pydantic import TypeAdapter
+from sqlalchemy import Row, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from collections import Counter
+from typing import Awaitable, Callable, Iterable, List, Optional, Sequence
+
+# Tries of a batch assignment whose patients keep being moved by concurrent requests
+ASSIGN_ATTEMPTS = 3
+HOSPITAL_COLUMNS = response_columns(Hospital, HospitalResponseDTO)
+HOSPITAL_ADAPTER = TypeAdapter(HospitalResponseDTO)
+HOSPITAL_PAGE_ADAPTER = TypeAdapter(List[HospitalResponseDTO])
 
 class HospitalService:
-    def __init__(self):
-        self.session = SessionLocal()
+    def __init__(self, session: AsyncSession, cache: ReadThroughCache = no_cache):
+        self.session = session
+        self.cache = cache
+
+    async def _invalidate(self, hospital_ids: Iterable[Optional[int]] = (), patient_ids: Iterable[int] = ()) -> None:
+        """Drop the cached hospitals and patients a committed write touched."""
+        await self.cache.invalidate("hospital", *(hospital_id for hospital_id in hospital_ids if hospital_id is not None))
+        await self.cache.invalidate("patient", *patient_ids)
 
-    def create_hospital(self, hospital: HospitalCreateDTO) -> HospitalResponseDTO:
+    async def create_hospital(self, hospital: HospitalCreateDTO) -> HospitalResponseDTO:
         db_hospital = Hospital(**hospital.model_dump())
         self.session.add(db_hospital)
-        self.session.commit()
-        self.session.refresh(db_hospital)
-        return HospitalResponseDTO(**db_hospital.__dict__)
+        await self.session.flush()
+        await record_changes(self.session, (ChangeTable.hospitals, ChangeOperation.created, [db_hospital.id]))
+        await bump_versions(self.session, "hospitals")
+        await self.session.commit()
+        await self.session.refresh(db_hospital)
+        await self._invalidate()
+        return HospitalResponseDTO.model_validate(db_hospital)
+
+    async def get_all_hospitals(self, pagination: Optional[PaginationDTO] = None) -> List[HospitalResponseDTO]:
+        async def load():
+            result = await self.session.execute(paginate(select(*HOSPITAL_COLUMNS), Hospital.id, pagination))
+            return HOSPITAL_PAGE_ADAPTER.validate_python(result.all(), from_attributes=True)
+        page = "all" if pagination is None else f"{pagination.limit}:{pagination.cursor}"
+        # Keyed on the committed table version, like the list ETag, so a page is never older than its ETag
+        version = (await get_versions(self.session, "hospitals"))["hospitals"]
+        return await self.cache.get_or_load("hospitals", f"{version}:{page}", HOSPITAL_PAGE_ADAPTER, load)
 
-    def get_all_hospitals(self) -> List[HospitalResponseDTO]:
-        result = self.session.execute(select(Hospital))
-        hospitals = result.scalars().all()
-        return [HospitalResponseDTO(**h.__dict__) for h in hospitals]
+    async def get_hospital_by_id(self, hospital_id: int) -> HospitalResponseDTO:
+        async def load():
+            row = (await self.session.execute(select(*HOSPITAL_COLUMNS).where(Hospital.id == hospital_id))).one_or_none()
+            if row is None:
+                raise HTTPException(status_code=404, detail="Hospital not found")
+            return HospitalResponseDTO.model_validate(row)
+        return await self.cache.get_or_load("hospital", hospital_id, HOSPITAL_ADAPTER, load)
 
-    def get_hospital_by_id(self, hospital_id: int) -> Hospital:
-        result = self.session.execute(select(Hospital).where(Hospital.id == hospital_id))
+    async def _get_hospital(self, hospital_id: int, lock: bool = False) -> Hospital:
+        query = select(Hospital).where(Hospital.id == hospital_id)
+        result = await self.session.execute(query.with_for_update() if lock else query)
         hospital = result.scalar_one_or_none()
         if not hospital:
             raise HTTPException(status_code=404, detail="Hospital not found")
         return hospital
 
-    def update_hospital(self, hospital_id: int, hospital: HospitalUpdateDTO) -> Hospital:
-        db_hospital = self.get_hospital_by_id(hospital_id)
-        for key, value in hospital.model_dump().items():
-            setattr(db_hospital, key, value)
-        self.session.commit()
-        self.session.refresh(db_hospital)
-        return db_hospital
-
-    def delete_hospital(self, hospital_id: int) -> bool:
-        db_hospital = self.get_hospital_by_id(hospital_id)
-        self.session.delete(db_hospital)
-        self.session.commit()
-        return True
+    async def update_hospital(self, hospital_id: int, hospital: HospitalUpdateDTO, expected_versions: Optional[List[int]] = None) -> HospitalResponseDTO:
+        """
+        Change the fields set in `hospital`, leaving the others as they are.
+
+        One UPDATE ... RETURNING changes the row, increments its version and reads it
+        back; with `expected_versions` (from If-Match) it only applies while the row
+        still has one of them, so a concurrent edit fails with 412.
+        """
+        conditions = [Hospital.id == hospital_id]
+        if expected_versions is not None:
+            conditions.append(Hospital.version.in_(expected_versions))
+        values = hospital.model_dump(exclude_unset=True)
+        if not values:
+            row = (await self.session.execute(select(*HOSPITAL_COLUMNS).where(*conditions))).one_or_none()
+        else:
+            row = (await self.session.execute(
+                update(Hospital)
+                .where(*conditions)
+                .values(**values, version=Hospital.version + 1)
+                .returning(*HOSPITAL_COLUMNS)
+                .execution_options(synchronize_session=False)
+            )).one_or_none()
+        if row is None:
+            await self.session.rollback()
+            await self._get_hospital(hospital_id)  # 404 if the hospital doesn't exist
+            raise HTTPException(
+                status_code=412,
+                detail="The hospital was modified concurrently, reload it and retry"
+            )
+        if values:
+            await record_changes(self.session, (ChangeTable.hospitals, ChangeOperation.updated, [hospital_id]))
+            await bump_versions(self.session, "hospitals")
+            await self.session.commit()
+            await self._invalidate([hospital_id])
+        return HospitalResponseDTO.model_validate(row)
 
-    def add_patient_to_hospital(self, hospital_id: int, patient_id: int) -> PatientResponseDTO:
-        # Verify hospital exists
-        hospital = self.get_hospital_by_id(hospital_id)
+    async def delete_hospital(self, hospital_id: int) -> bool:
+        # Lock the hospital before its patients, in the order assignments take them
+        db_hospital = await self._get_hospital(hospital_id, lock=True)
+        # Deleting the hospital unassigns its patients, so their cached entries go stale too
+        patient_ids = (await self.session.scalars(
+            update(Patient)
+            .where(Patient.hospital_id == hospital_id)
+            .values(hospital_id=None, version=Patient.version + 1)
+            .returning(Patient.id)
+            .execution_options(synchronize_session=False)
+        )).all()
+        await self.session.delete(db_hospital)
+        await record_changes(
+            self.session,
+            (ChangeTable.hospitals, ChangeOperation.deleted, [hospital_id]),
+            (ChangeTable.patients, ChangeOperation.updated, patient_ids),
+        )
+        await bump_versions(self.session, "hospitals", "patients")
+        await self.session.commit()
+        await self._invalidate([hospital_id], patient_ids)
+        return True
 
-        # Verify patient exists
-        result = self.session.execute(select(Patient).where(Patient.id == patient_id))
-        patient = result.scalar_one_or_none()
+    async def add_patient_to_hospital(self, hospital_id: int, patient_id: int) -> PatientResponseDTO:
+        # Verify patient exists; the row is only read, so skip loading an entity
+        result = await self.session.execute(select(*PATIENT_COLUMNS).where(Patient.id == patient_id))
+        patient = result.one_or_none()
         if not patient:
             raise HTTPException(status_code=404, detail="Patient not found")
 
         # Check if patient is already assigned to this hospital
-        if patient.hospital_id == hospital.id: # type: ignore
+        previous_hospital_id = patient.hospital_id
+        if previous_hospital_id == hospital_id:
             raise HTTPException(
                 status_code=400,
                 detail="The patient is already assigned to this hospital"
             )
 
-        # Check hospital capacity
-        if len(hospital.patients) >= hospital.capacity:  # type: ignore
+        if previous_hospital_id is not None:
+            # A move changes two hospitals; lock both in id order so opposite moves cannot deadlock
+            await lock_hospitals(self.session, hospital_id, previous_hospital_id)
+
+        # Take a bed with a single conditional UPDATE instead of counting patients
+        if not await reserve_beds(self.session, hospital_id):
+            await self.session.rollback()
+            await self._get_hospital(hospital_id)  # 404 if the hospital doesn't exist
             raise HTTPException(
                 status_code=400,
                 detail="The hospital reached its maximum capacity"
             )
 
-        # Assign patient to hospital
-        patient.hospital_id = hospital.id
-        self.session.commit()
-        self.session.refresh(patient)
-        return PatientResponseDTO(**patient.__dict__)
-
-    def get_hospital_patients(self, hospital_id: int) -> List[PatientResponseDTO]:
-        self.get_hospital_by_id(hospital_id)  # Verify hospital exists
-        result = self.session.execute(select(Patient).where(Patient.hospital_id == hospital_id))
-        patients = result.scalars().all()
-        return [PatientResponseDTO(**p.__dict__) for p in patients] 
\ No newline at end of file
+        # Assign patient to hospital, unless a concurrent request moved them first
+        moved = await self.session.execute(
+            update(Patient)
+            .where(Patient.id == patient_id, Patient.hospital_id.is_not_distinct_from(previous_hospital_id))
+            .values(hospital_id=hospital_id, version=Patient.version + 1)
+            .execution_options(synchronize_session=False)
+        )
+        if moved.rowcount != 1:
+            await self.session.rollback()
+            raise HTTPException(
+                status_code=409,
+                detail="The patient was reassigned concurrently, please retry"
+            )
+        if previous_hospital_id is not None:
+            await release_beds(self.session, previous_hospital_id)
+        await record_changes(
+            self.session,
+            (ChangeTable.hospitals, ChangeOperation.updated, [hospital_id, previous_hospital_id]),
+            (ChangeTable.patients, ChangeOperation.updated, [patient_id]),
+        )
+        await bump_versions(self.session, "hospitals", "patients")
+        await self.session.commit()
+        await self._invalidate([hospital_id, previous_hospital_id], [patient_id])
+        # The UPDATE above is the only change, so skip a re-read
+        return PatientResponseDTO.model_validate(patient).model_copy(update={"hospital_id": hospital_id, "version": patient.version + 1})
+
+    async def add_patients_to_hospital(
+        self,
+        hospital_id: int,
+        patient_ids: List[int],
+        before_commit: Optional[Callable[[HospitalAssignPatientsResponseDTO], Awaitable[None]]] = None,
+    ) -> HospitalAssignPatientsResponseDTO:
+        """
+        Assign a batch of patients to a hospital in one transaction.
+
+        The hospital and patient rows are locked once, capacity is checked once for
+        the whole batch and the patients are moved with a single UPDATE. Patients are
+        admitted in request order until the hospital is full.
+
+        Like single assignments, the batch locks every hospital it changes (in id
+        order) before the patients. Their current hospitals are read first without a
+        lock; if one of them moved before the patients were locked, the batch starts over.
+
+        `before_commit` is awaited with the outcome right before the commit, so the
+        caller's own writes (a job's progress) commit together with the batch.
+        """
+        patient_ids = list(dict.fromkeys(patient_ids))
+        for _ in range(ASSIGN_ATTEMPTS):
+            seen = set((await self.session.scalars(select(Patient.hospital_id).where(Patient.id.in_(patient_ids)))).all())
+            hospital = (await lock_hospitals(self.session, hospital_id, *seen)).get(hospital_id)
+            if hospital is None:
+                await self.session.rollback()
+                raise HTTPException(status_code=404, detail="Hospital not found")
+            current_hospitals = dict((await self.session.execute(
+                select(Patient.id, Patient.hospital_id)
+                .where(Patient.id.in_(patient_ids))
+                .with_for_update()
+            )).all())
+            if set(current_hospitals.values()) <= seen | {hospital_id}:
+                break
+            await self.session.rollback()
+        else:
+            raise HTTPException(
+                status_code=409,
+                detail="The patients were reassigned concurrently, please retry"
+            )
+
+        free_beds = max((hospital.capacity or 0) - hospital.current_patients, 0)
+        accepted: List[int] = []
+        results: List[PatientAssignmentResultDTO] = []
+        for patient_id in patient_ids:
+            if patient_id not in current_hospitals:
+                outcome = "not_found"
+            elif current_hospitals[patient_id] == hospital_id:
+                outcome = "already_assigned"
+            elif len(accepted) < free_beds:
+                outcome = "assigned"
+                accepted.append(patient_id)
+            else:
+                outcome = "over_capacity"
+            results.append(PatientAssignmentResultDTO(patient_id=patient_id, status=outcome))
+
+        previous = Counter(current_hospitals[patient_id] for patient_id in accepted)
+        if accepted:
+            await self.session.execute(
+                update(Patient)
+                .where(Patient.id.in_(accepted))
+                .values(hospital_id=hospital_id, version=Patient.version + 1)
+                .execution_options(synchronize_session=False)
+            )
+            await reserve_beds(self.session, hospital_id, len(accepted))
+            for previous_hospital_id, count in previous.items():
+                if previous_hospital_id is not None:
+                    await release_beds(self.session, previous_hospital_id, count)
+            await record_changes(
+                self.session,
+                (ChangeTable.hospitals, ChangeOperation.updated, [hospital_id, *previous]),
+                (ChangeTable.patients, ChangeOperation.updated, accepted),
+            )
+            await bump_versions(self.session, "hospitals", "patients")
+        response = HospitalAssignPatientsResponseDTO(assigned=len(accepted), results=results)
+        if before_commit is not None:
+            await before_commit(response)
+        await self.session.commit()
+        if accepted:
+            await self._invalidate([hospital_id, *previous], accepted)
+        return response
+
+    async def get_hospital_patients(self, hospital_id: int, pagination: Optional[PaginationDTO] = None, filters: Optional[PatientFilterDTO] = None) -> List[PatientResponseDTO]:
+        rows = await self.get_hospital_patient_rows(hospital_id, pagination, filters)
+        return PATIENT_PAGE_ADAPTER.validate_python(rows, from_attributes=True)
+
+    async def get_hospital_patient_rows(self, hospital_id: int, pagination: Optional[PaginationDTO] = None, filters: Optional[PatientFilterDTO] = None) -> Sequence[Row]:
+        """A page of the hospital's patients as rows of the response columns, ready for `encode_rows`."""
+        await self.get_hospital_by_id(hospital_id)  # Verify hospital exists
+        query = filter_patients(select(*PATIENT_COLUMNS).where(Patient.hospital_id == hospital_id), filters)
+        return (await self.session.execute(paginate(query, Patient.id, pagination))).all()
@@ -0,0 +1,115 @@
+import codecs
+import json
+from fastapi import HTTPException, Request, status
+from typing import Any, AsyncIterable, AsyncIterator
+
+NDJSON_MEDIA_TYPES = ("application/x-ndjson", "application/ndjson", "application/jsonl")
+
+async def iter_json_records(request: Request) -> AsyncIterator[Any]:
+    """
+    Yield the records of a JSON array or NDJSON request body.
+
+    NDJSON bodies are decoded line by line while they stream in. A line that is
+    not valid JSON is yielded as a ValueError so the caller can report it
+    against its position instead of rejecting the whole upload.
+    """
+    if is_ndjson(request):
+        async for record in iter_ndjson_records(request.stream()):
+            yield record
+        return
+
+    try:
+        records = json.loads(await request.body())
+    except ValueError:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Request body is not valid JSON.")
+    if not isinstance(records, list):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Expected a JSON array of records.")
+    for record in records:
+        yield record
+
+def is_ndjson(request: Request) -> bool:
+    content_type = request.headers.get("content-type", "").split(";")[0].strip().lower()
+    return content_type in NDJSON_MEDIA_TYPES
+
+async def iter_ndjson_records(chunks: AsyncIterable[bytes]) -> AsyncIterator[Any]:
+    """Yield the records of an NDJSON byte stream, decoding each line as soon as it is complete."""
+    pending = b""
+    async for chunk in chunks:
+        pending += chunk
+        *lines, pending = pending.split(b"\n")
+        for line in lines:
+            if line.strip():
+                yield _decode_line(line)
+    if pending.strip():
+        yield _decode_line(pending)
+
+def _decode_line(line: bytes) -> Any:
+    try:
+        return json.loads(line)
+    except ValueError as e:
+        return ValueError(f"Invalid JSON: {e}")
+
+async def iter_json_array_records(chunks: AsyncIterable[bytes]) -> AsyncIterator[Any]:
+    """
+    Yield the elements of a JSON array byte stream, decoding each as soon as it is complete.
+
+    Only the unread part of the current chunk is held in memory, not the whole array.
+
+    Raises:
+        ValueError: if the stream is not a JSON array
+    """
+    decoder = json.JSONDecoder()
+    utf8 = codecs.getincrementaldecoder("utf-8")()
+    chunks = aiter(chunks)
+    text, pos, finished = "", 0, False
+    # "[" expected, then a value or "]", then "," or "]" after each value
+    expect = "["
+
+    while True:
+        while pos < len(text) and text[pos].isspace():
+            pos += 1
+        if expect == "value" and pos < len(text) and not finished:
+            try:
+                record, end = decoder.raw_decode(text, pos)
+            except json.JSONDecodeError:
+                end = len(text)
+            # Unless a delimiter follows, the value may continue in the next chunk ("3." of "3.5")
+            if end < len(text) and (text[end].isspace() or text[end] in ",]"):
+                yield record
+                expect, pos = ",", end
+                continue
+        elif pos < len(text) or finished:
+            char = text[pos] if pos < len(text) else ""
+            if expect == "[" and char == "[":
+                expect, pos = "value or ]", pos + 1
+                continue
+            if expect == "value or ]" and char != "]":
+                expect = "value"
+                continue
+            if expect in ("value or ]", ",") and char == "]":
+                expect, pos = "end", pos + 1
+                continue
+            if expect == "," and char == ",":
+                expect, pos = "value", pos + 1
+                continue
+            if expect == "end" and not char:
+                return
+            if expect == "value":
+                # The last chunk was read: decode what is left, or report why it is invalid
+                try:
+                    record, end = decoder.raw_decode(text, pos)
+                except json.JSONDecodeError as e:
+                    raise ValueError(f"Invalid JSON: {e}") from None
+                yield record
+                expect, pos = ",", end
+                continue
+            if expect == "[":
+                raise ValueError("Expected a JSON array of records.")
+            if not char:
+                raise ValueError("Invalid JSON: the array is not closed")
+            raise ValueError("Invalid JSON: expected ',' or ']' after a record" if expect == "," else "Invalid JSON: extra data after the array")
+        try:
+            chunk = await anext(chunks)
+        except StopAsyncIteration:
+            chunk, finished = b"", True
+        text, pos = text[pos:] + utf8.decode(chunk, final=finished), 0
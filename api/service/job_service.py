@@ -0,0 +1,542 @@
+import asyncio
+import concurrent.futures
+import logging
+import os
+import socket
+import tempfile
+import threading
+import time
+import uuid
+from collections import Counter
+from functools import lru_cache
+from datetime import datetime, timedelta, timezone
+from typing import Any, AsyncIterable, AsyncIterator, Callable, Dict, List, Optional, Set
+
+from fastapi import HTTPException, status
+from sqlalchemy import and_, func, or_, select, update
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+
+from model.dtos.hospital import HospitalAssignPatientsResponseDTO
+from model.dtos.job import ExportJobDTO, JobDTO, ReassignJobDTO
+from model.dtos.patient import ExportFormat
+from model.entities.database import DATABASE_URL, engine_options
+from model.entities.job import Job, JobKind, JobStatus
+from model.entities.patient import Patient
+from service.cache_service import ReadThroughCache, no_cache, response_cache
+from service.hospital_service import HospitalService
+from service.ingest_utils import iter_json_array_records, iter_ndjson_records
+from service.patient_service import EXPORT_COLUMNS, PatientService, export_header, filter_patients, format_export_rows
+
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "1"))
+JOB_BATCH_SIZE = int(os.getenv("JOB_BATCH_SIZE", "1000"))
+JOB_DB_POOL_SIZE = int(os.getenv("JOB_DB_POOL_SIZE", "2"))
+JOB_RESULTS_DIR = os.getenv("JOB_RESULTS_DIR") or os.path.join(tempfile.gettempdir(), "healthcare-jobs")
+JOB_STOP_TIMEOUT = float(os.getenv("JOB_STOP_TIMEOUT", "10"))
+JOB_LEASE_SECONDS = float(os.getenv("JOB_LEASE_SECONDS", "60"))
+JOB_POLL_INTERVAL = float(os.getenv("JOB_POLL_INTERVAL", "15"))
+# Identifies this process in `jobs.claimed_by`
+JOB_WORKER_ID = os.getenv("JOB_WORKER_ID") or f"{socket.gethostname()}:{os.getpid()}"
+
+RESULT_MEDIA_TYPES = {"csv": "text/csv", "ndjson": "application/x-ndjson"}
+
+logger = logging.getLogger(__name__)
+
+SessionFactory = Callable[[], AsyncSession]
+
+class JobLeaseLost(Exception):
+    """The job's lease expired and another runner claimed it; this runner must stop working on it."""
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc)
+
+def _lease_expiry() -> datetime:
+    return _now() + timedelta(seconds=JOB_LEASE_SECONDS)
+
+def _claimable(now: datetime, storage_id: str):
+    """
+    Jobs a runner may claim: queued ones, and running ones whose runner stopped
+    renewing its lease, if the runner can reach their files.
+    """
+    return and_(
+        or_(Job.storage_id.is_(None), Job.storage_id == storage_id),
+        or_(
+            Job.status == JobStatus.queued,
+            and_(Job.status == JobStatus.running, or_(Job.lease_expires_at.is_(None), Job.lease_expires_at < now)),
+        ),
+    )
+
+@lru_cache
+def results_storage_id(results_dir: str = JOB_RESULTS_DIR) -> str:
+    """
+    Id of the storage behind `results_dir`, written there by the first process using it.
+
+    Processes sharing the volume read the same id, so a job's files are reachable
+    by any process whose id matches the job's `storage_id`. Raises OSError if the
+    directory is not writable, which fails the job runner's start.
+    """
+    os.makedirs(results_dir, exist_ok=True)
+    path = os.path.join(results_dir, ".storage-id")
+    if not os.path.exists(path):
+        candidate = os.path.join(results_dir, f".storage-id.{uuid.uuid4().hex}")
+        with open(candidate, "w") as f:
+            f.write(uuid.uuid4().hex)
+        try:
+            # Atomic, and fails if another process created the id first
+            os.link(candidate, path)
+        except FileExistsError:
+            pass
+        finally:
+            os.remove(candidate)
+    with open(path) as f:
+        return f.read().strip()
+
+def input_path(job_id: str, results_dir: str = JOB_RESULTS_DIR) -> str:
+    return os.path.join(results_dir, f"{job_id}.input")
+
+def result_path(job: Job, results_dir: str = JOB_RESULTS_DIR) -> Optional[str]:
+    """File holding the downloadable result of `job`, for the kinds that produce one."""
+    if job.kind == JobKind.export:
+        return os.path.join(results_dir, f"{job.id}.{job.params.get('format', ExportFormat.ndjson.value)}")
+    if job.kind == JobKind.bulk_import:
+        return os.path.join(results_dir, f"{job.id}.ndjson")
+    return None
+
+class JobService:
+    """Submission and lookup of background jobs; the JobRunner does the work."""
+
+    def __init__(self, session: AsyncSession, results_dir: str = JOB_RESULTS_DIR):
+        self.session = session
+        self.results_dir = results_dir
+
+    async def create_job(self, kind: JobKind, params: Dict[str, Any], job_id: Optional[str] = None) -> JobDTO:
+        job = Job(id=job_id or uuid.uuid4().hex, kind=kind, status=JobStatus.queued, params=params, created_at=_now())
+        if kind in (JobKind.export, JobKind.bulk_import):
+            # Pins the job to the runners that can reach its files
+            job.storage_id = results_storage_id(self.results_dir)
+        self.session.add(job)
+        await self.session.commit()
+        return JobDTO.model_validate(job)
+
+    async def create_import_job(self, body: AsyncIterable[bytes], ndjson: bool) -> JobDTO:
+        """Spool an upload to disk and queue its import, so the request returns as soon as the body is received."""
+        job_id = uuid.uuid4().hex
+        os.makedirs(self.results_dir, exist_ok=True)
+        with open(input_path(job_id, self.results_dir), "wb") as f:
+            async for chunk in body:
+                await asyncio.to_thread(f.write, chunk)
+        return await self.create_job(JobKind.bulk_import, {"ndjson": ndjson}, job_id)
+
+    async def _get_job(self, job_id: str) -> Job:
+        job = await self.session.get(Job, job_id)
+        if job is None:
+            raise HTTPException(status_code=404, detail="Job not found")
+        return job
+
+    async def get_job(self, job_id: str) -> JobDTO:
+        return JobDTO.model_validate(await self._get_job(job_id))
+
+    async def list_jobs(self, limit: int = 50) -> List[JobDTO]:
+        jobs = await self.session.scalars(select(Job).order_by(Job.created_at.desc(), Job.id).limit(limit))
+        return [JobDTO.model_validate(job) for job in jobs]
+
+    async def get_result_file(self, job_id: str) -> str:
+        job = await self._get_job(job_id)
+        path = result_path(job, self.results_dir)
+        if path is None:
+            raise HTTPException(status_code=404, detail="This kind of job has no result file; see the job's result")
+        if job.status != JobStatus.succeeded:
+            raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=f"Job is {job.status.value}")
+        if job.storage_id not in (None, results_storage_id(self.results_dir)):
+            raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="The result file is stored on another API instance")
+        if not os.path.exists(path):
+            raise HTTPException(status_code=status.HTTP_410_GONE, detail="The result file is no longer available")
+        return path
+
+class MainLoopCache:
+    """
+    Response cache seen from the job thread.
+
+    Jobs only invalidate entries; invalidations are run on the API's event loop,
+    which owns the cache (and its Redis connection). Reads bypass the cache.
+    """
+
+    def __init__(self, cache: ReadThroughCache, loop: asyncio.AbstractEventLoop):
+        self.cache = cache
+        self.loop = loop
+
+    async def _on_main_loop(self, coroutine) -> None:
+        await asyncio.wrap_future(asyncio.run_coroutine_threadsafe(coroutine, self.loop))
+
+    async def get_or_load(self, namespace, key, adapter, loader):
+        return await loader()
+
+    async def invalidate(self, namespace: str, *keys: Any) -> None:
+        await self._on_main_loop(self.cache.invalidate(namespace, *keys))
+
+async def claim_job(session_factory: SessionFactory, job_id: str, worker_id: str = JOB_WORKER_ID, results_dir: str = JOB_RESULTS_DIR) -> Optional[Job]:
+    """
+    Atomically claim a queued job, or a running one whose lease expired, for `worker_id`.
+
+    Returns None when the job is finished, another runner holds it or its files
+    are on storage other than `results_dir`, so two runners never work on the
+    same job at once.
+    """
+    now = _now()
+    async with session_factory() as session:
+        job = (await session.scalars(
+            update(Job)
+            .where(Job.id == job_id, _claimable(now, results_storage_id(results_dir)))
+            .values(
+                status=JobStatus.running,
+                claimed_by=worker_id,
+                lease_expires_at=_lease_expiry(),
+                started_at=func.coalesce(Job.started_at, now),
+            )
+            .returning(Job)
+            .execution_options(synchronize_session=False)
+        )).one_or_none()
+        await session.commit()
+    return job
+
+async def _save_in(session: AsyncSession, job: Job, **values) -> None:
+    """
+    Update a claimed job in `session`'s transaction, renewing the lease.
+
+    Raises:
+        JobLeaseLost: if another runner claimed the job since
+    """
+    result = await session.execute(
+        update(Job)
+        .where(Job.id == job.id, Job.claimed_by == job.claimed_by)
+        .values(**{"lease_expires_at": _lease_expiry(), **values})
+    )
+    if result.rowcount != 1:
+        raise JobLeaseLost(job.id)
+
+async def _save(session_factory: SessionFactory, job: Job, **values) -> None:
+    async with session_factory() as session:
+        await _save_in(session, job, **values)
+        await session.commit()
+
+async def _hold_lease(session_factory: SessionFactory, job: Job) -> None:
+    """Renew the job's lease until cancelled; returns once the lease is lost."""
+    deadline = time.monotonic() + JOB_LEASE_SECONDS
+    while True:
+        await asyncio.sleep(JOB_LEASE_SECONDS / 3)
+        try:
+            await _save(session_factory, job)
+        except JobLeaseLost:
+            return
+        except Exception:
+            logger.exception("Could not renew the lease of job %s", job.id)
+            if time.monotonic() >= deadline:
+                return
+        else:
+            deadline = time.monotonic() + JOB_LEASE_SECONDS
+
+async def _cancel(*tasks: asyncio.Future) -> None:
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+
+def _open_result(path: str, size: int):
+    """Open a job's result file for appending, dropping anything written after the last recorded progress."""
+    f = open(path, "ab")
+    f.truncate(size)
+    return f
+
+async def _run_export(session_factory: SessionFactory, job: Job, results_dir: str, cache) -> Dict[str, Any]:
+    """
+    Export in keyset-paginated batches, each read in its own short transaction.
+
+    Progress (rows, last id and file size) is recorded after every batch, so a
+    resumed export continues where it stopped instead of starting over.
+    """
+    params = ExportJobDTO.model_validate(job.params)
+    state = dict(job.result or {})
+    rows, last_id, size = state.get("rows", 0), state.get("last_id"), state.get("size", 0)
+    if job.total is None:
+        async with session_factory() as session:
+            total = await session.scalar(filter_patients(select(func.count()).select_from(Patient), params.filters))
+        await _save(session_factory, job, total=total)
+
+    with _open_result(result_path(job, results_dir), size) as f:
+        if size == 0:
+            f.write(export_header(params.format).encode())
+        while True:
+            query = filter_patients(select(*EXPORT_COLUMNS), params.filters)
+            if last_id is not None:
+                query = query.where(Patient.id > last_id)
+            async with session_factory() as session:
+                batch = (await session.execute(query.order_by(Patient.id).limit(JOB_BATCH_SIZE))).all()
+            if not batch:
+                break
+            f.write(format_export_rows(batch, params.format).encode())
+            f.flush()
+            rows, last_id, size = rows + len(batch), batch[-1].id, f.tell()
+            await _save(session_factory, job, progress=rows, result={"rows": rows, "last_id": last_id, "size": size})
+    return {"rows": rows}
+
+async def _read_file(path: str, chunk_size: int = 64 * 1024) -> AsyncIterator[bytes]:
+    with open(path, "rb") as f:
+        while chunk := f.read(chunk_size):
+            yield chunk
+
+def _iter_upload(path: str, ndjson: bool) -> AsyncIterator[Any]:
+    """Stream the records of a spooled upload, decoding one chunk at a time."""
+    return (iter_ndjson_records if ndjson else iter_json_array_records)(_read_file(path))
+
+async def _count_records(path: str, ndjson: bool) -> int:
+    """Count an upload's records; this also rejects a malformed JSON array before any record is imported."""
+    if ndjson:
+        with open(path, "rb") as f:
+            return sum(1 for line in f if line.strip())
+    count = 0
+    async for _ in iter_json_array_records(_read_file(path)):
+        count += 1
+    return count
+
+async def _records(batch: List[Any]) -> AsyncIterator[Any]:
+    for record in batch:
+        yield record
+
+async def _run_import(session_factory: SessionFactory, job: Job, results_dir: str, cache) -> Dict[str, Any]:
+    """
+    Import the spooled upload in batches, each committed together with the job's progress.
+
+    A resumed import skips the records already committed; a batch interrupted
+    before its commit is rolled back as a whole, so no record is imported twice.
+    """
+    source = input_path(job.id, results_dir)
+    ndjson = job.params.get("ndjson", True)
+    done = job.progress
+    state = dict(job.result or {})
+    counts = Counter(created=state.get("created", 0), failed=state.get("failed", 0))
+    if job.total is None:
+        await _save(session_factory, job, total=await _count_records(source, ndjson))
+
+    with _open_result(result_path(job, results_dir), state.get("size", 0)) as out:
+        async def flush(batch: List[Any]) -> None:
+            nonlocal done
+            async with session_factory() as session:
+                # Fail fast if the job was taken over. This also opens the transaction
+                # before the insert's savepoints, which SQLite's driver would not do
+                await _save_in(session, job)
+                response = await PatientService(session, cache).bulk_create_patients(_records(batch), commit=False)
+                for result in response.results:
+                    result.index += done
+                    out.write(result.model_dump_json(exclude_none=True).encode() + b"\n")
+                out.flush()
+                counts.update(created=response.created, failed=response.failed)
+                # The outcomes written after the recorded size are dropped if this commit doesn't happen
+                await _save_in(session, job, progress=done + len(batch), result=dict(counts, size=out.tell()))
+                await session.commit()
+            done += len(batch)
+
+        batch: List[Any] = []
+        position = 0
+        async for record in _iter_upload(source, ndjson):
+            if position >= done:
+                batch.append(record)
+                if len(batch) >= JOB_BATCH_SIZE:
+                    await flush(batch)
+                    batch = []
+            position += 1
+        if batch:
+            await flush(batch)
+    os.remove(source)
+    return {"created": counts["created"], "failed": counts["failed"]}
+
+async def _run_reassign(session_factory: SessionFactory, job: Job, results_dir: str, cache) -> Dict[str, Any]:
+    """
+    Move patients to a hospital in batches, each committed together with the job's progress.
+
+    A resumed job continues after the last committed batch, so no patient is
+    assigned, and counted, twice.
+    """
+    params = ReassignJobDTO.model_validate(job.params)
+    patient_ids = params.patient_ids
+    counts = Counter(job.result or {})
+    await _save(session_factory, job, total=len(patient_ids))
+    for start in range(job.progress, len(patient_ids), JOB_BATCH_SIZE):
+        batch = patient_ids[start:start + JOB_BATCH_SIZE]
+        async with session_factory() as session:
+            async def save_progress(response: HospitalAssignPatientsResponseDTO) -> None:
+                counts.update(result.status for result in response.results)
+                await _save_in(session, job, progress=start + len(batch), result=dict(counts))
+
+            await HospitalService(session, cache).add_patients_to_hospital(params.hospital_id, batch, before_commit=save_progress)
+    return dict(counts)
+
+HANDLERS = {
+    JobKind.export: _run_export,
+    JobKind.bulk_import: _run_import,
+    JobKind.reassign: _run_reassign,
+}
+
+async def execute_job(
+    session_factory: SessionFactory, job_id: str, results_dir: str = JOB_RESULTS_DIR, cache=no_cache, worker_id: str = JOB_WORKER_ID,
+) -> None:
+    """
+    Claim and run (or resume) one job to completion, recording its outcome on the job row.
+
+    The claim is a lease, renewed while the job runs. If this runner stops renewing
+    it (crash, lost database), another runner resumes the job once the lease has
+    expired, and this one stops at its next write. Cancellation hands the job
+    back, still `running`, so the next runner resumes it at once.
+    """
+    job = await claim_job(session_factory, job_id, worker_id, results_dir)
+    if job is None:
+        return
+
+    os.makedirs(results_dir, exist_ok=True)
+    work = asyncio.ensure_future(HANDLERS[job.kind](session_factory, job, results_dir, cache))
+    lease = asyncio.ensure_future(_hold_lease(session_factory, job))
+    try:
+        await asyncio.wait((work, lease), return_when=asyncio.FIRST_COMPLETED)
+    except asyncio.CancelledError:
+        await _cancel(work, lease)
+        try:
+            await _save(session_factory, job, claimed_by=None, lease_expires_at=None)
+        except Exception:
+            logger.exception("Could not release job %s", job.id)
+        raise
+    await _cancel(work, lease)
+
+    try:
+        # A cancelled handler means the lease was lost first
+        e = JobLeaseLost(job.id) if work.cancelled() else work.exception()
+        if e is None:
+            await _save(session_factory, job, status=JobStatus.succeeded, result=work.result(), finished_at=_now(), lease_expires_at=None)
+        elif isinstance(e, JobLeaseLost):
+            raise e
+        else:
+            logger.error("Job %s (%s) failed", job.id, job.kind.value, exc_info=e)
+            error = e.detail if isinstance(e, HTTPException) else str(e) or type(e).__name__
+            await _save(session_factory, job, status=JobStatus.failed, error=error, finished_at=_now(), lease_expires_at=None)
+    except JobLeaseLost:
+        logger.warning("Job %s was taken over by another runner after its lease expired", job.id)
+
+def job_engine_options(url: str) -> dict:
+    """Engine options for the job runner: the API's settings with a small pool of its own."""
+    options = engine_options(url)
+    if "pool_size" in options:
+        options.update(pool_size=JOB_DB_POOL_SIZE, max_overflow=0)
+    return options
+
+class JobRunner:
+    """
+    Executes queued jobs on a dedicated thread with its own event loop and connection pool.
+
+    Long imports, exports and reassignments then never hold the API's event loop
+    or its connections. Every `JOB_POLL_INTERVAL` seconds, and on start, it also
+    queues the jobs no runner holds: those submitted while no runner was running
+    and those whose runner's lease expired.
+    """
+
+    def __init__(self, workers: int = JOB_WORKERS, results_dir: str = JOB_RESULTS_DIR, worker_id: str = JOB_WORKER_ID, poll_interval: float = JOB_POLL_INTERVAL):
+        self.workers = workers
+        self.results_dir = results_dir
+        self.worker_id = worker_id
+        self.poll_interval = poll_interval
+        self._thread: Optional[threading.Thread] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._queue: Optional[asyncio.Queue] = None
+        self._stopping: Optional[asyncio.Event] = None
+        self._pending: Set[str] = set()
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    async def start(self, database_url: str = DATABASE_URL, cache: ReadThroughCache = response_cache) -> None:
+        """
+        Start the job thread and queue the unclaimed jobs. Call from the API's event loop.
+
+        Raises whatever prevented the runner from starting (an unusable results
+        directory, a bad database URL, an unreachable database); the thread has
+        exited by then.
+        """
+        # Fail fast when the results directory is unusable
+        results_storage_id(self.results_dir)
+        started: concurrent.futures.Future = concurrent.futures.Future()
+        main_cache = MainLoopCache(cache, asyncio.get_running_loop())
+        self._thread = threading.Thread(
+            target=asyncio.run, args=(self._serve(database_url, main_cache, started),), name="job-runner", daemon=True,
+        )
+        self._thread.start()
+        await asyncio.wrap_future(started)
+
+    async def stop(self, timeout: float = JOB_STOP_TIMEOUT) -> None:
+        """Interrupt running jobs, which stay `running` in the database and are resumed by the next runner."""
+        if not self.running:
+            return
+        self._loop.call_soon_threadsafe(self._stopping.set)
+        await asyncio.to_thread(self._thread.join, timeout)
+
+    def submit(self, job_id: str) -> None:
+        """Queue a committed job. Without a running runner it stays queued until the next start."""
+        if self.running:
+            self._loop.call_soon_threadsafe(self._enqueue, job_id)
+
+    def _enqueue(self, job_id: str) -> None:
+        if job_id not in self._pending:
+            self._pending.add(job_id)
+            self._queue.put_nowait(job_id)
+
+    async def _queue_claimable(self, session_factory: SessionFactory) -> None:
+        async with session_factory() as session:
+            claimable = (await session.scalars(
+                select(Job.id).where(_claimable(_now(), results_storage_id(self.results_dir))).order_by(Job.created_at)
+            )).all()
+        claimable = [job_id for job_id in claimable if job_id not in self._pending]
+        for job_id in claimable:
+            self._enqueue(job_id)
+        if claimable:
+            logger.info("Queued %d unclaimed job(s)", len(claimable))
+
+    async def _serve(self, database_url: str, cache, started: concurrent.futures.Future) -> None:
+        self._loop = asyncio.get_running_loop()
+        self._queue = asyncio.Queue()
+        self._stopping = asyncio.Event()
+        engine = None
+        workers = []
+        try:
+            try:
+                engine = create_async_engine(database_url, **job_engine_options(database_url))
+                session_factory = async_sessionmaker(bind=engine, class_=AsyncSession, autoflush=False, expire_on_commit=False)
+                await self._queue_claimable(session_factory)
+            except BaseException as e:
+                # Hand the error to start(), which re-raises it on the API's event loop
+                started.set_exception(e)
+                return
+            started.set_result(None)
+            workers = [asyncio.create_task(self._work(session_factory, cache)) for _ in range(self.workers)]
+            while True:
+                try:
+                    await asyncio.wait_for(self._stopping.wait(), self.poll_interval)
+                    break
+                except asyncio.TimeoutError:
+                    pass
+                try:
+                    await self._queue_claimable(session_factory)
+                except Exception:
+                    logger.exception("Could not look for unclaimed jobs")
+        finally:
+            for worker in workers:
+                worker.cancel()
+            await asyncio.gather(*workers, return_exceptions=True)
+            if engine is not None:
+                await engine.dispose()
+
+    async def _work(self, session_factory: SessionFactory, cache) -> None:
+        while True:
+            job_id = await self._queue.get()
+            try:
+                await execute_job(session_factory, job_id, self.results_dir, cache, self.worker_id)
+            except Exception:
+                logger.exception("Job %s could not be run", job_id)
+            finally:
+                self._pending.discard(job_id)
+
+job_runner = JobRunner()
@@ -0,0 +1,37 @@
+import asyncio
+import logging
+from typing import Awaitable, Callable
+
+from service.auth_service import JWKSKeyStore
+
+logger = logging.getLogger(__name__)
+
+class Lifecycle:
+    """
+    Readiness of one API process.
+
+    The process only reports ready once startup finished (schema verified, pool
+    warm) and the JWKS keys are cached. Draining on shutdown is left to uvicorn
+    (`--timeout-graceful-shutdown`): it stops accepting connections and finishes
+    the open requests before the lifespan shutdown runs.
+    """
+
+    def __init__(self, key_store: JWKSKeyStore):
+        self.key_store = key_store
+        self.started = False
+
+    @property
+    def is_ready(self) -> bool:
+        return self.started and self.key_store.is_warm
+
+    async def check_ready(self) -> bool:
+        """Report readiness, retrying a failed JWKS warm-up (the key store rate limits the fetch)."""
+        if self.started and not self.key_store.is_warm:
+            await self.key_store.refresh()
+        return self.is_ready
+
+    async def start(self, startup: Callable[[], Awaitable[None]]) -> None:
+        await asyncio.gather(startup(), self.key_store.refresh())
+        self.started = True
+        if not self.key_store.is_warm:
+            logger.warning("JWKS keys could not be fetched at startup; reporting not ready until they are")
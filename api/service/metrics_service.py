@@ -0,0 +1,131 @@
+import time
+from contextvars import ContextVar
+from dataclasses import dataclass
+from typing import Callable, Dict, Optional
+
+from prometheus_client import REGISTRY, Counter, Gauge, Histogram
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 50, 100, 250)
+
+REQUESTS = Counter("http_requests_total", "HTTP requests served.", ["method", "route", "status"])
+REQUEST_ERRORS = Counter("http_request_errors_total", "HTTP requests that failed with a 5xx or an unhandled exception.", ["method", "route"])
+REQUESTS_REJECTED = Counter("http_requests_rejected_total", "HTTP requests turned away by rate limiting (429) or admission control (503).", ["reason"])
+REQUEST_LATENCY = Histogram("http_request_duration_seconds", "Time to serve an HTTP request, including streamed bodies.", ["method", "route"])
+QUERIES_PER_REQUEST = Histogram("db_queries_per_request", "SQL statements executed while serving a request.", ["route"], buckets=QUERY_COUNT_BUCKETS)
+QUERY_TIME_PER_REQUEST = Histogram("db_query_time_per_request_seconds", "Time spent in SQL statements while serving a request.", ["route"])
+QUERY_LATENCY = Histogram("db_query_duration_seconds", "Duration of a single SQL statement.", ["operation"])
+TOKEN_VERIFICATION = Histogram("auth_verify_token_duration_seconds", "Time to verify a bearer token.", ["result"])
+JWKS_FETCH = Histogram("auth_jwks_fetch_duration_seconds", "Time to fetch the Cognito JWKS document.", ["result"])
+POOL_CHECKED_OUT = Gauge("db_pool_checked_out", "Connections currently checked out of the pool.")
+POOL_OVERFLOW = Gauge("db_pool_overflow", "Connections open beyond the pool size.")
+POOL_SIZE = Gauge("db_pool_size", "Configured size of the connection pool.")
+
+@dataclass
+class RequestQueryStats:
+    """SQL statements executed on behalf of the current request."""
+    count: int = 0
+    duration: float = 0.0
+
+_request_stats: ContextVar[Optional[RequestQueryStats]] = ContextVar("request_query_stats", default=None)
+
+def current_query_stats() -> Optional[RequestQueryStats]:
+    return _request_stats.get()
+
+def _operation(statement: str) -> str:
+    keyword = statement.lstrip().split(None, 1)[0].upper() if statement.strip() else ""
+    return keyword if keyword in ("SELECT", "INSERT", "UPDATE", "DELETE") else "OTHER"
+
+def instrument_engine(engine: AsyncEngine) -> None:
+    """Time every statement run on `engine` and publish its pool usage as gauges."""
+    sync_engine = engine.sync_engine
+
+    @event.listens_for(sync_engine, "before_cursor_execute")
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_started_at", []).append(time.perf_counter())
+
+    @event.listens_for(sync_engine, "after_cursor_execute")
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        duration = time.perf_counter() - conn.info["query_started_at"].pop()
+        QUERY_LATENCY.labels(_operation(statement)).observe(duration)
+        stats = _request_stats.get()
+        if stats is not None:
+            stats.count += 1
+            stats.duration += duration
+
+    pool = sync_engine.pool
+    if hasattr(pool, "checkedout"):  # NullPool and StaticPool have nothing to report
+        POOL_CHECKED_OUT.set_function(pool.checkedout)
+        POOL_OVERFLOW.set_function(lambda: max(pool.overflow(), 0))
+        POOL_SIZE.set_function(pool.size)
+
+class CacheStatsCollector:
+    """Expose the hit and miss counters of the in-process caches, read from their `stats()`."""
+
+    def __init__(self, caches: Dict[str, Callable[[], dict]]):
+        self.caches = caches
+
+    def collect(self):
+        hits = CounterMetricFamily("cache_hits", "Cache lookups answered from the cache.", labels=["cache", "namespace"])
+        misses = CounterMetricFamily("cache_misses", "Cache lookups that had to load the value.", labels=["cache", "namespace"])
+        size = GaugeMetricFamily("cache_entries", "Entries held by an in-process cache.", labels=["cache"])
+        for name, stats_fn in self.caches.items():
+            stats = stats_fn()
+            namespaces = stats.get("namespaces") or {"all": stats}
+            for namespace, counts in namespaces.items():
+                hits.add_metric([name, namespace], counts["hits"])
+                misses.add_metric([name, namespace], counts["misses"])
+            if "size" in stats:
+                size.add_metric([name], stats["size"])
+        yield hits
+        yield misses
+        yield size
+
+def register_caches(caches: Dict[str, Callable[[], dict]]) -> None:
+    REGISTRY.register(CacheStatsCollector(caches))
+
+def _route_template(scope) -> str:
+    """Route template of the request (e.g. `/hospitals/{hospital_id}`), keeping label cardinality bounded."""
+    # FastAPI versions that include routers lazily only know the full template (prefix
+    # included) on the effective route; older ones copy it onto the route itself.
+    # Never derived from the request path, which would put ids into the label
+    effective = (scope.get("fastapi") or {}).get("effective_route_context")
+    return getattr(effective, "path_format", None) or getattr(scope.get("route"), "path", None) or "unmatched"
+
+class MetricsMiddleware:
+    """ASGI middleware recording latency, status and SQL usage of every HTTP request per route."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        stats = RequestQueryStats()
+        token = _request_stats.set(stats)
+        status_code = 500
+        started_at = time.perf_counter()
+
+        async def send_with_status(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        except Exception:
+            status_code = 500
+            raise
+        finally:
+            _request_stats.reset(token)
+            method, route = scope["method"], _route_template(scope)
+            REQUESTS.labels(method, route, str(status_code)).inc()
+            REQUEST_LATENCY.labels(method, route).observe(time.perf_counter() - started_at)
+            if status_code >= 500:
+                REQUEST_ERRORS.labels(method, route).inc()
+            QUERIES_PER_REQUEST.labels(route).observe(stats.count)
+            QUERY_TIME_PER_REQUEST.labels(route).observe(stats.duration)
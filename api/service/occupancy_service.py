@@ -0,0 +1,49 @@
+from typing import Dict, Optional
+
+from sqlalchemy import Row, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from model.entities.hospital import Hospital
+
+async def lock_hospitals(session: AsyncSession, *hospital_ids: Optional[int]) -> Dict[int, Row]:
+    """
+    Lock hospital rows in ascending id order and return their occupancy.
+
+    Writes that touch several hospitals, or a hospital and its patients, lock the
+    hospitals first and in this order, so two opposite moves (A to B and B to A)
+    wait for each other instead of deadlocking.
+    """
+    ids = sorted({hospital_id for hospital_id in hospital_ids if hospital_id is not None})
+    rows = await session.execute(
+        select(Hospital.id, Hospital.capacity, Hospital.current_patients)
+        .where(Hospital.id.in_(ids))
+        .order_by(Hospital.id)
+        .with_for_update()
+    )
+    return {row.id: row for row in rows}
+
+async def reserve_beds(session: AsyncSession, hospital_id: int, count: int = 1) -> bool:
+    """
+    Atomically add `count` patients to a hospital's occupancy.
+
+    The conditional UPDATE locks the hospital row, so concurrent admissions are
+    serialized by the database and can never push the hospital past capacity.
+    Returns False when the hospital does not exist or lacks room. Like every write
+    to a hospital row, it increments the row version.
+    """
+    result = await session.execute(
+        update(Hospital)
+        .where(Hospital.id == hospital_id, Hospital.current_patients + count <= Hospital.capacity)
+        .values(current_patients=Hospital.current_patients + count, version=Hospital.version + 1)
+        .execution_options(synchronize_session=False)
+    )
+    return result.rowcount == 1
+
+async def release_beds(session: AsyncSession, hospital_id: int, count: int = 1) -> None:
+    """Remove `count` patients from a hospital's occupancy."""
+    await session.execute(
+        update(Hospital)
+        .where(Hospital.id == hospital_id)
+        .values(current_patients=Hospital.current_patients - count, version=Hospital.version + 1)
+        .execution_options(synchronize_session=False)
+    )
@@ -1,74 +1,343 @@
 from fastapi import HTTPException
-from model.entities.patient import Patient
-from model.dtos.patient import PatientCreateDTO, PatientResponseDTO, PatientUpdateDTO
-from model.entities.database import SessionLocal
-from sqlalchemy import select
-from typing import List
+from datetime import date
+from enum import Enum
+from model.entities.change_event import ChangeOperation, ChangeTable
+from model.entities.patient import CancerType, Patient
+from model.dtos.patient import (
+    ExportFormat,
+    PatientBulkResponseDTO,
+    PatientBulkResultDTO,
+    PatientCreateDTO,
+    PatientFilterDTO,
+    PatientResponseDTO,
+    PatientSearchResultDTO,
+    PatientUpdateDTO,
+)
+from model.dtos.pagination import PaginationDTO
+from service.query_utils import paginate
+from service.occupancy_service import lock_hospitals, release_beds
+from service.cache_service import ReadThroughCache, no_cache
+from service.version_service import bump_versions
+from service.change_feed_service import record_changes
+from service.serialization_utils import response_columns
+from service.search_service import SEARCH_DEFAULT_LIMIT, search_patients
+from pydantic import TypeAdapter, ValidationError
+from sqlalchemy import Row, Select, delete, insert, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import Any, AsyncIterable, AsyncIterator, List, Optional, Sequence, Tuple
 from sqlalchemy.exc import IntegrityError
 from fastapi import HTTPException, status
+import csv
+import io
+import json
+
+EXPORT_BATCH_SIZE = 1000
+# Tries of a delete whose patient keeps being moved by concurrent requests
+DELETE_ATTEMPTS = 3
+BULK_INSERT_BATCH_SIZE = 1000
+EXPORT_COLUMNS = (
+    Patient.id,
+    Patient.name,
+    Patient.age,
+    Patient.oncological,
+    Patient.birth_date,
+    Patient.cancer_type,
+    Patient.hospital_id,
+)
+PATIENT_COLUMNS = response_columns(Patient, PatientResponseDTO)
+PATIENT_ADAPTER = TypeAdapter(PatientResponseDTO)
+PATIENT_PAGE_ADAPTER = TypeAdapter(List[PatientResponseDTO])
+
+def _export_value(value):
+    if isinstance(value, Enum):
+        return value.value
+    if isinstance(value, date):
+        return value.isoformat()
+    return value
+
+def export_header(export_format: ExportFormat) -> str:
+    """The first line of an export: the column names for CSV, nothing for NDJSON."""
+    if export_format == ExportFormat.csv:
+        return ",".join(column.key for column in EXPORT_COLUMNS) + "\r\n"
+    return ""
+
+def format_export_rows(rows: Sequence[Row], export_format: ExportFormat) -> str:
+    """Render rows of EXPORT_COLUMNS as CSV records or NDJSON lines."""
+    buffer = io.StringIO()
+    if export_format == ExportFormat.csv:
+        writer = csv.writer(buffer)
+        writer.writerows([_export_value(value) for value in row] for row in rows)
+    else:
+        fields = [column.key for column in EXPORT_COLUMNS]
+        for row in rows:
+            buffer.write(json.dumps(dict(zip(fields, map(_export_value, row)))))
+            buffer.write("\n")
+    return buffer.getvalue()
+
+def _validation_message(error: ValidationError) -> str:
+    return "; ".join(
+        f"{'.'.join(str(part) for part in detail['loc']) or 'record'}: {detail['msg']}"
+        for detail in error.errors()
+    )
+
+CANCER_TYPE_REQUIRED = "Invalid data: cancer_type is required when oncological is True."
+CANCER_TYPE_NOT_ALLOWED = "Invalid data: cancer_type must be null when oncological is False."
+
+def _oncological_error(oncological: Optional[bool], cancer_type: Optional[CancerType]) -> Optional[str]:
+    """Mirror the check_oncological_cancer_type constraint so one bad row cannot fail a whole batch."""
+    if oncological and cancer_type is None:
+        return CANCER_TYPE_REQUIRED
+    if not oncological and cancer_type is not None:
+        return CANCER_TYPE_NOT_ALLOWED
+    return None
+
+def _integrity_error(error: IntegrityError, oncological: Optional[bool]) -> str:
+    """Explain an IntegrityError raised writing a patient whose row ends up with `oncological`."""
+    if "check_oncological_cancer_type" in str(error.orig):
+        # The constraint only fails one way for a given oncological flag
+        return CANCER_TYPE_REQUIRED if oncological else CANCER_TYPE_NOT_ALLOWED
+    return "Database integrity error."
+
+def filter_patients(query: Select, filters: Optional[PatientFilterDTO] = None) -> Select:
+    """Narrow a patient query with the filters supplied by the client."""
+    if filters is None:
+        return query
+    if filters.oncological is not None:
+        query = query.where(Patient.oncological == filters.oncological)
+    if filters.cancer_type is not None:
+        query = query.where(Patient.cancer_type == filters.cancer_type)
+    if filters.hospital_id is not None:
+        query = query.where(Patient.hospital_id == filters.hospital_id)
+    if filters.min_age is not None:
+        query = query.where(Patient.age >= filters.min_age)
+    if filters.max_age is not None:
+        query = query.where(Patient.age <= filters.max_age)
+    return query
+
 class PatientService:
-    def __init__(self):
-        self.session = SessionLocal()
+    def __init__(self, session: AsyncSession, cache: ReadThroughCache = no_cache):
+        self.session = session
+        self.cache = cache
 
-    def create_patient(self, patient: PatientCreateDTO) -> PatientResponseDTO:
+    async def create_patient(self, patient: PatientCreateDTO) -> PatientResponseDTO:
         db_patient = Patient(**patient.model_dump())
         self.session.add(db_patient)
         try:
-            self.session.commit()
-            self.session.refresh(db_patient)
+            await self.session.flush()
+            await record_changes(self.session, (ChangeTable.patients, ChangeOperation.created, [db_patient.id]))
+            await bump_versions(self.session, "patients")
+            await self.session.commit()
+            await self.session.refresh(db_patient)
             return db_patient
 
         except IntegrityError as e:
-            self.session.rollback()
+            await self.session.rollback()
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=_integrity_error(e, patient.oncological))
 
-            if "check_oncological_cancer_type" in str(e.orig):
-                raise HTTPException(
-                    status_code=status.HTTP_400_BAD_REQUEST,
-                    detail="Invalid data: cancer_type must be null when oncological is False."
-                )
-            else:
-                raise HTTPException(
-                    status_code=status.HTTP_400_BAD_REQUEST,
-                    detail="Database integrity error."
-                )
-
-    def get_all_patients(self) -> List[PatientResponseDTO]:
-        result = self.session.execute(select(Patient))
-        patients = result.scalars().all()
-        return [PatientResponseDTO(**p.__dict__) for p in patients]
-
-    def get_patient_by_id(self, patient_id: int) -> Patient:
-        result = self.session.execute(select(Patient).where(Patient.id == patient_id))
+    async def get_all_patients(self, pagination: Optional[PaginationDTO] = None, filters: Optional[PatientFilterDTO] = None) -> List[PatientResponseDTO]:
+        return PATIENT_PAGE_ADAPTER.validate_python(await self.get_patient_rows(pagination, filters), from_attributes=True)
+
+    async def get_patient_rows(self, pagination: Optional[PaginationDTO] = None, filters: Optional[PatientFilterDTO] = None) -> Sequence[Row]:
+        """A page of patients as rows of the response columns, ready for `encode_rows`."""
+        query = paginate(filter_patients(select(*PATIENT_COLUMNS), filters), Patient.id, pagination)
+        return (await self.session.execute(query)).all()
+
+    async def get_patient_by_id(self, patient_id: int) -> PatientResponseDTO:
+        async def load():
+            row = (await self.session.execute(select(*PATIENT_COLUMNS).where(Patient.id == patient_id))).one_or_none()
+            if row is None:
+                raise HTTPException(status_code=404, detail="Patient not found")
+            return PatientResponseDTO.model_validate(row)
+        return await self.cache.get_or_load("patient", patient_id, PATIENT_ADAPTER, load)
+
+    async def search_patients(self, query: str, limit: int = SEARCH_DEFAULT_LIMIT) -> List[PatientSearchResultDTO]:
+        return await search_patients(self.session, query, limit)
+
+    async def _get_patient(self, patient_id: int) -> Patient:
+        result = await self.session.execute(select(Patient).where(Patient.id == patient_id))
         patient = result.scalar_one_or_none()
         if not patient:
             raise HTTPException(status_code=404, detail="Patient not found")
         return patient
 
-    def update_patient(self, patient_id: int, patient: PatientUpdateDTO) -> Patient:
-        db_patient = self.get_patient_by_id(patient_id)
-        for key, value in patient.model_dump().items():
-            setattr(db_patient, key, value)
-        try:
-            self.session.commit()
-            self.session.refresh(db_patient)
-            return db_patient
+    async def update_patient(self, patient_id: int, patient: PatientUpdateDTO, expected_versions: Optional[List[int]] = None) -> PatientResponseDTO:
+        """
+        Change the fields set in `patient`, leaving the others as they are.
 
+        One UPDATE ... RETURNING changes the row, increments its version and reads it
+        back; with `expected_versions` (from If-Match) it only applies while the row
+        still has one of them, so a concurrent edit fails with 412.
+        """
+        conditions = [Patient.id == patient_id]
+        if expected_versions is not None:
+            conditions.append(Patient.version.in_(expected_versions))
+        values = patient.model_dump(exclude_unset=True)
+        try:
+            if not values:
+                row = (await self.session.execute(select(*PATIENT_COLUMNS).where(*conditions))).one_or_none()
+            else:
+                row = (await self.session.execute(
+                    update(Patient)
+                    .where(*conditions)
+                    .values(**values, version=Patient.version + 1)
+                    .returning(*PATIENT_COLUMNS)
+                    .execution_options(synchronize_session=False)
+                )).one_or_none()
         except IntegrityError as e:
-            self.session.rollback()
+            await self.session.rollback()
+            oncological = values.get("oncological")
+            if "oncological" not in values:
+                # Only cancer_type was sent: the stored flag decides which way the constraint failed
+                oncological = await self.session.scalar(select(Patient.oncological).where(Patient.id == patient_id))
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=_integrity_error(e, oncological))
+        if row is None:
+            await self.session.rollback()
+            await self._get_patient(patient_id)  # 404 if the patient doesn't exist
+            raise HTTPException(
+                status_code=status.HTTP_412_PRECONDITION_FAILED,
+                detail="The patient was modified concurrently, reload it and retry"
+            )
+        if values:
+            await record_changes(self.session, (ChangeTable.patients, ChangeOperation.updated, [patient_id]))
+            await bump_versions(self.session, "patients")
+            await self.session.commit()
+            await self.cache.invalidate("patient", patient_id)
+        return PatientResponseDTO.model_validate(row)
 
-            if "check_oncological_cancer_type" in str(e.orig):
-                raise HTTPException(
-                    status_code=status.HTTP_400_BAD_REQUEST,
-                    detail="Invalid data: cancer_type must be null when oncological is False."
-                )
-            else:
-                raise HTTPException(
-                    status_code=status.HTTP_400_BAD_REQUEST,
-                    detail="Database integrity error."
-                )
-
-    def delete_patient(self, patient_id: int) -> bool:
-        db_patient = self.get_patient_by_id(patient_id)
-        self.session.delete(db_patient)
-        self.session.commit()
+    async def delete_patient(self, patient_id: int) -> bool:
+        """
+        Delete a patient and free their bed.
+
+        Like assignments, the delete locks the patient's hospital before the patient
+        row, and only deletes the row while it still points at that hospital. If the
+        patient was moved in between, it starts over from their new hospital.
+        """
+        for _ in range(DELETE_ATTEMPTS):
+            patient = (await self.session.execute(select(Patient.hospital_id).where(Patient.id == patient_id))).one_or_none()
+            if patient is None:
+                raise HTTPException(status_code=404, detail="Patient not found")
+            hospital_id = patient.hospital_id
+            if hospital_id is not None:
+                await lock_hospitals(self.session, hospital_id)
+            deleted = await self.session.execute(
+                delete(Patient)
+                .where(Patient.id == patient_id, Patient.hospital_id.is_not_distinct_from(hospital_id))
+                .execution_options(synchronize_session=False)
+            )
+            if deleted.rowcount == 1:
+                break
+            await self.session.rollback()
+        else:
+            raise HTTPException(
+                status_code=409,
+                detail="The patient was reassigned concurrently, please retry"
+            )
+        if hospital_id is not None:
+            await release_beds(self.session, hospital_id)
+        tables = ("patients", "hospitals") if hospital_id is not None else ("patients",)
+        await record_changes(
+            self.session,
+            (ChangeTable.patients, ChangeOperation.deleted, [patient_id]),
+            (ChangeTable.hospitals, ChangeOperation.updated, [hospital_id]),
+        )
+        await bump_versions(self.session, *tables)
+        await self.session.commit()
+        await self.cache.invalidate("patient", patient_id)
+        if hospital_id is not None:
+            # The hospital's occupancy changed
+            await self.cache.invalidate("hospital", hospital_id)
         return True
+
+    async def export_patients(self, export_format: ExportFormat = ExportFormat.ndjson, filters: Optional[PatientFilterDTO] = None) -> AsyncIterator[str]:
+        """
+        Stream the patient registry as NDJSON or CSV text chunks.
+
+        Rows are read from a server-side cursor in batches of EXPORT_BATCH_SIZE,
+        so memory use does not grow with the size of the table.
+        """
+        header = export_header(export_format)
+        if header:
+            yield header
+
+        query = filter_patients(select(*EXPORT_COLUMNS), filters).order_by(Patient.id)
+        result = await self.session.stream(query.execution_options(yield_per=EXPORT_BATCH_SIZE))
+        async for rows in result.partitions():
+            yield format_export_rows(rows, export_format)
+
+    async def bulk_create_patients(self, records: AsyncIterable[Any], commit: bool = True) -> PatientBulkResponseDTO:
+        """
+        Validate and insert patients in batches, reporting the outcome of every record.
+
+        Each record is a decoded JSON value, or an Exception describing why it could
+        not be decoded. Valid records are inserted BULK_INSERT_BATCH_SIZE at a time
+        with a multi-row INSERT ... RETURNING and committed per batch; invalid ones
+        are reported without affecting the rest of the batch. With `commit=False`
+        nothing is committed: the caller commits every batch at once, together with
+        its own writes.
+        """
+        results: List[PatientBulkResultDTO] = []
+        uncommitted: List[PatientBulkResultDTO] = []
+        batch: List[Tuple[int, dict]] = []
+        index = 0
+
+        async def insert_batch() -> None:
+            inserted = await self._insert_batch(batch)
+            results.extend(inserted)
+            if commit:
+                await self._record_created(inserted)
+                await self.session.commit()
+            else:
+                uncommitted.extend(inserted)
+
+        async for record in records:
+            if isinstance(record, Exception):
+                results.append(PatientBulkResultDTO(index=index, status="error", error=str(record)))
+            else:
+                try:
+                    patient = PatientCreateDTO.model_validate(record)
+                    error = _oncological_error(patient.oncological, patient.cancer_type)
+                except ValidationError as e:
+                    error = _validation_message(e)
+                if error:
+                    results.append(PatientBulkResultDTO(index=index, status="error", error=error))
+                else:
+                    batch.append((index, patient.model_dump()))
+            index += 1
+            if len(batch) >= BULK_INSERT_BATCH_SIZE:
+                await insert_batch()
+                batch = []
+        if batch:
+            await insert_batch()
+        if not commit:
+            await self._record_created(uncommitted)
+
+        results.sort(key=lambda result: result.index)
+        created = sum(1 for result in results if result.status == "created")
+        return PatientBulkResponseDTO(created=created, failed=len(results) - created, results=results)
+
+    async def _insert_batch(self, batch: List[Tuple[int, dict]]) -> List[PatientBulkResultDTO]:
+        """Insert a batch in the current transaction; savepoints keep a failing row from undoing the others."""
+        statement = insert(Patient).returning(Patient.id, sort_by_parameter_order=True)
+        try:
+            async with self.session.begin_nested():
+                ids = (await self.session.scalars(statement, [values for _, values in batch])).all()
+            return [PatientBulkResultDTO(index=index, status="created", id=id) for (index, _), id in zip(batch, ids)]
+        except IntegrityError:
+            pass
+
+        # Something in the batch slipped past validation; find it row by row
+        results = []
+        for index, values in batch:
+            try:
+                async with self.session.begin_nested():
+                    id = await self.session.scalar(insert(Patient).returning(Patient.id), values)
+                results.append(PatientBulkResultDTO(index=index, status="created", id=id))
+            except IntegrityError as e:
+                results.append(PatientBulkResultDTO(index=index, status="error", error=_integrity_error(e, values["oncological"])))
+        return results
+
+    async def _record_created(self, results: List[PatientBulkResultDTO]) -> None:
+        ids = [result.id for result in results if result.status == "created"]
+        if ids:
+            await record_changes(self.session, (ChangeTable.patients, ChangeOperation.created, ids))
+            await bump_versions(self.session, "patients")
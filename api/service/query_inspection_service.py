@@ -0,0 +1,136 @@
+import logging
+import os
+import re
+import time
+import weakref
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Iterator, List, Optional, Tuple
+
+from sqlalchemy import event
+from sqlalchemy.engine import Connection
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+QUERY_INSPECTION = os.getenv("QUERY_INSPECTION", "false").lower() in ("1", "true", "yes")
+N_PLUS_ONE_THRESHOLD = int(os.getenv("N_PLUS_ONE_THRESHOLD", "5"))
+SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", "200"))
+QUERY_BUDGET = int(os.getenv("QUERY_BUDGET", "0"))
+
+logger = logging.getLogger(__name__)
+
+# A parenthesized list of bound parameters in any DBAPI paramstyle: (?, ?), ($1, $2), (%s), (:a, :b)
+_PARAMETER_LIST = re.compile(r"\(\s*(?:\?|%s|\$\d+|:\w+|__\[POSTCOMPILE_\w+\])(?:\s*,\s*(?:\?|%s|\$\d+|:\w+))*\s*\)")
+_REPEATED_LISTS = re.compile(r"\(\.\.\.\)(?:\s*,\s*\(\.\.\.\))+")
+_WHITESPACE = re.compile(r"\s+")
+
+def statement_shape(statement: str) -> str:
+    """Normalize a statement so executions that only differ in IN-list or VALUES size compare equal."""
+    shape = _PARAMETER_LIST.sub("(...)", _WHITESPACE.sub(" ", statement).strip())
+    return _REPEATED_LISTS.sub("(...)", shape)
+
+class QueryInspector:
+    """Statements executed within one request (or one `query_budget` block), with their durations."""
+
+    def __init__(self):
+        self.statements: List[Tuple[str, float]] = []
+
+    @property
+    def count(self) -> int:
+        return len(self.statements)
+
+    def record(self, statement: str, duration: float) -> None:
+        self.statements.append((statement_shape(statement), duration))
+
+    def repeated(self, threshold: int = N_PLUS_ONE_THRESHOLD) -> List[Tuple[str, int]]:
+        """Statement shapes executed at least `threshold` times, the usual sign of an N+1 loop."""
+        counts = Counter(shape for shape, _ in self.statements)
+        return [(shape, count) for shape, count in counts.most_common() if count >= threshold]
+
+    def report(self) -> str:
+        return "\n".join(f"  {index}. ({duration * 1000:.1f} ms) {shape}" for index, (shape, duration) in enumerate(self.statements, 1))
+
+_current_inspector: ContextVar[Optional[QueryInspector]] = ContextVar("query_inspector", default=None)
+_instrumented_engines: "weakref.WeakSet" = weakref.WeakSet()
+
+def _explain(conn: Connection, statement: str, parameters) -> str:
+    prefix = "EXPLAIN QUERY PLAN " if conn.dialect.name == "sqlite" else "EXPLAIN "
+    conn.info["explaining"] = True
+    try:
+        rows = conn.exec_driver_sql(prefix + statement, parameters).fetchall()
+        return "\n".join(" | ".join(str(value) for value in row) for row in rows)
+    except Exception as e:
+        return f"EXPLAIN failed: {e}"
+    finally:
+        conn.info["explaining"] = False
+
+def instrument_engine(engine: AsyncEngine, slow_query_ms: float = SLOW_QUERY_MS) -> None:
+    """Record statements for the active inspector and log slow ones with their plan. Safe to call twice."""
+    sync_engine = engine.sync_engine
+    if sync_engine in _instrumented_engines:
+        return
+    _instrumented_engines.add(sync_engine)
+
+    @event.listens_for(sync_engine, "before_cursor_execute")
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("inspection_started_at", []).append(time.perf_counter())
+
+    @event.listens_for(sync_engine, "after_cursor_execute")
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        duration = time.perf_counter() - conn.info["inspection_started_at"].pop()
+        if conn.info.get("explaining"):
+            return
+        inspector = _current_inspector.get()
+        if inspector is not None:
+            inspector.record(statement, duration)
+        if duration * 1000 >= slow_query_ms and not executemany and statement.lstrip()[:6].upper() in ("SELECT", "UPDATE", "DELETE", "INSERT"):
+            logger.warning("Slow query (%.1f ms): %s\n%s", duration * 1000, statement, _explain(conn, statement, parameters))
+
+@contextmanager
+def inspect_queries() -> Iterator[QueryInspector]:
+    """Collect the statements executed in this context (and the tasks it starts) into a QueryInspector."""
+    inspector = QueryInspector()
+    token = _current_inspector.set(inspector)
+    try:
+        yield inspector
+    finally:
+        _current_inspector.reset(token)
+
+@contextmanager
+def query_budget(max_queries: int, max_repeats: Optional[int] = None) -> Iterator[QueryInspector]:
+    """
+    Test helper failing when the block runs more than `max_queries` statements.
+
+    With `max_repeats`, it also fails when one statement shape runs more than
+    that many times, which catches N+1 loops whose total still fits the budget.
+    The engine must be instrumented with `instrument_engine`.
+    """
+    with inspect_queries() as inspector:
+        yield inspector
+    if inspector.count > max_queries:
+        raise AssertionError(f"Expected at most {max_queries} queries, got {inspector.count}:\n{inspector.report()}")
+    if max_repeats is not None:
+        repeated = inspector.repeated(max_repeats + 1)
+        if repeated:
+            shape, count = repeated[0]
+            raise AssertionError(f"Statement ran {count} times (at most {max_repeats} allowed): {shape}\n{inspector.report()}")
+
+class QueryInspectionMiddleware:
+    """ASGI middleware logging requests that repeat a statement shape or exceed QUERY_BUDGET."""
+
+    def __init__(self, app, n_plus_one_threshold: int = N_PLUS_ONE_THRESHOLD, query_budget: int = QUERY_BUDGET):
+        self.app = app
+        self.n_plus_one_threshold = n_plus_one_threshold
+        self.query_budget = query_budget
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        with inspect_queries() as inspector:
+            await self.app(scope, receive, send)
+        request = f"{scope['method']} {scope['path']}"
+        for shape, count in inspector.repeated(self.n_plus_one_threshold):
+            logger.warning("Possible N+1 in %s: statement ran %d times: %s", request, count, shape)
+        if self.query_budget and inspector.count > self.query_budget:
+            logger.warning("%s ran %d queries (budget %d):\n%s", request, inspector.count, self.query_budget, inspector.report())
@@ -0,0 +1,33 @@
+from fastapi import Query
+from typing import Annotated, Optional, Sequence
+from sqlalchemy import Select
+
+from model.dtos.pagination import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, PaginationDTO
+from model.dtos.patient import PatientFilterDTO
+
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+def get_pagination(
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[int] = Query(None, ge=0, description="Return rows with an id greater than this value"),
+) -> PaginationDTO:
+    """FastAPI dependency reading the `limit` and `cursor` query parameters."""
+    return PaginationDTO(limit=limit, cursor=cursor)
+
+def get_patient_filters(filters: Annotated[PatientFilterDTO, Query()]) -> PatientFilterDTO:
+    """FastAPI dependency reading the patient filter query parameters."""
+    return filters
+
+def paginate(query: Select, id_column, pagination: Optional[PaginationDTO] = None) -> Select:
+    """Apply keyset pagination on the primary key: rows after the cursor, in id order."""
+    pagination = pagination or PaginationDTO()
+    if pagination.cursor is not None:
+        query = query.where(id_column > pagination.cursor)
+    return query.order_by(id_column).limit(pagination.limit)
+
+def next_cursor(items: Sequence, pagination: Optional[PaginationDTO] = None) -> Optional[int]:
+    """Return the cursor for the following page, or None when this page was the last one."""
+    pagination = pagination or PaginationDTO()
+    if len(items) < pagination.limit:
+        return None
+    return items[-1].id
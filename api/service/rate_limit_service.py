@@ -0,0 +1,260 @@
+import asyncio
+import json
+import logging
+import math
+import os
+import time
+from collections import OrderedDict
+from typing import Any, Iterable, NamedTuple, Optional, Tuple
+
+from model.entities.database import DB_MAX_OVERFLOW, DB_POOL_SIZE
+from service.auth_service import JWKSKeyStore, VerifiedTokenCache
+from service.cache_service import CACHE_KEY_PREFIX, CACHE_REDIS_URL
+from service.metrics_service import REQUESTS_REJECTED
+
+RATE_LIMIT_BACKEND = os.getenv("RATE_LIMIT_BACKEND", "memory").lower()
+RATE_LIMIT_REDIS_URL = os.getenv("RATE_LIMIT_REDIS_URL", CACHE_REDIS_URL)
+RATE_LIMIT_RATE = float(os.getenv("RATE_LIMIT_RATE", "20"))
+RATE_LIMIT_BURST = float(os.getenv("RATE_LIMIT_BURST", "100"))
+RATE_LIMIT_AUTH_RATE = float(os.getenv("RATE_LIMIT_AUTH_RATE", "0.2"))
+RATE_LIMIT_AUTH_BURST = float(os.getenv("RATE_LIMIT_AUTH_BURST", "5"))
+RATE_LIMIT_MAX_KEYS = int(os.getenv("RATE_LIMIT_MAX_KEYS", "100000"))
+# Keep admitted requests below the connections the pool can hand out, so excess load
+# is shed here instead of queueing for DB_POOL_TIMEOUT inside the handlers
+MAX_CONCURRENT_REQUESTS = int(os.getenv("MAX_CONCURRENT_REQUESTS", str(DB_POOL_SIZE + DB_MAX_OVERFLOW)))
+ADMISSION_QUEUE_SIZE = int(os.getenv("ADMISSION_QUEUE_SIZE", str(MAX_CONCURRENT_REQUESTS)))
+ADMISSION_QUEUE_TIMEOUT = float(os.getenv("ADMISSION_QUEUE_TIMEOUT", "2"))
+
+# Probes and scrapes must keep working under load
+UNLIMITED_PATHS = ("/health", "/metrics")
+# Long-lived streams that hold no database connection while idle
+STREAMING_PATHS = ("/changes",)
+
+logger = logging.getLogger(__name__)
+
+class Bucket(NamedTuple):
+    """A client's token bucket: `rate` tokens per second, holding at most `burst`."""
+    name: str
+    rate: float
+    burst: float
+
+DEFAULT_BUCKET = Bucket("default", RATE_LIMIT_RATE, RATE_LIMIT_BURST)
+# Each login is a synchronous Cognito call, so logins get a much smaller budget per IP
+AUTH_BUCKET = Bucket("auth", RATE_LIMIT_AUTH_RATE, RATE_LIMIT_AUTH_BURST)
+
+def _refill(tokens: float, elapsed: float, bucket: Bucket) -> Tuple[bool, float, float]:
+    """Take one token after `elapsed` seconds of refill: (allowed, tokens left, seconds until one is available)."""
+    tokens = min(bucket.burst, tokens + max(elapsed, 0.0) * bucket.rate)
+    if tokens >= 1:
+        return True, tokens - 1, 0.0
+    return False, tokens, (1 - tokens) / bucket.rate
+
+class MemoryRateLimitBackend:
+    """Token buckets of this process, in an LRU bounded to `max_keys` clients."""
+
+    name = "memory"
+
+    def __init__(self, max_keys: int = RATE_LIMIT_MAX_KEYS, clock=time.monotonic):
+        self.max_keys = max_keys
+        self.clock = clock
+        self._buckets: "OrderedDict[str, Tuple[float, float]]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._buckets)
+
+    async def take(self, key: str, bucket: Bucket) -> Tuple[bool, float]:
+        now = self.clock()
+        tokens, updated_at = self._buckets.get(key, (bucket.burst, now))
+        allowed, tokens, retry_after = _refill(tokens, now - updated_at, bucket)
+        self._buckets[key] = (tokens, now)
+        self._buckets.move_to_end(key)
+        while len(self._buckets) > self.max_keys:
+            # An evicted client starts over with a full bucket
+            self._buckets.popitem(last=False)
+        return allowed, retry_after
+
+# Refill and take in one atomic step, on the Redis server's clock so every process agrees
+TOKEN_BUCKET_SCRIPT = """
+local rate, burst = tonumber(ARGV[1]), tonumber(ARGV[2])
+local time = redis.call('TIME')
+local now = tonumber(time[1]) + tonumber(time[2]) / 1000000
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'updated_at')
+local tokens = tonumber(state[1]) or burst
+local updated_at = tonumber(state[2]) or now
+tokens = math.min(burst, tokens + math.max(now - updated_at, 0) * rate)
+local allowed = 0
+if tokens >= 1 then
+    tokens = tokens - 1
+    allowed = 1
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'updated_at', tostring(now))
+redis.call('PEXPIRE', KEYS[1], math.ceil(burst / rate * 1000) + 1000)
+return {allowed, tostring(tokens)}
+"""
+
+class RedisRateLimitBackend:
+    """
+    Token buckets shared by every API process, on any client speaking the redis-py asyncio API.
+
+    A bucket expires once it would be full again. Redis errors are logged and the
+    request is let through: losing the rate limiter must not take the API down.
+    """
+
+    name = "redis"
+
+    def __init__(self, client: Any, prefix: str = f"{CACHE_KEY_PREFIX}ratelimit:"):
+        self.client = client
+        self.prefix = prefix
+        self._script = client.register_script(TOKEN_BUCKET_SCRIPT)
+
+    async def take(self, key: str, bucket: Bucket) -> Tuple[bool, float]:
+        try:
+            allowed, tokens = await self._script(keys=[f"{self.prefix}{key}"], args=[bucket.rate, bucket.burst])
+        except Exception:
+            logger.exception("Rate limit check failed for %s", key)
+            return True, 0.0
+        if int(allowed):
+            return True, 0.0
+        return False, (1 - float(tokens)) / bucket.rate
+
+def create_rate_limit_backend(backend: str = RATE_LIMIT_BACKEND) -> Optional[Any]:
+    """Build the backend selected by RATE_LIMIT_BACKEND (`memory`, `redis` or `none`)."""
+    if backend == "redis":
+        # Optional dependency, only needed when the limits are shared between processes
+        from redis import asyncio as redis
+        return RedisRateLimitBackend(redis.from_url(RATE_LIMIT_REDIS_URL))
+    if backend == "memory":
+        return MemoryRateLimitBackend()
+    return None
+
+class AdmissionController:
+    """
+    Global cap on the requests one process serves at a time.
+
+    Up to `max_concurrent` requests run; up to `queue_size` more wait at most
+    `queue_timeout` seconds for a slot. Anything beyond that is rejected at once,
+    so a burst is answered with 503 instead of piling up on the connection pool.
+    """
+
+    def __init__(self, max_concurrent: int = MAX_CONCURRENT_REQUESTS, queue_size: int = ADMISSION_QUEUE_SIZE, queue_timeout: float = ADMISSION_QUEUE_TIMEOUT):
+        self.max_concurrent = max_concurrent
+        self.queue_size = queue_size
+        self.queue_timeout = queue_timeout
+        self.waiting = 0
+        self._slots = asyncio.Semaphore(max_concurrent)
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_concurrent > 0
+
+    async def acquire(self) -> bool:
+        """Take a slot, waiting for one if the queue has room; False if the request must be shed."""
+        if not self._slots.locked():
+            await self._slots.acquire()
+            return True
+        if self.waiting >= self.queue_size:
+            return False
+        self.waiting += 1
+        try:
+            await asyncio.wait_for(self._slots.acquire(), self.queue_timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+        finally:
+            self.waiting -= 1
+
+    def release(self) -> None:
+        self._slots.release()
+
+def _client_ip(scope) -> str:
+    # Behind the load balancer, run uvicorn with --forwarded-allow-ips so this is the caller's address
+    client = scope.get("client")
+    return client[0] if client else "unknown"
+
+def _matches(path: str, prefixes: Iterable[str]) -> bool:
+    return any(path == prefix or path.startswith(prefix + "/") for prefix in prefixes)
+
+async def _reject(send, status_code: int, detail: str, retry_after: float) -> None:
+    body = json.dumps({"detail": detail}).encode()
+    await send({
+        "type": "http.response.start",
+        "status": status_code,
+        "headers": [
+            (b"content-type", b"application/json"),
+            (b"content-length", str(len(body)).encode()),
+            (b"retry-after", str(max(math.ceil(retry_after), 1)).encode()),
+        ],
+    })
+    await send({"type": "http.response.body", "body": body})
+
+class RateLimitMiddleware:
+    """
+    ASGI middleware applying per-client token buckets, then the global admission limit.
+
+    A client is the `sub` of its bearer token once `verify_token` has verified the
+    token (read from the verified token cache, so no signature check happens
+    here), and its IP address otherwise. Logins are always limited per IP with the
+    smaller `auth_bucket`. Rate-limited requests get 429, shed ones 503, both with a
+    `Retry-After` header.
+    """
+
+    def __init__(
+        self,
+        app,
+        backend: Optional[Any],
+        admission: AdmissionController,
+        token_cache: VerifiedTokenCache,
+        key_store: JWKSKeyStore,
+        bucket: Bucket = DEFAULT_BUCKET,
+        auth_bucket: Bucket = AUTH_BUCKET,
+    ):
+        self.app = app
+        self.backend = backend
+        self.admission = admission
+        self.token_cache = token_cache
+        self.key_store = key_store
+        self.bucket = bucket
+        self.auth_bucket = auth_bucket
+
+    def client_key(self, scope) -> str:
+        for name, value in scope["headers"]:
+            if name == b"authorization":
+                scheme, _, token = value.decode("latin-1").partition(" ")
+                if scheme.lower() == "bearer" and token:
+                    claims = self.token_cache.peek(token.strip(), self.key_store)
+                    if claims and claims.get("sub"):
+                        return f"sub:{claims['sub']}"
+                break
+        return f"ip:{_client_ip(scope)}"
+
+    async def __call__(self, scope, receive, send):
+        path = scope.get("path", "")
+        if scope["type"] != "http" or scope["method"] == "OPTIONS" or _matches(path, UNLIMITED_PATHS):
+            await self.app(scope, receive, send)
+            return
+
+        if self.backend is not None:
+            if _matches(path, ("/auth",)):
+                bucket, key = self.auth_bucket, f"ip:{_client_ip(scope)}"
+            else:
+                bucket, key = self.bucket, self.client_key(scope)
+            allowed, retry_after = await self.backend.take(f"{bucket.name}:{key}", bucket)
+            if not allowed:
+                REQUESTS_REJECTED.labels("rate_limited").inc()
+                await _reject(send, 429, "Too many requests, please retry later.", retry_after)
+                return
+
+        if not self.admission.enabled or _matches(path, STREAMING_PATHS):
+            await self.app(scope, receive, send)
+            return
+        if not await self.admission.acquire():
+            REQUESTS_REJECTED.labels("overloaded").inc()
+            await _reject(send, 503, "The service is overloaded, please retry later.", 1)
+            return
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.admission.release()
+
+rate_limit_backend = create_rate_limit_backend()
+admission = AdmissionController()
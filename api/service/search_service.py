@@ -0,0 +1,153 @@
+import asyncio
+import os
+import re
+import weakref
+from collections import defaultdict
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from sqlalchemy import func, literal, or_, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from model.dtos.patient import PatientResponseDTO, PatientSearchResultDTO
+from model.entities.patient import Patient
+from service.serialization_utils import response_columns
+from service.version_service import get_versions
+
+SEARCH_DEFAULT_LIMIT = 20
+SEARCH_MAX_LIMIT = 100
+SEARCH_SIMILARITY_THRESHOLD = float(os.getenv("SEARCH_SIMILARITY_THRESHOLD", "0.3"))
+RESULT_COLUMNS = response_columns(Patient, PatientResponseDTO)
+
+_WORDS = re.compile(r"[^\W_]+")
+
+def _escape_like(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+def trigrams(text: str) -> Set[str]:
+    """Trigrams of each word of `text` the way pg_trgm extracts them: lowercased, padded with two spaces before and one after."""
+    grams = set()
+    for word in _WORDS.findall(text.lower()):
+        padded = f"  {word} "
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return grams
+
+def word_similarity(query: str, name: str) -> float:
+    """
+    How well `query` matches the whole of `name` or any word in it, from 0 to 1.
+
+    An approximation of pg_trgm's word_similarity, so both search backends rank
+    typos such as "Alexnder" for "Alexander" alike.
+    """
+    query_grams = trigrams(query)
+    if not query_grams:
+        return 0.0
+    best = 0.0
+    for grams in [trigrams(name), *(trigrams(word) for word in _WORDS.findall(name))]:
+        if grams:
+            best = max(best, len(query_grams & grams) / len(query_grams | grams))
+    return best
+
+def _rank(query: str, name: str, score: float) -> Tuple[bool, bool, float]:
+    """Sort key shared by both backends: prefix matches first, then substring matches, then by similarity."""
+    lowered = name.lower()
+    return (lowered.startswith(query), query in lowered, score)
+
+class NameSearchIndex:
+    """
+    In-memory trigram index over patient names, for databases without pg_trgm.
+
+    It is rebuilt from the patients table whenever the table's change counter
+    moves, so it never serves names from before a committed write.
+    """
+
+    def __init__(self):
+        self.version: Optional[int] = None
+        self.names: Dict[int, str] = {}
+        self.postings: Dict[str, Set[int]] = defaultdict(set)
+        self.lock = asyncio.Lock()
+
+    def build(self, rows: Iterable[Tuple[int, str]], version: int) -> None:
+        names: Dict[int, str] = {}
+        postings: Dict[str, Set[int]] = defaultdict(set)
+        for patient_id, name in rows:
+            names[patient_id] = name
+            for gram in trigrams(name):
+                postings[gram].add(patient_id)
+        self.names, self.postings, self.version = names, postings, version
+
+    async def refresh(self, session: AsyncSession) -> None:
+        version = (await get_versions(session, "patients"))["patients"]
+        if version == self.version:
+            return
+        async with self.lock:
+            if version != self.version:
+                rows = (await session.execute(select(Patient.id, Patient.name))).all()
+                self.build(rows, version)
+
+    def search(self, query: str, limit: int, threshold: float = SEARCH_SIMILARITY_THRESHOLD) -> List[Tuple[int, float]]:
+        """Ids and scores of the best matches for `query`, best first."""
+        query = query.lower().strip()
+        query_grams = trigrams(query)
+        if len(query) < 3 or not query_grams:
+            # Too short to share an inner trigram with every name containing it
+            candidates: Iterable[int] = self.names
+        else:
+            candidates = set().union(*(self.postings.get(gram, ()) for gram in query_grams))
+        matches = []
+        for patient_id in candidates:
+            name = self.names[patient_id]
+            score = word_similarity(query, name)
+            if score >= threshold or query in name.lower():
+                matches.append((_rank(query, name, score), -patient_id, patient_id, score))
+        matches.sort(reverse=True)
+        return [(patient_id, round(score, 4)) for _, _, patient_id, score in matches[:limit]]
+
+_memory_indexes: "weakref.WeakKeyDictionary" = weakref.WeakKeyDictionary()
+
+def memory_index(session: AsyncSession) -> NameSearchIndex:
+    """The in-memory index of the database `session` is bound to."""
+    engine = session.get_bind()
+    if engine not in _memory_indexes:
+        _memory_indexes[engine] = NameSearchIndex()
+    return _memory_indexes[engine]
+
+async def search_patients(
+    session: AsyncSession,
+    query: str,
+    limit: int = SEARCH_DEFAULT_LIMIT,
+    threshold: float = SEARCH_SIMILARITY_THRESHOLD,
+) -> List[PatientSearchResultDTO]:
+    """
+    Patients whose name starts with, contains or resembles `query`, best match first.
+
+    On PostgreSQL the matching and ranking run in the database on the
+    `ix_patients_name_trgm` GIN index; elsewhere the in-memory NameSearchIndex
+    does the same work.
+    """
+    query = query.strip()
+    if session.get_bind().dialect.name != "postgresql":
+        index = memory_index(session)
+        await index.refresh(session)
+        matches = index.search(query, limit, threshold)
+        rows = (await session.execute(select(*RESULT_COLUMNS).where(Patient.id.in_([patient_id for patient_id, _ in matches])))).all()
+        by_id = {row.id: row for row in rows}
+        return [
+            PatientSearchResultDTO(**by_id[patient_id]._asdict(), score=score)
+            for patient_id, score in matches if patient_id in by_id
+        ]
+
+    escaped = _escape_like(query)
+    score = func.word_similarity(literal(query), Patient.name)
+    await session.execute(select(func.set_config("pg_trgm.word_similarity_threshold", str(threshold), True)))
+    result = await session.execute(
+        select(*RESULT_COLUMNS, score.label("score"))
+        .where(or_(Patient.name.ilike(f"%{escaped}%", escape="\\"), Patient.name.op("%>")(query)))
+        .order_by(
+            Patient.name.ilike(f"{escaped}%", escape="\\").desc(),
+            Patient.name.ilike(f"%{escaped}%", escape="\\").desc(),
+            score.desc(),
+            Patient.id,
+        )
+        .limit(limit)
+    )
+    return [PatientSearchResultDTO.model_validate(row) for row in result]
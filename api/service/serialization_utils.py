@@ -0,0 +1,38 @@
+from typing import Optional, Sequence, Type
+
+from fastapi import Response
+from pydantic import BaseModel
+from pydantic_core import to_json
+from sqlalchemy import Row
+
+def response_columns(entity, dto: Type[BaseModel]) -> tuple:
+    """Columns of `entity` backing the fields of `dto`, in the DTO's field order."""
+    return tuple(getattr(entity, field) for field in dto.model_fields)
+
+def encode_rows(rows: Sequence[Row]) -> bytes:
+    """
+    Encode result rows as a JSON array of objects keyed by column name.
+
+    Rows selected with `response_columns` encode to the same bytes as the DTOs
+    would, without building a model per row: pydantic's encoder handles dates
+    and enums natively.
+    """
+    if not rows:
+        return b"[]"
+    fields = rows[0]._fields
+    return to_json([dict(zip(fields, row)) for row in rows])
+
+def json_response(content: bytes, response: Optional[Response] = None) -> Response:
+    """
+    Wrap already encoded JSON in a response.
+
+    FastAPI sends a returned Response as is, skipping the `response_model` pass,
+    but also ignores headers set on the injected `response` (ETag, X-Next-Cursor),
+    so those are copied over.
+    """
+    encoded = Response(content, media_type="application/json")
+    if response is not None:
+        for key, value in response.headers.items():
+            if key != "content-length":
+                encoded.headers.append(key, value)
+    return encoded
@@ -0,0 +1,99 @@
+from collections import defaultdict
+from typing import List, Optional
+
+from pydantic import TypeAdapter
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from model.dtos.pagination import PaginationDTO
+from model.dtos.stats import CancerTypeCountDTO, HospitalStatsDTO, RegistryStatsDTO
+from model.entities.hospital import Hospital
+from model.entities.patient import Patient
+from service.cache_service import ReadThroughCache, no_cache
+from service.query_utils import paginate
+from service.version_service import get_versions
+
+REGISTRY_STATS_ADAPTER = TypeAdapter(RegistryStatsDTO)
+HOSPITAL_STATS_PAGE_ADAPTER = TypeAdapter(List[HospitalStatsDTO])
+
+def _occupancy_rate(patients: int, capacity: Optional[int]) -> Optional[float]:
+    return round(patients / capacity, 4) if capacity else None
+
+class StatsService:
+    """
+    Aggregate counts for the dashboard, computed with GROUP BY in the database.
+
+    Results are cached under the change counters of the hospitals and patients
+    tables, so a cached aggregate is never older than the data: any write bumps a
+    counter and the next request recomputes it, while idle periods are served
+    from the cache with a single primary key lookup.
+    """
+
+    def __init__(self, session: AsyncSession, cache: ReadThroughCache = no_cache):
+        self.session = session
+        self.cache = cache
+
+    async def _cache_key(self, *parts) -> str:
+        versions = await get_versions(self.session, "hospitals", "patients")
+        return ":".join([f"{versions['hospitals']}.{versions['patients']}", *map(str, parts)])
+
+    async def get_registry_stats(self) -> RegistryStatsDTO:
+        async def load():
+            hospitals = (await self.session.execute(
+                select(func.count(Hospital.id), func.coalesce(func.sum(Hospital.capacity), 0))
+            )).one()
+            patients = (await self.session.execute(
+                select(Patient.cancer_type, func.count(Patient.id), func.count(Patient.hospital_id))
+                .group_by(Patient.cancer_type)
+            )).all()
+            total = sum(count for _, count, _ in patients)
+            assigned = sum(count for _, _, count in patients)
+            by_cancer_type = sorted(
+                (CancerTypeCountDTO(cancer_type=cancer_type, patients=count) for cancer_type, count, _ in patients if cancer_type is not None),
+                key=lambda entry: (-entry.patients, entry.cancer_type.value),
+            )
+            return RegistryStatsDTO(
+                hospitals=hospitals[0],
+                total_capacity=hospitals[1],
+                patients=total,
+                assigned_patients=assigned,
+                unassigned_patients=total - assigned,
+                # The check constraint ties cancer_type to oncological
+                oncological_patients=sum(entry.patients for entry in by_cancer_type),
+                occupancy_rate=_occupancy_rate(assigned, hospitals[1]),
+                by_cancer_type=by_cancer_type,
+            )
+        return await self.cache.get_or_load("stats", await self._cache_key("registry"), REGISTRY_STATS_ADAPTER, load)
+
+    async def get_hospital_stats(self, pagination: Optional[PaginationDTO] = None) -> List[HospitalStatsDTO]:
+        """Per-hospital patient counts for a page of hospitals, in id order."""
+        async def load():
+            hospitals = (await self.session.execute(
+                paginate(select(Hospital.id, Hospital.name, Hospital.capacity), Hospital.id, pagination)
+            )).all()
+            counts = defaultdict(dict)
+            if hospitals:
+                rows = await self.session.execute(
+                    select(Patient.hospital_id, Patient.cancer_type, func.count())
+                    .where(Patient.hospital_id.in_([hospital.id for hospital in hospitals]))
+                    .group_by(Patient.hospital_id, Patient.cancer_type)
+                )
+                for hospital_id, cancer_type, count in rows:
+                    counts[hospital_id][cancer_type] = count
+            stats = []
+            for hospital in hospitals:
+                by_cancer_type = {cancer_type: count for cancer_type, count in counts[hospital.id].items() if cancer_type is not None}
+                patients = sum(counts[hospital.id].values())
+                stats.append(HospitalStatsDTO(
+                    id=hospital.id,
+                    name=hospital.name,
+                    capacity=hospital.capacity,
+                    patients=patients,
+                    free_beds=max(hospital.capacity - patients, 0) if hospital.capacity is not None else None,
+                    occupancy_rate=_occupancy_rate(patients, hospital.capacity),
+                    oncological_patients=sum(by_cancer_type.values()),
+                    by_cancer_type=by_cancer_type,
+                ))
+            return stats
+        page = "all" if pagination is None else f"{pagination.limit}:{pagination.cursor}"
+        return await self.cache.get_or_load("stats", await self._cache_key("hospitals", page), HOSPITAL_STATS_PAGE_ADAPTER, load)
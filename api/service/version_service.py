@@ -0,0 +1,38 @@
+import random
+from typing import Dict
+
+from sqlalchemy import func, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from model.entities.table_version import VERSION_SHARDS, TableVersion
+
+async def bump_versions(session: AsyncSession, *tables: str) -> None:
+    """
+    Increment the change counters of `tables` in the caller's transaction.
+
+    Each call increments one randomly chosen shard per table, so concurrent
+    writers to the same table only wait on each other when they pick the same
+    shard. Call it once per transaction, right before committing: the shard row
+    stays locked until the commit.
+    """
+    await session.execute(
+        update(TableVersion)
+        .where(TableVersion.table_name.in_(sorted(set(tables))), TableVersion.shard == random.randrange(VERSION_SHARDS))
+        .values(version=TableVersion.version + 1)
+        .execution_options(synchronize_session=False)
+    )
+
+async def get_versions(session: AsyncSession, *tables: str) -> Dict[str, int]:
+    """
+    Return the current change counter of each of `tables` with a single primary key range scan.
+
+    A table's counter is the sum of its shards. Every committed write adds one to
+    it, so it never repeats a value and any change is seen as a new version.
+    """
+    result = await session.execute(
+        select(TableVersion.table_name, func.sum(TableVersion.version))
+        .where(TableVersion.table_name.in_(tables))
+        .group_by(TableVersion.table_name)
+    )
+    versions = dict(result.all())
+    return {table: int(versions.get(table) or 0) for table in tables}
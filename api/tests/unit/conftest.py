@@ -4,36 +4,85 @@ import os
 # Add the project root directory to sys.path
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../../')))
 
+# Configuration the services read at import time
+os.environ.setdefault('AWS_REGION', 'us-east-1')
+os.environ.setdefault('APP_CLIENT_ID', 'test-client-id')
+
 import pytest
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
+import pytest_asyncio
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.pool import StaticPool
 from model.entities.database import Base
 from unittest.mock import patch
+import httpx
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
+from jose import jwk, jwt
+from service import auth_service
+from service.query_inspection_service import instrument_engine
+from alembic.config import Config
 
-@pytest.fixture
-def db_session():
+@pytest_asyncio.fixture
+async def db_session():
     """Create a fresh database for each test."""
-    engine = create_engine(
-        'sqlite:///:memory:',
+    engine = create_async_engine(
+        'sqlite+aiosqlite:///:memory:',
         connect_args={'check_same_thread': False},
         poolclass=StaticPool,
     )
-    TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
-    Base.metadata.create_all(bind=engine)
+    instrument_engine(engine)  # lets tests use query_budget
+    TestingSessionLocal = async_sessionmaker(bind=engine, class_=AsyncSession, autoflush=False, expire_on_commit=False)
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
     
     session = TestingSessionLocal()
     try:
         yield session
     finally:
-        session.close()
-        Base.metadata.drop_all(bind=engine)
+        await session.close()
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.drop_all)
+        await engine.dispose()
 
 @pytest.fixture
 def mock_cognito_client():
     """Mock AWS Cognito client."""
+    auth_service.get_cognito_client.cache_clear()
     with patch('boto3.client') as mock_client:
         yield mock_client.return_value
+    auth_service.get_cognito_client.cache_clear()
+
+@pytest.fixture
+def cognito_stub():
+    """Local HTTP stub of the Cognito InitiateAuth endpoint; yields the received request bodies."""
+    requests = []
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            requests.append(json.loads(self.rfile.read(int(self.headers["Content-Length"]))))
+            body = json.dumps({"AuthenticationResult": {"AccessToken": "stub-access-token"}}).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/x-amz-json-1.1")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    auth_service.get_cognito_client.cache_clear()
+    credentials = {"AWS_ACCESS_KEY_ID": "stub", "AWS_SECRET_ACCESS_KEY": "stub"}
+    with patch.dict(os.environ, credentials), \
+         patch.object(auth_service, "COGNITO_ENDPOINT_URL", f"http://127.0.0.1:{server.server_port}"):
+        yield requests
+    auth_service.get_cognito_client.cache_clear()
+    server.shutdown()
 
 @pytest.fixture
 def mock_jwt():
@@ -42,4 +91,92 @@ def mock_jwt():
         'sub': 'test-user-id',
         'email': 'test@example.com',
         'cognito:username': 'testuser'
-    } 
\ No newline at end of file
+    }
+
+@pytest.fixture(scope="session")
+def rsa_private_key():
+    """RSA key pair standing in for the Cognito signing key."""
+    return rsa.generate_private_key(public_exponent=65537, key_size=2048)
+
+@pytest.fixture
+def jwks_document(rsa_private_key):
+    """JWKS document publishing the public half of the test signing key."""
+    public_pem = rsa_private_key.public_key().public_bytes(
+        serialization.Encoding.PEM, serialization.PublicFormat.SubjectPublicKeyInfo
+    )
+    public_jwk = jwk.construct(public_pem, "RS256").to_dict()
+    return {"keys": [dict(public_jwk, kid="test-kid", alg="RS256", use="sig")]}
+
+@pytest.fixture
+def jwks_requests():
+    """Requests received by the stubbed JWKS endpoint."""
+    return []
+
+@pytest.fixture
+def token_cache():
+    """Empty verified-token cache for each test."""
+    cache = auth_service.VerifiedTokenCache(max_size=100)
+    with patch.object(auth_service, "token_cache", cache):
+        yield cache
+
+@pytest.fixture
+def key_store(jwks_document, jwks_requests, token_cache):
+    """JWKS key store backed by a local stub of the Cognito JWKS endpoint."""
+    def handler(request):
+        jwks_requests.append(request)
+        return httpx.Response(200, json=jwks_document)
+
+    store = auth_service.JWKSKeyStore(
+        auth_service.JWKS_URL,
+        min_refresh_interval=0,
+        http_client=httpx.AsyncClient(transport=httpx.MockTransport(handler)),
+    )
+    with patch.object(auth_service, "key_store", store):
+        yield store
+
+@pytest.fixture
+def make_token(rsa_private_key):
+    """Build RS256 tokens signed with the test key."""
+    private_pem = rsa_private_key.private_bytes(
+        serialization.Encoding.PEM,
+        serialization.PrivateFormat.PKCS8,
+        serialization.NoEncryption(),
+    )
+
+    def _make_token(claims, kid="test-kid"):
+        claims = dict({"iss": auth_service.COGNITO_ISSUER, "exp": 4102444800}, **claims)
+        return jwt.encode(claims, private_pem, algorithm="RS256", headers={"kid": kid})
+
+    return _make_token
+
+@pytest.fixture
+def migration_database(tmp_path):
+    """Path of an empty SQLite database file for migration tests."""
+    return tmp_path / "migrations.db"
+
+@pytest.fixture
+def alembic_config(migration_database):
+    """Alembic configuration pointing the project migrations at `migration_database`."""
+    config = Config(os.path.abspath(os.path.join(os.path.dirname(__file__), '../../alembic.ini')))
+    config.set_main_option("sqlalchemy.url", f"sqlite+aiosqlite:///{migration_database}")
+    config.attributes["configure_logger"] = False
+    return config
+
+class FakeRedis:
+    """In-memory stand-in for the redis-py asyncio client commands the cache uses."""
+
+    def __init__(self):
+        self.data = {}
+
+    async def get(self, key):
+        return self.data.get(key)
+
+    async def set(self, key, value, px=None):
+        self.data[key] = value if isinstance(value, bytes) else str(value).encode()
+
+    async def delete(self, *keys):
+        return sum(self.data.pop(key, None) is not None for key in keys)
+
+@pytest.fixture
+def fake_redis():
+    return FakeRedis()
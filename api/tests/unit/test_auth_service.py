@@ -1,3 +1,6 @@
+import asyncio
+import threading
+import time
 import pytest
 from fastapi import HTTPException
 from service.auth_service import authenticate_user, verify_token
@@ -55,56 +58,154 @@ async def test_authenticate_user_failure(mock_cognito_client):
     assert result is None
 
 @pytest.mark.asyncio
-async def test_verify_token_success():
+async def test_authenticate_user_times_out(mock_cognito_client):
+    # Arrange
+    release = threading.Event()
+    mock_cognito_client.initiate_auth.side_effect = lambda **kwargs: release.wait(5)
+
+    # Act & Assert
+    with patch('service.auth_service.COGNITO_TIMEOUT', 0.05):
+        with pytest.raises(HTTPException) as exc_info:
+            await authenticate_user('testuser', 'testpass')
+    release.set()
+    assert exc_info.value.status_code == 504
+
+@pytest.mark.asyncio
+async def test_authenticate_user_sheds_load_when_saturated(mock_cognito_client):
+    # Arrange
+    slots = asyncio.Semaphore(1)
+    await slots.acquire()
+
+    # Act & Assert
+    with patch('service.auth_service._cognito_slots', slots), \
+         patch('service.auth_service.COGNITO_QUEUE_TIMEOUT', 0.05):
+        with pytest.raises(HTTPException) as exc_info:
+            await authenticate_user('testuser', 'testpass')
+    assert exc_info.value.status_code == 503
+    mock_cognito_client.initiate_auth.assert_not_called()
+
+@pytest.mark.asyncio
+async def test_authenticate_user_against_local_cognito_stub(cognito_stub):
+    # Act
+    result = await authenticate_user('testuser', 'testpass')
+
+    # Assert
+    assert result["AccessToken"] == "stub-access-token"
+    assert cognito_stub[0]["AuthParameters"]["USERNAME"] == "testuser"
+
+@pytest.mark.asyncio
+async def test_verify_token_success(key_store, make_token):
     # Arrange
-    mock_token = "valid.jwt.token"
     mock_credentials = MagicMock()
-    mock_credentials.credentials = mock_token
-
-    mock_jwks = {
-        "keys": [{
-            "kid": "test-kid",
-            "kty": "RSA",
-            "n": "test-n",
-            "e": "test-e"
-        }]
-    }
+    mock_credentials.credentials = make_token({"sub": "test-user"})
 
-    mock_header = {"kid": "test-kid"}
-    mock_payload = {"sub": "test-user", "iss": "test-issuer"}
+    # Act
+    result = await verify_token(mock_credentials)
 
-    with patch('service.auth_service.get_jwk', return_value=mock_jwks), \
-         patch('service.auth_service.jwt.get_unverified_header', return_value=mock_header), \
-         patch('service.auth_service.jwt.decode', return_value=mock_payload):
-        
-        # Act
-        result = await verify_token(mock_credentials)
+    # Assert
+    assert result["sub"] == "test-user"
 
-        # Assert
-        assert result == mock_payload
+@pytest.mark.asyncio
+async def test_verify_token_invalid(key_store, make_token):
+    # Arrange
+    mock_credentials = MagicMock()
+    mock_credentials.credentials = make_token({"sub": "test-user"}, kid="different-kid")
+
+    # Act & Assert
+    with pytest.raises(HTTPException) as exc_info:
+        await verify_token(mock_credentials)
+    assert exc_info.value.status_code == 401
+    assert exc_info.value.detail == "Token inválido"
 
 @pytest.mark.asyncio
-async def test_verify_token_invalid():
+async def test_verify_token_expired(key_store, make_token):
     # Arrange
     mock_credentials = MagicMock()
-    mock_credentials.credentials = "invalid.token"
-
-    mock_jwks = {
-        "keys": [{
-            "kid": "test-kid",
-            "kty": "RSA",
-            "n": "test-n",
-            "e": "test-e"
-        }]
-    }
+    mock_credentials.credentials = make_token({"sub": "test-user", "exp": int(time.time()) - 60})
+
+    # Act & Assert
+    with pytest.raises(HTTPException) as exc_info:
+        await verify_token(mock_credentials)
+    assert exc_info.value.status_code == 401
+    assert exc_info.value.detail == "Token expirado"
 
-    mock_header = {"kid": "different-kid"}
+@pytest.mark.asyncio
+async def test_key_store_single_flight_refresh(key_store, jwks_requests):
+    # Act
+    keys = await asyncio.gather(*(key_store.get_key("test-kid") for _ in range(20)))
 
-    with patch('service.auth_service.get_jwk', return_value=mock_jwks), \
-         patch('service.auth_service.jwt.get_unverified_header', return_value=mock_header):
-        
-        # Act & Assert
-        with pytest.raises(HTTPException) as exc_info:
-            await verify_token(mock_credentials)
-        assert exc_info.value.status_code == 401
-        assert exc_info.value.detail == "Token inválido" 
\ No newline at end of file
+    # Assert
+    assert all(key is keys[0] for key in keys)
+    assert len(jwks_requests) == 1
+
+@pytest.mark.asyncio
+async def test_key_store_refreshes_on_rotation(key_store, jwks_document, jwks_requests):
+    # Arrange
+    await key_store.get_key("test-kid")
+    rotated = dict(jwks_document["keys"][0], kid="rotated-kid")
+    jwks_document["keys"].append(rotated)
+
+    # Act
+    key = await key_store.get_key("rotated-kid")
+
+    # Assert
+    assert key is not None
+    assert len(jwks_requests) == 2
+
+@pytest.mark.asyncio
+async def test_key_store_rate_limits_unknown_kid(key_store, jwks_requests):
+    # Arrange
+    key_store.min_refresh_interval = 60
+    await key_store.get_key("test-kid")
+
+    # Act
+    for _ in range(5):
+        assert await key_store.get_key("unknown-kid") is None
+
+    # Assert
+    assert len(jwks_requests) == 1
+
+@pytest.mark.asyncio
+async def test_verify_token_uses_cache(key_store, token_cache, make_token):
+    # Arrange
+    mock_credentials = MagicMock()
+    mock_credentials.credentials = make_token({"sub": "test-user"})
+    await verify_token(mock_credentials)
+
+    # Act
+    with patch('service.auth_service.jwt.decode') as mock_decode:
+        result = await verify_token(mock_credentials)
+
+    # Assert
+    assert result["sub"] == "test-user"
+    mock_decode.assert_not_called()
+    assert token_cache.hits == 1
+    assert token_cache.misses == 1
+
+@pytest.mark.asyncio
+async def test_token_cache_drops_expired_and_rotated_tokens(key_store, token_cache):
+    # Arrange
+    await key_store.get_key("test-kid")
+    token_cache.put("expired", {"sub": "a", "exp": time.time() - 1}, "test-kid")
+    token_cache.put("rotated", {"sub": "b", "exp": time.time() + 60}, "old-kid")
+
+    # Act & Assert
+    assert token_cache.get("expired", key_store) is None
+    assert token_cache.get("rotated", key_store) is None
+    assert token_cache.stats()["size"] == 0
+
+def test_token_cache_evicts_least_recently_used(key_store, token_cache):
+    # Arrange
+    token_cache.max_size = 2
+    key_store._keys["test-kid"] = MagicMock()
+    expires_at = time.time() + 60
+    token_cache.put("first", {"sub": "1", "exp": expires_at}, "test-kid")
+    token_cache.put("second", {"sub": "2", "exp": expires_at}, "test-kid")
+    token_cache.get("first", key_store)
+
+    # Act
+    token_cache.put("third", {"sub": "3", "exp": expires_at}, "test-kid")
+
+    # Assert
+    assert token_cache.get("second", key_store) is None
+    assert token_cache.get("first", key_store) == {"sub": "1", "exp": expires_at}
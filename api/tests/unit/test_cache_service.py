@@ -0,0 +1,166 @@
+import pytest
+import pytest_asyncio
+from datetime import date
+from sqlalchemy import update
+from unittest.mock import patch
+from model.entities.hospital import Hospital
+from model.entities.patient import Patient
+from model.dtos.hospital import HospitalUpdateDTO
+from model.dtos.pagination import PaginationDTO
+from service.cache_service import LRUCacheBackend, ReadThroughCache, RedisCacheBackend
+from service.hospital_service import HospitalService
+from service.patient_service import PatientService
+from service.version_service import bump_versions
+
+@pytest.fixture(params=["lru", "redis"])
+def cache(request, fake_redis):
+    if request.param == "redis":
+        return ReadThroughCache(RedisCacheBackend(fake_redis), ttl=60)
+    return ReadThroughCache(LRUCacheBackend(max_entries=100), ttl=60)
+
+@pytest_asyncio.fixture
+async def hospital(db_session):
+    hospital = Hospital(name="Test Hospital", address="Test Address", capacity=10)
+    db_session.add(hospital)
+    await db_session.commit()
+    return hospital
+
+@pytest_asyncio.fixture
+async def patient(db_session):
+    patient = Patient(name="John Doe", age=30, oncological=False, birth_date=date(1993, 5, 20))
+    db_session.add(patient)
+    await db_session.commit()
+    return patient
+
+@pytest.mark.asyncio
+async def test_lru_backend_expires_and_evicts():
+    # Arrange
+    backend = LRUCacheBackend(max_entries=2)
+    await backend.set("a", b"1", ttl=60)
+    await backend.set("b", b"2", ttl=60)
+    await backend.get("a")
+
+    # Act
+    await backend.set("c", b"3", ttl=60)
+
+    # Assert
+    assert await backend.get("a") == b"1"
+    assert await backend.get("b") is None
+
+    # Act
+    await backend.set("a", b"1", ttl=-1)
+
+    # Assert
+    assert await backend.get("a") is None
+
+@pytest.mark.asyncio
+async def test_get_hospital_by_id_is_read_through(db_session, cache, hospital):
+    # Arrange
+    service = HospitalService(db_session, cache)
+    await service.get_hospital_by_id(hospital.id)
+
+    # Act
+    with patch.object(service, "_get_hospital") as load:
+        result = await service.get_hospital_by_id(hospital.id)
+
+    # Assert
+    load.assert_not_called()
+    assert result.name == "Test Hospital"
+    assert cache.stats()["namespaces"]["hospital"] == {"hits": 1, "misses": 1}
+    assert cache.stats()["hit_rate"] == 0.5
+
+@pytest.mark.asyncio
+async def test_entries_of_an_older_shape_are_reloaded(db_session, cache, hospital):
+    # Arrange
+    service = HospitalService(db_session, cache)
+    await cache.backend.set(f"{cache.prefix}hospital:{hospital.id}", b'{"id": 1, "name": "Test Hospital"}', ttl=60)
+
+    # Act
+    result = await service.get_hospital_by_id(hospital.id)
+
+    # Assert
+    assert result.version == 1
+    assert cache.stats()["namespaces"]["hospital"] == {"hits": 0, "misses": 1}
+
+@pytest.mark.asyncio
+async def test_update_hospital_invalidates_entry_and_pages(db_session, cache, hospital):
+    # Arrange
+    service = HospitalService(db_session, cache)
+    await service.get_hospital_by_id(hospital.id)
+    await service.get_all_hospitals(PaginationDTO(limit=10))
+
+    # Act
+    await service.update_hospital(hospital.id, HospitalUpdateDTO(name="Renamed", address="Test Address", capacity=10))
+
+    # Assert
+    assert (await service.get_hospital_by_id(hospital.id)).name == "Renamed"
+    assert [h.name for h in await service.get_all_hospitals(PaginationDTO(limit=10))] == ["Renamed"]
+    assert cache.stats()["hits"] == 0
+
+@pytest.mark.asyncio
+async def test_pages_follow_writes_of_other_processes(db_session, cache, hospital):
+    # Arrange
+    service = HospitalService(db_session, cache)
+    await service.get_all_hospitals(PaginationDTO(limit=10))
+
+    # Act
+    # Another process commits a rename without touching this process's cache
+    await db_session.execute(update(Hospital).where(Hospital.id == hospital.id).values(name="Renamed"))
+    await bump_versions(db_session, "hospitals")
+    await db_session.commit()
+
+    # Assert
+    assert [h.name for h in await service.get_all_hospitals(PaginationDTO(limit=10))] == ["Renamed"]
+    assert cache.stats()["namespaces"]["hospitals"] == {"hits": 0, "misses": 2}
+
+@pytest.mark.asyncio
+async def test_assignment_invalidates_patient_and_hospitals(db_session, cache, hospital, patient):
+    # Arrange
+    hospitals = HospitalService(db_session, cache)
+    patients = PatientService(db_session, cache)
+    await hospitals.get_hospital_by_id(hospital.id)
+    await patients.get_patient_by_id(patient.id)
+
+    # Act
+    await hospitals.add_patients_to_hospital(hospital.id, [patient.id])
+    db_session.expunge_all()  # the next request starts with an empty identity map
+
+    # Assert
+    assert (await patients.get_patient_by_id(patient.id)).hospital_id == hospital.id
+    assert (await hospitals.get_hospital_by_id(hospital.id)).current_patients == 1
+
+    # Act
+    await patients.delete_patient(patient.id)
+
+    # Assert
+    assert (await hospitals.get_hospital_by_id(hospital.id)).current_patients == 0
+    assert cache.stats()["hits"] == 0
+
+@pytest.mark.asyncio
+async def test_delete_hospital_invalidates_its_patients(db_session, cache, hospital, patient):
+    # Arrange
+    hospitals = HospitalService(db_session, cache)
+    patients = PatientService(db_session, cache)
+    await hospitals.add_patient_to_hospital(hospital.id, patient.id)
+    assert (await patients.get_patient_by_id(patient.id)).hospital_id == hospital.id
+
+    # Act
+    await hospitals.delete_hospital(hospital.id)
+
+    # Assert
+    assert (await patients.get_patient_by_id(patient.id)).hospital_id is None
+
+@pytest.mark.asyncio
+async def test_redis_backend_errors_are_misses(db_session, hospital):
+    # Arrange
+    class BrokenRedis:
+        async def get(self, key):
+            raise ConnectionError("redis is down")
+
+        async def set(self, key, value, px=None):
+            raise ConnectionError("redis is down")
+
+    service = HospitalService(db_session, ReadThroughCache(RedisCacheBackend(BrokenRedis()), ttl=60))
+
+    # Act & Assert
+    assert (await service.get_hospital_by_id(hospital.id)).name == "Test Hospital"
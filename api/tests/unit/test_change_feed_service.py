@@ -0,0 +1,187 @@
+import asyncio
+import json
+import pytest
+import pytest_asyncio
+from datetime import date
+from unittest.mock import AsyncMock, patch
+from sqlalchemy import delete, insert, select
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from model.dtos.hospital import HospitalCreateDTO
+from model.dtos.patient import PatientCreateDTO
+from model.entities.database import Base
+from model.entities.change_event import ChangeEvent, ChangeOperation, ChangeTable
+from service.change_feed_service import ChangeFeed
+from service.hospital_service import HospitalService
+from service.patient_service import PatientService
+
+@pytest_asyncio.fixture
+async def engine(tmp_path):
+    # A database file, so the feed reads on connections of its own
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'changes.db'}")
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    yield engine
+    await engine.dispose()
+
+@pytest_asyncio.fixture
+async def session(engine):
+    async with async_sessionmaker(bind=engine, class_=AsyncSession, autoflush=False, expire_on_commit=False)() as session:
+        yield session
+
+@pytest_asyncio.fixture
+async def feed(engine):
+    feed = ChangeFeed(buffer_size=10, poll_interval=60, heartbeat=60)
+    await feed.start(engine)
+    yield feed
+    await feed.stop()
+
+async def create_patient(session, name):
+    return await PatientService(session).create_patient(PatientCreateDTO(name=name, age=40, oncological=False, birth_date=date(1984, 1, 1)))
+
+def parse(chunk):
+    """(event type, id, data) of each server-sent event in `chunk`."""
+    events = []
+    for message in chunk.strip().split("\n\n"):
+        fields = dict(line.split(": ", 1) for line in message.splitlines() if ": " in line and not line.startswith(":"))
+        events.append((fields.get("event"), fields.get("id"), json.loads(fields["data"])))
+    return events
+
+async def next_events(stream):
+    return parse(await asyncio.wait_for(anext(stream), 2))
+
+@pytest.mark.asyncio
+async def test_writes_record_numbered_events(session):
+    # Arrange
+    hospitals = HospitalService(session)
+    hospital = await hospitals.create_hospital(HospitalCreateDTO(name="H", address="A", capacity=5))
+    patient = await create_patient(session, "John")
+
+    # Act
+    await hospitals.add_patient_to_hospital(hospital.id, patient.id)
+    session.expunge_all()  # requests each have their own session
+    await PatientService(session).delete_patient(patient.id)
+
+    # Assert
+    events = (await session.execute(select(ChangeEvent.id, ChangeEvent.table_name, ChangeEvent.operation, ChangeEvent.entity_id).order_by(ChangeEvent.id))).all()
+    assert [(event.id, event.table_name, event.operation.value) for event in events] == [
+        (1, "hospitals", "created"),
+        (2, "patients", "created"),
+        (3, "hospitals", "updated"),
+        (4, "patients", "updated"),
+        (5, "patients", "deleted"),
+        (6, "hospitals", "updated"),
+    ]
+
+@pytest.mark.asyncio
+async def test_deleting_an_unassigned_patient_records_its_event(session):
+    # Arrange
+    patient = await create_patient(session, "John")
+    session.expunge_all()
+
+    # Act
+    await PatientService(session).delete_patient(patient.id)
+
+    # Assert
+    events = (await session.execute(select(ChangeEvent.id, ChangeEvent.table_name, ChangeEvent.operation).order_by(ChangeEvent.id))).all()
+    assert [(event.id, event.table_name, event.operation.value) for event in events] == [
+        (1, "patients", "created"),
+        (2, "patients", "deleted"),
+    ]
+
+@pytest.mark.asyncio
+async def test_stream_delivers_committed_changes(session, feed):
+    # Arrange
+    stream = feed.stream()
+    ready = await next_events(stream)
+
+    # Act
+    patient = await create_patient(session, "John")
+    changes = await next_events(stream)
+    await stream.aclose()
+
+    # Assert
+    assert ready == [("ready", "0", {"cursor": 0})]
+    assert len(changes) == 1
+    event_type, event_id, change = changes[0]
+    assert (event_type, event_id) == ("change", "1")
+    assert (change["table"], change["operation"], change["entity_id"]) == ("patients", "created", patient.id)
+    assert change["data"]["name"] == "John"
+
+@pytest.mark.asyncio
+async def test_stream_resumes_after_cursor(session, feed):
+    # Arrange
+    for name in ["A", "B", "C"]:
+        await create_patient(session, name)
+    await HospitalService(session).create_hospital(HospitalCreateDTO(name="H", address="A", capacity=5))
+    await feed.read_new_events()
+    feed.buffer.clear()  # as if the subscriber fell behind the buffer
+
+    # Act
+    stream = feed.stream(cursor=1, tables=[ChangeTable.patients])
+    await next_events(stream)
+    changes = await next_events(stream)
+    await stream.aclose()
+
+    # Assert
+    assert [(event_id, change["data"]["name"]) for _, event_id, change in changes] == [("2", "B"), ("3", "C")]
+
+@pytest.mark.asyncio
+async def test_feed_waits_for_ids_that_may_still_commit(session, feed):
+    # Arrange
+    async def commit_events(*ids):
+        await session.execute(insert(ChangeEvent), [
+            {"id": event_id, "table_name": "patients", "operation": ChangeOperation.created, "entity_id": event_id}
+            for event_id in ids
+        ])
+        await session.commit()
+
+    # (xmin, xmax) of the snapshot each read sees
+    snapshots = AsyncMock(side_effect=[(10, 12), (11, 13), (13, 14)])
+    await commit_events(1, 3, 5)
+
+    # Act
+    with patch.object(feed, "_snapshot", snapshots):
+        await feed.read_new_events()
+        first = feed.cursor
+        await commit_events(2)  # committed late
+        await feed.read_new_events()
+        second = feed.cursor
+        await feed.read_new_events()  # 4 was rolled back: the transaction holding it has ended
+
+    # Assert
+    assert (first, second, feed.cursor) == (1, 3, 5)
+    assert [entry[0] for entry in feed.buffer] == [1, 2, 3, 5]
+
+@pytest.mark.asyncio
+async def test_stream_resets_when_events_were_pruned(session, feed):
+    # Arrange
+    for name in ["A", "B"]:
+        await create_patient(session, name)
+    await session.execute(delete(ChangeEvent).where(ChangeEvent.id == 1))
+    await session.commit()
+    await feed.read_new_events()
+    feed.buffer.clear()
+
+    # Act
+    stream = feed.stream(cursor=0)
+    await next_events(stream)
+    reset = await next_events(stream)
+    await stream.aclose()
+
+    # Assert
+    assert reset == [("reset", "2", {"cursor": 2})]
+
+@pytest.mark.asyncio
+async def test_stop_ends_streams(feed):
+    # Arrange
+    stream = feed.stream()
+    await next_events(stream)
+    pending = asyncio.ensure_future(anext(stream))
+    await asyncio.sleep(0)
+
+    # Act
+    await feed.stop()
+
+    # Assert
+    with pytest.raises(StopAsyncIteration):
+        await asyncio.wait_for(pending, 2)
@@ -0,0 +1,143 @@
+import gzip
+import pytest
+import httpx
+from datetime import date
+from fastapi import Depends, FastAPI, HTTPException
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from model.entities.database import get_db
+from model.dtos.hospital import HospitalCreateDTO
+from model.dtos.patient import PatientCreateDTO
+from service.compression_utils import CompressionMiddleware, brotli, choose_encoding
+from service.etag_utils import conditional_get, etag_matches, parse_if_match, row_etag
+from service.hospital_service import HospitalService
+from service.patient_service import PatientService
+from service.version_service import get_versions
+
+def client(app):
+    return httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test")
+
+@pytest.fixture
+def versioned_app(db_session):
+    app = FastAPI()
+    app.dependency_overrides[get_db] = lambda: db_session
+
+    @app.get("/hospitals")
+    async def hospitals(etag: str = Depends(conditional_get("hospitals"))):
+        return {"etag": etag}
+
+    return app
+
+@pytest.mark.asyncio
+async def test_writes_bump_table_versions(db_session):
+    # Arrange
+    hospitals = HospitalService(db_session)
+    patients = PatientService(db_session)
+
+    # Act
+    hospital = await hospitals.create_hospital(HospitalCreateDTO(name="H", address="A", capacity=5))
+    patient = await patients.create_patient(PatientCreateDTO(name="P", age=30, oncological=False, birth_date=date(1993, 5, 20)))
+    await hospitals.add_patient_to_hospital(hospital.id, patient.id)
+
+    # Assert
+    assert await get_versions(db_session, "hospitals", "patients") == {"hospitals": 2, "patients": 2}
+
+def test_etag_matches_ignores_weakness_and_encoding_suffix():
+    # Act & Assert
+    assert etag_matches('"other", W/"hospitals.1-abc-gzip"', '"hospitals.1-abc"')
+    assert etag_matches("*", '"hospitals.1-abc"')
+    assert not etag_matches('"hospitals.0-abc"', '"hospitals.1-abc"')
+    assert not etag_matches(None, '"hospitals.1-abc"')
+
+def test_parse_if_match():
+    # Act & Assert
+    assert parse_if_match(None) is None
+    assert parse_if_match("*") is None
+    assert parse_if_match(f'{row_etag(3)}, "v4-gzip"') == [3, 4]
+    with pytest.raises(HTTPException) as exc_info:
+        parse_if_match('"hospitals.1-abc"')
+    assert exc_info.value.status_code == 412
+
+@pytest.mark.asyncio
+async def test_conditional_get_returns_304_until_table_changes(db_session, versioned_app):
+    async with client(versioned_app) as http:
+        # Arrange
+        first = await http.get("/hospitals")
+        etag = first.headers["etag"]
+
+        # Act
+        unchanged = await http.get("/hospitals", headers={"If-None-Match": etag})
+        other_page = await http.get("/hospitals?limit=5", headers={"If-None-Match": etag})
+        await HospitalService(db_session).create_hospital(HospitalCreateDTO(name="H", address="A", capacity=5))
+        changed = await http.get("/hospitals", headers={"If-None-Match": etag})
+
+    # Assert
+    assert first.status_code == 200
+    assert unchanged.status_code == 304
+    assert unchanged.content == b""
+    assert unchanged.headers["etag"] == etag
+    assert other_page.status_code == 200
+    assert changed.status_code == 200
+    assert changed.headers["etag"] != etag
+
+@pytest.fixture
+def compressed_app():
+    app = FastAPI()
+    app.add_middleware(CompressionMiddleware, minimum_size=100)
+
+    @app.get("/small")
+    async def small():
+        return PlainTextResponse("ok")
+
+    @app.get("/large")
+    async def large():
+        return PlainTextResponse("x" * 1000, headers={"ETag": '"v1"'})
+
+    @app.get("/stream")
+    async def stream():
+        async def rows():
+            for i in range(3):
+                yield f"row {i}\n"
+        return StreamingResponse(rows(), media_type="application/x-ndjson")
+
+    @app.get("/events")
+    async def events():
+        return StreamingResponse(iter(["data: x\n\n" * 50]), media_type="text/event-stream")
+
+    return app
+
+@pytest.mark.asyncio
+async def test_compression_respects_threshold_and_tags_etag(compressed_app):
+    async with client(compressed_app) as http:
+        # Act
+        small = await http.get("/small", headers={"Accept-Encoding": "gzip"})
+        large = await http.get("/large", headers={"Accept-Encoding": "gzip"})
+
+    # Assert
+    assert "content-encoding" not in small.headers
+    assert small.headers["vary"] == "Accept-Encoding"
+    assert large.headers["content-encoding"] == "gzip"
+    assert large.headers["etag"] == '"v1-gzip"'
+    assert int(large.headers["content-length"]) < 1000
+    assert large.text == "x" * 1000
+
+@pytest.mark.asyncio
+async def test_compression_streams_chunks_and_skips_event_streams(compressed_app):
+    async with client(compressed_app) as http:
+        # Act
+        async with http.stream("GET", "/stream", headers={"Accept-Encoding": "gzip"}) as stream:
+            raw = b"".join([chunk async for chunk in stream.aiter_raw()])
+            encoding = stream.headers["content-encoding"]
+        events = await http.get("/events", headers={"Accept-Encoding": "gzip"})
+
+    # Assert
+    assert encoding == "gzip"
+    assert gzip.decompress(raw) == b"row 0\nrow 1\nrow 2\n"
+    assert "content-encoding" not in events.headers
+
+def test_choose_encoding():
+    # Act & Assert
+    assert choose_encoding("gzip, deflate") == "gzip"
+    assert choose_encoding("gzip;q=0, deflate") is None
+    assert choose_encoding("*") == "gzip"
+    assert choose_encoding("") is None
+    assert choose_encoding("br, gzip") == ("br" if brotli is not None else "gzip")
@@ -1,18 +1,22 @@
 import pytest
+from unittest.mock import patch
 from fastapi import HTTPException
 from service.hospital_service import HospitalService
+from service.patient_service import PatientService
 from model.dtos.hospital import HospitalCreateDTO, HospitalUpdateDTO
+from model.dtos.pagination import PaginationDTO
 from model.entities.hospital import Hospital
 from model.entities.patient import Patient
+from service import occupancy_service
+from sqlalchemy import update
 from datetime import date
 
 @pytest.fixture
 def hospital_service(db_session):
-    service = HospitalService()
-    service.session = db_session
-    return service
+    return HospitalService(db_session)
 
-def test_create_hospital_success(hospital_service):
+@pytest.mark.asyncio
+async def test_create_hospital_success(hospital_service):
     # Arrange
     hospital_data = HospitalCreateDTO(
         name="Test Hospital",
@@ -21,53 +25,57 @@ def test_create_hospital_success(hospital_service):
     )
 
     # Act
-    result = hospital_service.create_hospital(hospital_data)
+    result = await hospital_service.create_hospital(hospital_data)
 
     # Assert
     assert result.name == hospital_data.name
     assert result.address == hospital_data.address
     assert result.capacity == hospital_data.capacity
 
-def test_get_all_hospitals(hospital_service):
+@pytest.mark.asyncio
+async def test_get_all_hospitals(hospital_service):
     # Arrange
     hospital1 = Hospital(name="Hospital 1", address="Address 1", capacity=50)
     hospital2 = Hospital(name="Hospital 2", address="Address 2", capacity=75)
     hospital_service.session.add_all([hospital1, hospital2])
-    hospital_service.session.commit()
+    await hospital_service.session.commit()
 
     # Act
-    result = hospital_service.get_all_hospitals()
+    result = await hospital_service.get_all_hospitals()
 
     # Assert
     assert len(result) == 2
     assert result[0].name == "Hospital 1"
     assert result[1].name == "Hospital 2"
 
-def test_get_hospital_by_id_success(hospital_service):
+@pytest.mark.asyncio
+async def test_get_hospital_by_id_success(hospital_service):
     # Arrange
     hospital = Hospital(name="Test Hospital", address="Test Address", capacity=100)
     hospital_service.session.add(hospital)
-    hospital_service.session.commit()
+    await hospital_service.session.commit()
 
     # Act
-    result = hospital_service.get_hospital_by_id(hospital.id)
+    result = await hospital_service.get_hospital_by_id(hospital.id)
 
     # Assert
     assert result.name == "Test Hospital"
     assert result.capacity == 100
 
-def test_get_hospital_by_id_not_found(hospital_service):
+@pytest.mark.asyncio
+async def test_get_hospital_by_id_not_found(hospital_service):
     # Act & Assert
     with pytest.raises(HTTPException) as exc_info:
-        hospital_service.get_hospital_by_id(999)
+        await hospital_service.get_hospital_by_id(999)
     assert exc_info.value.status_code == 404
     assert exc_info.value.detail == "Hospital not found"
 
-def test_update_hospital_success(hospital_service):
+@pytest.mark.asyncio
+async def test_update_hospital_success(hospital_service):
     # Arrange
     hospital = Hospital(name="Original Name", address="Original Address", capacity=50)
     hospital_service.session.add(hospital)
-    hospital_service.session.commit()
+    await hospital_service.session.commit()
 
     update_data = HospitalUpdateDTO(
         name="Updated Name",
@@ -75,29 +83,31 @@ def test_update_hospital_success(hospital_service):
     )
 
     # Act
-    result = hospital_service.update_hospital(hospital.id, update_data)
+    result = await hospital_service.update_hospital(hospital.id, update_data)
 
     # Assert
     assert result.name == "Updated Name"
     assert result.capacity == 75
     assert result.address == "Original Address"  # Unchanged field
 
-def test_delete_hospital_success(hospital_service):
+@pytest.mark.asyncio
+async def test_delete_hospital_success(hospital_service):
     # Arrange
     hospital = Hospital(name="Test Hospital", address="Test Address", capacity=100)
     hospital_service.session.add(hospital)
-    hospital_service.session.commit()
+    await hospital_service.session.commit()
 
     # Act
-    result = hospital_service.delete_hospital(hospital.id)
+    result = await hospital_service.delete_hospital(hospital.id)
 
     # Assert
     assert result is True
     with pytest.raises(HTTPException) as exc_info:
-        hospital_service.get_hospital_by_id(hospital.id)
+        await hospital_service.get_hospital_by_id(hospital.id)
     assert exc_info.value.status_code == 404
 
-def test_add_patient_to_hospital_success(hospital_service):
+@pytest.mark.asyncio
+async def test_add_patient_to_hospital_success(hospital_service):
     # Arrange
     hospital = Hospital(name="Test Hospital", address="Test Address", capacity=100)
     patient = Patient(
@@ -107,16 +117,19 @@ def test_add_patient_to_hospital_success(hospital_service):
         birth_date=date(1993, 5, 20)
     )
     hospital_service.session.add_all([hospital, patient])
-    hospital_service.session.commit()
+    await hospital_service.session.commit()
 
     # Act
-    result = hospital_service.add_patient_to_hospital(hospital.id, patient.id)
+    result = await hospital_service.add_patient_to_hospital(hospital.id, patient.id)
 
     # Assert
     assert result.hospital_id == hospital.id
+    await hospital_service.session.refresh(hospital, ["patients", "current_patients"])
     assert len(hospital.patients) == 1
+    assert hospital.current_patients == 1
 
-def test_add_patient_to_hospital_capacity_reached(hospital_service):
+@pytest.mark.asyncio
+async def test_add_patient_to_hospital_capacity_reached(hospital_service):
     # Arrange
     hospital = Hospital(name="Test Hospital", address="Test Address", capacity=1)
     patient1 = Patient(
@@ -132,18 +145,67 @@ def test_add_patient_to_hospital_capacity_reached(hospital_service):
         birth_date=date(1998, 5, 20)
     )
     hospital_service.session.add_all([hospital, patient1, patient2])
-    hospital_service.session.commit()
+    await hospital_service.session.commit()
     
     # Add first patient
-    hospital_service.add_patient_to_hospital(hospital.id, patient1.id)
+    await hospital_service.add_patient_to_hospital(hospital.id, patient1.id)
 
     # Act & Assert
     with pytest.raises(HTTPException) as exc_info:
-        hospital_service.add_patient_to_hospital(hospital.id, patient2.id)
+        await hospital_service.add_patient_to_hospital(hospital.id, patient2.id)
     assert exc_info.value.status_code == 400
     assert exc_info.value.detail == "The hospital reached its maximum capacity"
 
-def test_get_hospital_patients(hospital_service):
+@pytest.mark.asyncio
+async def test_add_patient_to_hospital_moves_occupancy(hospital_service):
+    # Arrange
+    first = Hospital(name="First", address="Address", capacity=10)
+    second = Hospital(name="Second", address="Address", capacity=10)
+    patient = Patient(name="John Doe", age=30, oncological=False, birth_date=date(1993, 5, 20))
+    hospital_service.session.add_all([first, second, patient])
+    await hospital_service.session.commit()
+    await hospital_service.add_patient_to_hospital(first.id, patient.id)
+
+    # Act
+    result = await hospital_service.add_patient_to_hospital(second.id, patient.id)
+
+    # Assert
+    assert result.hospital_id == second.id
+    await hospital_service.session.refresh(first)
+    await hospital_service.session.refresh(second)
+    assert first.current_patients == 0
+    assert second.current_patients == 1
+
+@pytest.mark.asyncio
+async def test_add_patient_to_hospital_uses_maintained_occupancy(hospital_service):
+    # Arrange
+    hospital = Hospital(name="Full Hospital", address="Address", capacity=2, current_patients=2)
+    patient = Patient(name="John Doe", age=30, oncological=False, birth_date=date(1993, 5, 20))
+    hospital_service.session.add_all([hospital, patient])
+    await hospital_service.session.commit()
+
+    # Act & Assert
+    with pytest.raises(HTTPException) as exc_info:
+        await hospital_service.add_patient_to_hospital(hospital.id, patient.id)
+    assert exc_info.value.status_code == 400
+    await hospital_service.session.refresh(patient)
+    assert patient.hospital_id is None
+
+@pytest.mark.asyncio
+async def test_add_patient_to_missing_hospital(hospital_service):
+    # Arrange
+    patient = Patient(name="John Doe", age=30, oncological=False, birth_date=date(1993, 5, 20))
+    hospital_service.session.add(patient)
+    await hospital_service.session.commit()
+
+    # Act & Assert
+    with pytest.raises(HTTPException) as exc_info:
+        await hospital_service.add_patient_to_hospital(999, patient.id)
+    assert exc_info.value.status_code == 404
+    assert exc_info.value.detail == "Hospital not found"
+
+@pytest.mark.asyncio
+async def test_get_hospital_patients(hospital_service):
     # Arrange
     hospital = Hospital(name="Test Hospital", address="Test Address", capacity=100)
     patient1 = Patient(
@@ -159,16 +221,123 @@ def test_get_hospital_patients(hospital_service):
         birth_date=date(1998, 5, 20)
     )
     hospital_service.session.add_all([hospital, patient1, patient2])
-    hospital_service.session.commit()
+    await hospital_service.session.commit()
 
     # Add patients to hospital
-    hospital_service.add_patient_to_hospital(hospital.id, patient1.id)
-    hospital_service.add_patient_to_hospital(hospital.id, patient2.id)
+    await hospital_service.add_patient_to_hospital(hospital.id, patient1.id)
+    await hospital_service.add_patient_to_hospital(hospital.id, patient2.id)
 
     # Act
-    result = hospital_service.get_hospital_patients(hospital.id)
+    result = await hospital_service.get_hospital_patients(hospital.id)
 
     # Assert
     assert len(result) == 2
     assert result[0].name == "John Doe"
-    assert result[1].name == "Jane Doe" 
\ No newline at end of file
+    assert result[1].name == "Jane Doe"
+
+@pytest.mark.asyncio
+async def test_get_all_hospitals_keyset_pagination(hospital_service):
+    # Arrange
+    hospital_service.session.add_all([
+        Hospital(name=f"Hospital {i}", address="Address", capacity=10) for i in range(3)
+    ])
+    await hospital_service.session.commit()
+
+    # Act
+    first_page = await hospital_service.get_all_hospitals(PaginationDTO(limit=2))
+    second_page = await hospital_service.get_all_hospitals(PaginationDTO(limit=2, cursor=first_page[-1].id))
+
+    # Assert
+    assert [h.name for h in first_page] == ["Hospital 0", "Hospital 1"]
+    assert [h.name for h in second_page] == ["Hospital 2"]
+
+@pytest.mark.asyncio
+async def test_add_patients_to_hospital_batch(hospital_service):
+    # Arrange
+    hospital = Hospital(name="Target", address="Address", capacity=3)
+    other = Hospital(name="Other", address="Address", capacity=10)
+    hospital_service.session.add_all([hospital, other])
+    await hospital_service.session.commit()
+    patients = [
+        Patient(name=f"Patient {i}", age=30, oncological=False, birth_date=date(1993, 5, 20))
+        for i in range(4)
+    ]
+    hospital_service.session.add_all(patients)
+    await hospital_service.session.commit()
+    await hospital_service.add_patient_to_hospital(hospital.id, patients[0].id)
+    await hospital_service.add_patient_to_hospital(other.id, patients[1].id)
+
+    # Act
+    result = await hospital_service.add_patients_to_hospital(
+        hospital.id, [patients[0].id, patients[1].id, 999, patients[2].id, patients[3].id]
+    )
+
+    # Assert
+    assert result.assigned == 2
+    assert [r.status for r in result.results] == [
+        "already_assigned", "assigned", "not_found", "assigned", "over_capacity"
+    ]
+    await hospital_service.session.refresh(hospital)
+    await hospital_service.session.refresh(other)
+    assert hospital.current_patients == 3
+    assert other.current_patients == 0
+    assert [p.id for p in await hospital_service.get_hospital_patients(hospital.id)] == [
+        patients[0].id, patients[1].id, patients[2].id
+    ]
+
+@pytest.mark.asyncio
+async def test_add_patients_to_missing_hospital(hospital_service):
+    # Act & Assert
+    with pytest.raises(HTTPException) as exc_info:
+        await hospital_service.add_patients_to_hospital(999, [1])
+    assert exc_info.value.status_code == 404
+
+@pytest.mark.asyncio
+async def test_add_patients_to_hospital_retries_when_a_patient_moves_before_locking(hospital_service):
+    # Arrange
+    target = Hospital(name="Target", address="Address", capacity=10)
+    other = Hospital(name="Other", address="Address", capacity=10)
+    patient = Patient(name="John Doe", age=30, oncological=False, birth_date=date(1993, 5, 20))
+    hospital_service.session.add_all([target, other, patient])
+    await hospital_service.session.commit()
+    target_id, other_id, patient_id = target.id, other.id, patient.id
+    locked = []
+
+    async def move_then_lock(session, *hospital_ids):
+        if not locked:
+            # A concurrent move lands between the unlocked read and the locks
+            await session.execute(update(Patient).where(Patient.id == patient_id).values(hospital_id=other_id))
+        locked.append(hospital_ids)
+        return await occupancy_service.lock_hospitals(session, *hospital_ids)
+
+    # Act
+    with patch('service.hospital_service.lock_hospitals', side_effect=move_then_lock):
+        result = await hospital_service.add_patients_to_hospital(target_id, [patient_id])
+
+    # Assert
+    assert result.assigned == 1
+    assert locked == [(target_id, None), (target_id, None)]
+
+@pytest.mark.asyncio
+async def test_reads_do_not_populate_identity_map(hospital_service):
+    # Arrange
+    hospital = Hospital(name="Test Hospital", address="Test Address", capacity=100)
+    patient = Patient(name="John Doe", age=30, oncological=False, birth_date=date(1993, 5, 20))
+    hospital_service.session.add_all([hospital, patient])
+    await hospital_service.session.commit()
+    hospital_id, patient_id = hospital.id, patient.id
+    hospital_service.session.expunge_all()
+    patient_service = PatientService(hospital_service.session)
+
+    # Act
+    assigned = await hospital_service.add_patient_to_hospital(hospital_id, patient_id)
+    await hospital_service.get_all_hospitals()
+    await hospital_service.get_hospital_by_id(hospital_id)
+    await hospital_service.get_hospital_patients(hospital_id)
+    await patient_service.get_all_patients()
+    fetched = await patient_service.get_patient_by_id(patient_id)
+
+    # Assert
+    assert assigned.hospital_id == hospital_id
+    assert fetched.hospital_id == hospital_id
+    assert len(hospital_service.session.identity_map) == 0
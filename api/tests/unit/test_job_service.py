@@ -0,0 +1,286 @@
+import asyncio
+import json
+import os
+import pytest
+import pytest_asyncio
+from alembic import command
+from datetime import date, datetime, timedelta, timezone
+from unittest.mock import patch
+from fastapi import HTTPException
+from sqlalchemy import update
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from model.dtos.hospital import HospitalCreateDTO
+from model.dtos.patient import PatientCreateDTO
+from model.entities.job import Job, JobKind, JobStatus
+from service import job_service
+from service.hospital_service import HospitalService
+from service.job_service import JobLeaseLost, JobRunner, JobService, claim_job, execute_job, input_path
+from service.patient_service import PatientService
+
+@pytest.fixture
+def session_factory(db_session):
+    return async_sessionmaker(bind=db_session.bind, class_=AsyncSession, autoflush=False, expire_on_commit=False)
+
+@pytest_asyncio.fixture
+async def patients(db_session):
+    service = PatientService(db_session)
+    return [
+        await service.create_patient(PatientCreateDTO(name=f"Patient {i}", age=30 + i, oncological=False, birth_date=date(1990, 1, 1)))
+        for i in range(5)
+    ]
+
+async def body(content: bytes):
+    yield content
+
+async def body_records(records):
+    for record in records:
+        yield record
+
+async def get_job(session_factory, job_id):
+    async with session_factory() as session:
+        return await JobService(session).get_job(job_id)
+
+async def set_job(session_factory, job_id, **values):
+    async with session_factory() as session:
+        await session.execute(update(Job).where(Job.id == job_id).values(**values))
+        await session.commit()
+
+def ago(seconds):
+    return datetime.now(timezone.utc) - timedelta(seconds=seconds)
+
+@pytest.mark.asyncio
+async def test_export_job_writes_result_in_batches(db_session, session_factory, patients, tmp_path):
+    # Arrange
+    service = JobService(db_session, str(tmp_path))
+    job = await service.create_job(JobKind.export, {"format": "csv", "filters": {}})
+
+    # Act
+    with patch.object(job_service, "JOB_BATCH_SIZE", 2):
+        await execute_job(session_factory, job.id, str(tmp_path))
+    finished = await get_job(session_factory, job.id)
+
+    # Assert
+    assert (finished.status, finished.progress, finished.total) == (JobStatus.succeeded, 5, 5)
+    assert finished.result == {"rows": 5}
+    lines = (tmp_path / f"{job.id}.csv").read_text().splitlines()
+    assert lines[0].startswith("id,")
+    assert [line.split(",")[1] for line in lines[1:]] == [f"Patient {i}" for i in range(5)]
+
+@pytest.mark.asyncio
+async def test_import_job_resumes_after_committed_records(db_session, session_factory, tmp_path):
+    # Arrange
+    records = [{"name": f"New {i}", "age": 40, "oncological": False, "birth_date": "1984-01-01"} for i in range(4)]
+    service = JobService(db_session, str(tmp_path))
+    job = await service.create_import_job(body("\n".join(json.dumps(record) for record in records).encode()), ndjson=True)
+    async with session_factory() as session:
+        # As if a previous run committed the first two records, then stopped
+        await PatientService(session).bulk_create_patients(body_records(records[:2]))
+    (tmp_path / f"{job.id}.ndjson").write_bytes(b'{"index":0}\n{"index":1}\npartial')
+    await set_job(
+        session_factory, job.id, status=JobStatus.running, claimed_by="crashed", lease_expires_at=ago(1),
+        progress=2, total=4, result={"created": 2, "failed": 0, "size": 24},
+    )
+
+    # Act
+    await execute_job(session_factory, job.id, str(tmp_path))
+    finished = await get_job(session_factory, job.id)
+
+    # Assert
+    assert (finished.status, finished.progress, finished.result) == (JobStatus.succeeded, 4, {"created": 4, "failed": 0})
+    names = [patient.name for patient in await PatientService(db_session).get_all_patients()]
+    assert sorted(names) == [f"New {i}" for i in range(4)]
+    outcomes = [json.loads(line) for line in (tmp_path / f"{job.id}.ndjson").read_text().splitlines()]
+    assert [outcome["index"] for outcome in outcomes] == [0, 1, 2, 3]
+    assert not os.path.exists(input_path(job.id, str(tmp_path)))
+
+@pytest.mark.asyncio
+async def test_import_job_streams_json_arrays(db_session, session_factory, tmp_path):
+    # Arrange
+    records = [{"name": f"New {i}", "age": 40, "oncological": False, "birth_date": "1984-01-01"} for i in range(3)]
+    job = await JobService(db_session, str(tmp_path)).create_import_job(body(json.dumps(records).encode()), ndjson=False)
+    read_file = job_service._read_file
+
+    # Act
+    with patch.object(job_service, "JOB_BATCH_SIZE", 2), patch.object(job_service, "_read_file", lambda path: read_file(path, 7)):
+        await execute_job(session_factory, job.id, str(tmp_path))
+    finished = await get_job(session_factory, job.id)
+
+    # Assert
+    assert (finished.status, finished.progress, finished.total) == (JobStatus.succeeded, 3, 3)
+    assert sorted(patient.name for patient in await PatientService(db_session).get_all_patients()) == ["New 0", "New 1", "New 2"]
+
+@pytest.mark.asyncio
+async def test_import_batch_is_rolled_back_with_its_progress(db_session, session_factory, tmp_path):
+    # Arrange
+    records = [{"name": f"New {i}", "age": 40, "oncological": False, "birth_date": "1984-01-01"} for i in range(2)]
+    job = await JobService(db_session, str(tmp_path)).create_import_job(body(json.dumps(records).encode()), ndjson=False)
+    save_in = job_service._save_in
+
+    async def lose_lease_on_progress(session, job, **values):
+        if "progress" in values:
+            raise JobLeaseLost(job.id)
+        await save_in(session, job, **values)
+
+    # Act
+    with patch.object(job_service, "_save_in", side_effect=lose_lease_on_progress):
+        await execute_job(session_factory, job.id, str(tmp_path))
+
+    # Assert
+    assert await PatientService(db_session).get_all_patients() == []
+    assert (await get_job(session_factory, job.id)).progress == 0
+
+@pytest.mark.asyncio
+async def test_reassign_job_counts_outcomes(db_session, session_factory, patients, tmp_path):
+    # Arrange
+    hospital = await HospitalService(db_session).create_hospital(HospitalCreateDTO(name="H", address="A", capacity=3))
+    service = JobService(db_session, str(tmp_path))
+    job = await service.create_job(JobKind.reassign, {"hospital_id": hospital.id, "patient_ids": [patient.id for patient in patients] + [999]})
+
+    # Act
+    with patch.object(job_service, "JOB_BATCH_SIZE", 2):
+        await execute_job(session_factory, job.id, str(tmp_path))
+    finished = await get_job(session_factory, job.id)
+
+    # Assert
+    assert (finished.status, finished.progress, finished.total) == (JobStatus.succeeded, 6, 6)
+    assert finished.result == {"assigned": 3, "over_capacity": 2, "not_found": 1}
+    with pytest.raises(HTTPException) as missing:
+        await service.get_result_file(job.id)
+    assert missing.value.status_code == 404
+
+@pytest.mark.asyncio
+async def test_reassign_batch_is_rolled_back_with_its_progress(db_session, session_factory, patients, tmp_path):
+    # Arrange
+    hospital = await HospitalService(db_session).create_hospital(HospitalCreateDTO(name="H", address="A", capacity=3))
+    job = await JobService(db_session, str(tmp_path)).create_job(JobKind.reassign, {"hospital_id": hospital.id, "patient_ids": [patients[0].id]})
+    save_in = job_service._save_in
+
+    async def lose_lease_on_progress(session, job, **values):
+        if "progress" in values:
+            raise JobLeaseLost(job.id)
+        await save_in(session, job, **values)
+
+    # Act
+    with patch.object(job_service, "_save_in", side_effect=lose_lease_on_progress):
+        await execute_job(session_factory, job.id, str(tmp_path))
+
+    # Assert
+    assert (await HospitalService(db_session).get_hospital_by_id(hospital.id)).current_patients == 0
+    assert (await get_job(session_factory, job.id)).progress == 0
+
+@pytest.mark.asyncio
+async def test_failed_job_records_error(db_session, session_factory, patients, tmp_path):
+    # Arrange
+    service = JobService(db_session, str(tmp_path))
+    job = await service.create_job(JobKind.reassign, {"hospital_id": 999, "patient_ids": [patients[0].id]})
+
+    # Act
+    await execute_job(session_factory, job.id, str(tmp_path))
+    finished = await get_job(session_factory, job.id)
+
+    # Assert
+    assert (finished.status, finished.error) == (JobStatus.failed, "Hospital not found")
+    assert finished.finished_at is not None
+
+@pytest.mark.asyncio
+async def test_jobs_are_claimed_by_one_runner_until_the_lease_expires(db_session, session_factory, tmp_path):
+    # Arrange
+    job = await JobService(db_session, str(tmp_path)).create_job(JobKind.export, {"format": "ndjson", "filters": {}})
+
+    # Act
+    first = await claim_job(session_factory, job.id, "first", str(tmp_path))
+    second = await claim_job(session_factory, job.id, "second", str(tmp_path))
+    await execute_job(session_factory, job.id, str(tmp_path), worker_id="second")
+
+    # Assert
+    assert (first.claimed_by, first.status) == ("first", JobStatus.running)
+    assert second is None
+    assert (await get_job(session_factory, job.id)).status == JobStatus.running  # still the first runner's
+
+    # Act
+    await set_job(session_factory, job.id, lease_expires_at=ago(1))
+    taken_over = await claim_job(session_factory, job.id, "second", str(tmp_path))
+
+    # Assert
+    assert taken_over.claimed_by == "second"
+    with pytest.raises(JobLeaseLost):
+        await job_service._save(session_factory, first, progress=1)
+
+@pytest.mark.asyncio
+async def test_cancelled_job_is_handed_back(db_session, session_factory, tmp_path):
+    # Arrange
+    job = await JobService(db_session, str(tmp_path)).create_job(JobKind.export, {"format": "ndjson", "filters": {}})
+    started = asyncio.Event()
+
+    async def blocking_export(*args):
+        started.set()
+        await asyncio.Event().wait()
+
+    with patch.dict(job_service.HANDLERS, {JobKind.export: blocking_export}):
+        running = asyncio.ensure_future(execute_job(session_factory, job.id, str(tmp_path), worker_id="first"))
+        await started.wait()
+
+        # Act
+        running.cancel()
+        await asyncio.gather(running, return_exceptions=True)
+
+    # Assert
+    assert (await get_job(session_factory, job.id)).status == JobStatus.running
+    assert (await claim_job(session_factory, job.id, "second", str(tmp_path))).claimed_by == "second"
+
+@pytest.mark.asyncio
+async def test_job_files_pin_jobs_to_their_storage(db_session, session_factory, tmp_path):
+    # Arrange
+    shared, other = tmp_path / "shared", tmp_path / "other"
+    job = await JobService(db_session, str(shared)).create_job(JobKind.export, {"format": "ndjson", "filters": {}})
+
+    # Act
+    elsewhere = await claim_job(session_factory, job.id, "other", str(other))
+    await execute_job(session_factory, job.id, str(shared))
+
+    # Assert
+    assert elsewhere is None
+    assert (await JobService(db_session, str(shared)).get_result_file(job.id)).startswith(str(shared))
+    with pytest.raises(HTTPException) as exc_info:
+        await JobService(db_session, str(other)).get_result_file(job.id)
+    assert exc_info.value.status_code == 409
+
+@pytest.mark.asyncio
+async def test_runner_resumes_queued_jobs_on_start(alembic_config, migration_database, tmp_path):
+    # Arrange
+    await asyncio.to_thread(command.upgrade, alembic_config, "head")
+    database_url = f"sqlite+aiosqlite:///{migration_database}"
+    runner = JobRunner(results_dir=str(tmp_path))
+    engine = create_async_engine(database_url)
+    session_factory = async_sessionmaker(bind=engine, class_=AsyncSession, expire_on_commit=False)
+    async with session_factory() as session:
+        queued = await JobService(session, str(tmp_path)).create_job(JobKind.export, {"format": "ndjson", "filters": {}})
+
+    # Act
+    await runner.start(database_url)
+    for _ in range(100):
+        job = await get_job(session_factory, queued.id)
+        if job.status == JobStatus.succeeded:
+            break
+        await asyncio.sleep(0.02)
+    await runner.stop()
+    await engine.dispose()
+
+    # Assert
+    assert job.status == JobStatus.succeeded
+    assert (tmp_path / f"{queued.id}.ndjson").read_text() == ""
+    assert not runner.running
+
+@pytest.mark.asyncio
+async def test_runner_start_raises_when_the_runner_cannot_start(tmp_path):
+    # Arrange
+    runner = JobRunner(results_dir=str(tmp_path))
+
+    # Act
+    with pytest.raises(Exception) as exc_info:
+        await asyncio.wait_for(runner.start("nosuchdialect://"), timeout=5)
+    await asyncio.to_thread(runner._thread.join, 5)
+
+    # Assert
+    assert not isinstance(exc_info.value, asyncio.TimeoutError)
+    assert not runner.running
@@ -0,0 +1,56 @@
+import asyncio
+import pytest
+from alembic import command
+from sqlalchemy.ext.asyncio import create_async_engine
+from model.entities.database import SchemaVersionError, verify_schema_version, warm_up_pool
+from service.lifecycle_service import Lifecycle
+
+@pytest.mark.asyncio
+async def test_verify_schema_version_rejects_unmigrated_database(tmp_path):
+    # Arrange
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'empty.db'}")
+
+    # Act & Assert
+    async with engine.connect() as conn:
+        with pytest.raises(SchemaVersionError):
+            await verify_schema_version(conn)
+    await engine.dispose()
+
+@pytest.mark.asyncio
+async def test_verify_schema_version_accepts_migrated_database(alembic_config, migration_database):
+    # Arrange
+    await asyncio.to_thread(command.upgrade, alembic_config, "head")
+    engine = create_async_engine(f"sqlite+aiosqlite:///{migration_database}")
+
+    # Act & Assert
+    async with engine.connect() as conn:
+        await verify_schema_version(conn)
+    await engine.dispose()
+
+@pytest.mark.asyncio
+async def test_warm_up_pool_opens_connections(tmp_path):
+    # Arrange
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'pool.db'}", pool_size=3)
+
+    # Act
+    await warm_up_pool(engine, 3)
+
+    # Assert
+    assert engine.pool.checkedin() == 3
+    await engine.dispose()
+
+@pytest.mark.asyncio
+async def test_lifecycle_ready_once_started_and_keys_cached(key_store):
+    # Arrange
+    lifecycle = Lifecycle(key_store)
+    assert not lifecycle.is_ready
+
+    async def startup():
+        pass
+
+    # Act
+    await lifecycle.start(startup)
+
+    # Assert
+    assert key_store.is_warm
+    assert lifecycle.is_ready
@@ -0,0 +1,89 @@
+import pytest
+import httpx
+from unittest.mock import MagicMock
+from fastapi import APIRouter, FastAPI
+from prometheus_client import REGISTRY, CollectorRegistry
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import create_async_engine
+from service.auth_service import verify_token
+from service.metrics_service import CacheStatsCollector, MetricsMiddleware, instrument_engine
+
+def sample(name, **labels):
+    return REGISTRY.get_sample_value(name, labels) or 0.0
+
+@pytest.mark.asyncio
+async def test_middleware_records_route_status_and_queries(tmp_path):
+    # Arrange
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'metrics.db'}")
+    instrument_engine(engine)
+    router = APIRouter()
+
+    @router.get("/{item_id}/queries")
+    async def run_queries(item_id: int):
+        async with engine.connect() as conn:
+            for _ in range(item_id):
+                await conn.execute(text("SELECT 1"))
+        return {"queries": item_id}
+
+    @router.get("/fail")
+    async def fail():
+        raise RuntimeError("boom")
+
+    @router.get("/files/{name:path}")
+    async def read_file(name: str):
+        return {"name": name}
+
+    app = FastAPI()
+    app.include_router(router, prefix="/items")
+    app.add_middleware(MetricsMiddleware)
+    route = "/items/{item_id}/queries"
+    requests_before = sample("http_requests_total", method="GET", route=route, status="200")
+    queries_before = sample("db_queries_per_request_sum", route=route)
+    errors_before = sample("http_request_errors_total", method="GET", route="/items/fail")
+    files_before = sample("http_requests_total", method="GET", route="/items/files/{name}", status="200")
+
+    # Act
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app, raise_app_exceptions=False), base_url="http://test") as client:
+        await client.get("/items/3/queries")
+        await client.get("/items/2/queries")
+        await client.get("/items/fail")
+        await client.get("/items/files/a/b/c")
+
+    # Assert
+    assert sample("http_requests_total", method="GET", route=route, status="200") - requests_before == 2
+    assert sample("db_queries_per_request_sum", route=route) - queries_before == 5
+    assert sample("http_request_duration_seconds_count", method="GET", route=route) >= 2
+    assert sample("http_request_errors_total", method="GET", route="/items/fail") - errors_before == 1
+    assert sample("http_requests_total", method="GET", route="/items/files/{name}", status="200") - files_before == 1
+    assert sample("db_pool_size") == engine.pool.size()
+    await engine.dispose()
+
+@pytest.mark.asyncio
+async def test_verify_token_is_timed_by_result(key_store, token_cache, make_token):
+    # Arrange
+    credentials = MagicMock()
+    credentials.credentials = make_token({"sub": "test-user"})
+    verified_before = sample("auth_verify_token_duration_seconds_count", result="verified")
+    cached_before = sample("auth_verify_token_duration_seconds_count", result="cached")
+
+    # Act
+    await verify_token(credentials)
+    await verify_token(credentials)
+
+    # Assert
+    assert sample("auth_verify_token_duration_seconds_count", result="verified") - verified_before == 1
+    assert sample("auth_verify_token_duration_seconds_count", result="cached") - cached_before == 1
+    assert sample("auth_jwks_fetch_duration_seconds_count", result="success") >= 1
+
+def test_cache_stats_collector():
+    # Arrange
+    registry = CollectorRegistry()
+    registry.register(CacheStatsCollector({
+        "responses": lambda: {"hits": 3, "misses": 1, "size": 4, "namespaces": {"hospital": {"hits": 3, "misses": 1}}},
+        "tokens": lambda: {"hits": 5, "misses": 2, "size": 2},
+    }))
+
+    # Act & Assert
+    assert registry.get_sample_value("cache_hits_total", {"cache": "responses", "namespace": "hospital"}) == 3
+    assert registry.get_sample_value("cache_misses_total", {"cache": "tokens", "namespace": "all"}) == 2
+    assert registry.get_sample_value("cache_entries", {"cache": "tokens"}) == 2
@@ -0,0 +1,73 @@
+import sqlite3
+from alembic import command
+
+def test_upgrade_creates_patient_indexes(alembic_config, migration_database):
+    # Act
+    command.upgrade(alembic_config, "head")
+
+    # Assert
+    with sqlite3.connect(migration_database) as connection:
+        indexes = {row[0] for row in connection.execute("SELECT name FROM sqlite_master WHERE type = 'index'")}
+    assert {"ix_patients_hospital_id", "ix_patients_oncological_cancer_type", "ix_patients_name"} <= indexes
+
+def test_upgrade_adopts_database_created_without_migrations(alembic_config, migration_database):
+    # Arrange
+    with sqlite3.connect(migration_database) as connection:
+        connection.executescript(
+            """
+            CREATE TABLE hospitals (id INTEGER PRIMARY KEY, name VARCHAR NOT NULL, address VARCHAR, capacity INTEGER);
+            CREATE TABLE patients (
+                id INTEGER PRIMARY KEY, name VARCHAR NOT NULL, age INTEGER, oncological BOOLEAN NOT NULL,
+                birth_date DATE, hospital_id INTEGER REFERENCES hospitals (id), cancer_type VARCHAR(8)
+            );
+            INSERT INTO hospitals (id, name, capacity) VALUES (1, 'Legacy Hospital', 10);
+            INSERT INTO patients (name, oncological, hospital_id) VALUES ('John Doe', 0, 1), ('Jane Doe', 0, 1);
+            """
+        )
+
+    # Act
+    command.upgrade(alembic_config, "head")
+
+    # Assert
+    with sqlite3.connect(migration_database) as connection:
+        assert connection.execute("SELECT current_patients FROM hospitals WHERE id = 1").fetchone() == (2,)
+
+def test_sharding_table_versions_keeps_the_counters(alembic_config, migration_database):
+    # Arrange
+    command.upgrade(alembic_config, "0008")
+    with sqlite3.connect(migration_database) as connection:
+        connection.execute("UPDATE table_versions SET version = 5 WHERE table_name = 'hospitals'")
+
+    # Act
+    command.upgrade(alembic_config, "0009")
+
+    # Assert
+    with sqlite3.connect(migration_database) as connection:
+        assert connection.execute(
+            "SELECT COUNT(*), SUM(version) FROM table_versions WHERE table_name = 'hospitals'"
+        ).fetchone() == (16, 5)
+        connection.execute("UPDATE table_versions SET version = version + 1 WHERE table_name = 'hospitals' AND shard = 3")
+
+    # Act
+    command.downgrade(alembic_config, "0008")
+
+    # Assert
+    with sqlite3.connect(migration_database) as connection:
+        assert connection.execute("SELECT version FROM table_versions WHERE table_name = 'hospitals'").fetchone() == (6,)
+
+def test_change_events_continue_after_the_counter(alembic_config, migration_database):
+    # Arrange
+    command.upgrade(alembic_config, "0011")
+    with sqlite3.connect(migration_database) as connection:
+        connection.execute("INSERT INTO change_events (id, table_name, operation, entity_id) VALUES (4, 'patients', 'created', 1)")
+        connection.execute("UPDATE table_versions SET version = 7 WHERE table_name = 'change_events'")
+
+    # Act
+    command.upgrade(alembic_config, "0012")
+
+    # Assert
+    with sqlite3.connect(migration_database) as connection:
+        connection.execute("DELETE FROM change_events")
+        connection.execute("INSERT INTO change_events (table_name, operation, entity_id) VALUES ('patients', 'updated', 1)")
+        assert connection.execute("SELECT id FROM change_events").fetchall() == [(8,)]
+        assert connection.execute("SELECT COUNT(*) FROM table_versions WHERE table_name = 'change_events'").fetchone() == (0,)
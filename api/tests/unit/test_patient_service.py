@@ -1,17 +1,24 @@
+import csv
+import io
+import json
 import pytest
+from unittest.mock import patch
 from fastapi import HTTPException
+from sqlalchemy import select, update
+from service import occupancy_service
 from service.patient_service import PatientService
-from model.dtos.patient import PatientCreateDTO, PatientUpdateDTO
+from model.dtos.patient import ExportFormat, PatientCreateDTO, PatientFilterDTO, PatientUpdateDTO
+from model.dtos.pagination import PaginationDTO
+from model.entities.hospital import Hospital
 from model.entities.patient import Patient, CancerType
 from datetime import date
 
 @pytest.fixture
 def patient_service(db_session):
-    service = PatientService()
-    service.session = db_session
-    return service
+    return PatientService(db_session)
 
-def test_create_patient_success(patient_service):
+@pytest.mark.asyncio
+async def test_create_patient_success(patient_service):
     # Arrange
     patient_data = PatientCreateDTO(
         name="John Doe",
@@ -22,7 +29,7 @@ def test_create_patient_success(patient_service):
     )
 
     # Act
-    result = patient_service.create_patient(patient_data)
+    result = await patient_service.create_patient(patient_data)
 
     # Assert
     assert result.name == patient_data.name
@@ -31,7 +38,8 @@ def test_create_patient_success(patient_service):
     assert result.cancer_type == patient_data.cancer_type
     assert result.birth_date == patient_data.birth_date
 
-def test_create_patient_invalid_oncological_data(patient_service):
+@pytest.mark.asyncio
+async def test_create_patient_invalid_oncological_data(patient_service):
     # Arrange
     patient_data = PatientCreateDTO(
         name="John Doe",
@@ -43,11 +51,12 @@ def test_create_patient_invalid_oncological_data(patient_service):
 
     # Act & Assert
     with pytest.raises(HTTPException) as exc_info:
-        patient_service.create_patient(patient_data)
+        await patient_service.create_patient(patient_data)
     assert exc_info.value.status_code == 400
     assert "cancer_type must be null when oncological is False" in str(exc_info.value.detail)
 
-def test_get_all_patients(patient_service):
+@pytest.mark.asyncio
+async def test_get_all_patients(patient_service):
     # Arrange
     patient1 = Patient(
         name="John Doe",
@@ -63,17 +72,18 @@ def test_get_all_patients(patient_service):
         cancer_type=CancerType.breast
     )
     patient_service.session.add_all([patient1, patient2])
-    patient_service.session.commit()
+    await patient_service.session.commit()
 
     # Act
-    result = patient_service.get_all_patients()
+    result = await patient_service.get_all_patients()
 
     # Assert
     assert len(result) == 2
     assert result[0].name == "John Doe"
     assert result[1].name == "Jane Doe"
 
-def test_get_patient_by_id_success(patient_service):
+@pytest.mark.asyncio
+async def test_get_patient_by_id_success(patient_service):
     # Arrange
     patient = Patient(
         name="John Doe",
@@ -82,23 +92,25 @@ def test_get_patient_by_id_success(patient_service):
         birth_date=date(1993, 5, 20)
     )
     patient_service.session.add(patient)
-    patient_service.session.commit()
+    await patient_service.session.commit()
 
     # Act
-    result = patient_service.get_patient_by_id(patient.id)
+    result = await patient_service.get_patient_by_id(patient.id)
 
     # Assert
     assert result.name == "John Doe"
     assert result.age == 30
 
-def test_get_patient_by_id_not_found(patient_service):
+@pytest.mark.asyncio
+async def test_get_patient_by_id_not_found(patient_service):
     # Act & Assert
     with pytest.raises(HTTPException) as exc_info:
-        patient_service.get_patient_by_id(999)
+        await patient_service.get_patient_by_id(999)
     assert exc_info.value.status_code == 404
     assert exc_info.value.detail == "Patient not found"
 
-def test_update_patient_success(patient_service):
+@pytest.mark.asyncio
+async def test_update_patient_success(patient_service):
     # Arrange
     patient = Patient(
         name="John Doe",
@@ -107,7 +119,7 @@ def test_update_patient_success(patient_service):
         birth_date=date(1993, 5, 20)
     )
     patient_service.session.add(patient)
-    patient_service.session.commit()
+    await patient_service.session.commit()
 
     update_data = PatientUpdateDTO(
         name="John Updated",
@@ -115,13 +127,68 @@ def test_update_patient_success(patient_service):
     )
 
     # Act
-    result = patient_service.update_patient(patient.id, update_data)
+    result = await patient_service.update_patient(patient.id, update_data)
 
     # Assert
     assert result.name == "John Updated"
     assert result.age == 31
+    assert result.birth_date == date(1993, 5, 20)  # Unchanged field
+    assert result.version == 2
 
-def test_delete_patient_success(patient_service):
+@pytest.mark.asyncio
+async def test_update_patient_with_stale_version_fails(patient_service):
+    # Arrange
+    patient = Patient(name="John Doe", age=30, oncological=False, birth_date=date(1993, 5, 20))
+    patient_service.session.add(patient)
+    await patient_service.session.commit()
+    await patient_service.update_patient(patient.id, PatientUpdateDTO(age=31), expected_versions=[1])
+
+    # Act
+    with pytest.raises(HTTPException) as exc_info:
+        await patient_service.update_patient(patient.id, PatientUpdateDTO(name="Lost Update"), expected_versions=[1])
+
+    # Assert
+    assert exc_info.value.status_code == 412
+    current = await patient_service.get_patient_by_id(patient.id)
+    assert (current.name, current.age, current.version) == ("John Doe", 31, 2)
+
+@pytest.mark.asyncio
+async def test_update_patient_reports_which_constraint_case_failed(patient_service):
+    # Arrange
+    patient = Patient(name="John Doe", age=30, oncological=False, birth_date=date(1993, 5, 20))
+    patient_service.session.add(patient)
+    await patient_service.session.commit()
+    patient_id = patient.id
+
+    # Act
+    with pytest.raises(HTTPException) as missing_type:
+        await patient_service.update_patient(patient_id, PatientUpdateDTO(oncological=True))
+    with pytest.raises(HTTPException) as unexpected_type:
+        await patient_service.update_patient(patient_id, PatientUpdateDTO(cancer_type=CancerType.breast))
+
+    # Assert
+    assert missing_type.value.detail == "Invalid data: cancer_type is required when oncological is True."
+    assert unexpected_type.value.detail == "Invalid data: cancer_type must be null when oncological is False."
+
+@pytest.mark.asyncio
+async def test_update_patient_not_found_with_version(patient_service):
+    # Act
+    with pytest.raises(HTTPException) as exc_info:
+        await patient_service.update_patient(999, PatientUpdateDTO(age=31), expected_versions=[1])
+
+    # Assert
+    assert exc_info.value.status_code == 404
+
+def test_update_patient_rejects_null_fields():
+    # Act
+    with pytest.raises(ValueError):
+        PatientUpdateDTO(name=None)
+
+    # Assert
+    assert PatientUpdateDTO(cancer_type=None).model_dump(exclude_unset=True) == {"cancer_type": None}
+
+@pytest.mark.asyncio
+async def test_delete_patient_success(patient_service):
     # Arrange
     patient = Patient(
         name="John Doe",
@@ -130,13 +197,178 @@ def test_delete_patient_success(patient_service):
         birth_date=date(1993, 5, 20)
     )
     patient_service.session.add(patient)
-    patient_service.session.commit()
+    await patient_service.session.commit()
 
     # Act
-    result = patient_service.delete_patient(patient.id)
+    result = await patient_service.delete_patient(patient.id)
 
     # Assert
     assert result is True
     with pytest.raises(HTTPException) as exc_info:
-        patient_service.get_patient_by_id(patient.id)
-    assert exc_info.value.status_code == 404 
\ No newline at end of file
+        await patient_service.get_patient_by_id(patient.id)
+    assert exc_info.value.status_code == 404 
+@pytest.mark.asyncio
+async def test_get_all_patients_keyset_pagination(patient_service):
+    # Arrange
+    patient_service.session.add_all([
+        Patient(name=f"Patient {i}", age=20 + i, oncological=False, birth_date=date(2000, 1, 1))
+        for i in range(5)
+    ])
+    await patient_service.session.commit()
+
+    # Act
+    first_page = await patient_service.get_all_patients(PaginationDTO(limit=2))
+    second_page = await patient_service.get_all_patients(PaginationDTO(limit=2, cursor=first_page[-1].id))
+
+    # Assert
+    assert [p.name for p in first_page] == ["Patient 0", "Patient 1"]
+    assert [p.name for p in second_page] == ["Patient 2", "Patient 3"]
+
+@pytest.mark.asyncio
+async def test_get_all_patients_filters(patient_service):
+    # Arrange
+    patient_service.session.add_all([
+        Patient(name="Young", age=20, oncological=True, birth_date=date(2005, 1, 1), cancer_type=CancerType.lung),
+        Patient(name="Old", age=70, oncological=True, birth_date=date(1955, 1, 1), cancer_type=CancerType.lung),
+        Patient(name="Other", age=40, oncological=True, birth_date=date(1985, 1, 1), cancer_type=CancerType.skin),
+        Patient(name="Healthy", age=40, oncological=False, birth_date=date(1985, 1, 1)),
+    ])
+    await patient_service.session.commit()
+
+    # Act
+    result = await patient_service.get_all_patients(
+        filters=PatientFilterDTO(oncological=True, cancer_type=CancerType.lung, min_age=30)
+    )
+
+    # Assert
+    assert [p.name for p in result] == ["Old"]
+
+@pytest.mark.asyncio
+async def test_export_patients_ndjson(patient_service):
+    # Arrange
+    patient_service.session.add_all([
+        Patient(name="John Doe", age=30, oncological=False, birth_date=date(1993, 5, 20)),
+        Patient(name="Jane Doe", age=25, oncological=True, birth_date=date(1998, 5, 20), cancer_type=CancerType.breast),
+    ])
+    await patient_service.session.commit()
+
+    # Act
+    chunks = [chunk async for chunk in patient_service.export_patients(ExportFormat.ndjson)]
+
+    # Assert
+    rows = [json.loads(line) for line in "".join(chunks).splitlines()]
+    assert [row["name"] for row in rows] == ["John Doe", "Jane Doe"]
+    assert rows[1]["cancer_type"] == "Breast"
+    assert rows[1]["birth_date"] == "1998-05-20"
+
+@pytest.mark.asyncio
+async def test_export_patients_csv_with_filters(patient_service):
+    # Arrange
+    patient_service.session.add_all([
+        Patient(name="John Doe", age=30, oncological=False, birth_date=date(1993, 5, 20)),
+        Patient(name="Jane Doe", age=25, oncological=True, birth_date=date(1998, 5, 20), cancer_type=CancerType.breast),
+    ])
+    await patient_service.session.commit()
+
+    # Act
+    chunks = [chunk async for chunk in patient_service.export_patients(ExportFormat.csv, PatientFilterDTO(oncological=True))]
+
+    # Assert
+    rows = list(csv.reader(io.StringIO("".join(chunks))))
+    assert rows[0] == ["id", "name", "age", "oncological", "birth_date", "cancer_type", "hospital_id"]
+    assert rows[1][1:] == ["Jane Doe", "25", "True", "1998-05-20", "Breast", ""]
+    assert len(rows) == 2
+
+@pytest.mark.asyncio
+async def test_delete_patient_releases_hospital_bed(patient_service):
+    # Arrange
+    hospital = Hospital(name="Test Hospital", address="Test Address", capacity=10, current_patients=1)
+    patient_service.session.add(hospital)
+    await patient_service.session.commit()
+    patient = Patient(name="John Doe", age=30, oncological=False, birth_date=date(1993, 5, 20), hospital_id=hospital.id)
+    patient_service.session.add(patient)
+    await patient_service.session.commit()
+
+    # Act
+    await patient_service.delete_patient(patient.id)
+
+    # Assert
+    await patient_service.session.refresh(hospital)
+    assert hospital.current_patients == 0
+
+@pytest.mark.asyncio
+async def test_delete_patient_frees_the_bed_of_a_concurrent_move(patient_service):
+    # Arrange
+    session = patient_service.session
+    old = Hospital(name="Old Hospital", address="Test Address", capacity=10, current_patients=1)
+    new = Hospital(name="New Hospital", address="Test Address", capacity=10)
+    session.add_all([old, new])
+    await session.commit()
+    patient = Patient(name="John Doe", age=30, oncological=False, birth_date=date(1993, 5, 20), hospital_id=old.id)
+    session.add(patient)
+    await session.commit()
+    old_id, new_id, patient_id = old.id, new.id, patient.id
+    locked = []
+
+    async def move_then_lock(session, *hospital_ids):
+        if not locked:
+            # A concurrent move commits between the unlocked read and the lock
+            await session.execute(update(Patient).where(Patient.id == patient_id).values(hospital_id=new_id))
+            await session.execute(update(Hospital).where(Hospital.id == old_id).values(current_patients=0))
+            await session.execute(update(Hospital).where(Hospital.id == new_id).values(current_patients=1))
+            await session.commit()
+        locked.append(hospital_ids)
+        return await occupancy_service.lock_hospitals(session, *hospital_ids)
+
+    # Act
+    with patch('service.patient_service.lock_hospitals', side_effect=move_then_lock):
+        await patient_service.delete_patient(patient_id)
+
+    # Assert
+    assert locked == [(old_id,), (new_id,)]
+    occupancy = (await session.execute(select(Hospital.id, Hospital.current_patients).order_by(Hospital.id))).all()
+    assert [tuple(row) for row in occupancy] == [(old_id, 0), (new_id, 0)]
+
+async def _records(*records):
+    for record in records:
+        yield record
+
+@pytest.mark.asyncio
+async def test_bulk_create_patients_reports_each_record(patient_service):
+    # Arrange
+    records = _records(
+        {"name": "John Doe", "age": 30, "oncological": False, "birth_date": "1993-05-20"},
+        {"name": "Jane Doe", "age": 25, "oncological": False, "birth_date": "1998-05-20", "cancer_type": "Breast"},
+        {"name": "No Age", "oncological": False, "birth_date": "1998-05-20"},
+        ValueError("Invalid JSON"),
+        {"name": "Ann Doe", "age": 40, "oncological": True, "birth_date": "1983-05-20", "cancer_type": "Lung"},
+    )
+
+    # Act
+    result = await patient_service.bulk_create_patients(records)
+
+    # Assert
+    assert result.created == 2
+    assert result.failed == 3
+    assert [r.status for r in result.results] == ["created", "error", "error", "error", "created"]
+    assert "cancer_type must be null" in result.results[1].error
+    assert result.results[2].error.startswith("age:")
+    assert [p.name for p in await patient_service.get_all_patients()] == ["John Doe", "Ann Doe"]
+
+@pytest.mark.asyncio
+async def test_bulk_create_patients_isolates_database_errors(patient_service):
+    # Arrange
+    records = _records(
+        {"name": "John Doe", "age": 30, "oncological": False, "birth_date": "1993-05-20"},
+        {"name": "Jane Doe", "age": 25, "oncological": False, "birth_date": "1998-05-20", "cancer_type": "Breast"},
+    )
+
+    # Act
+    with patch('service.patient_service._oncological_error', return_value=None):
+        result = await patient_service.bulk_create_patients(records)
+
+    # Assert
+    assert result.created == 1
+    assert result.results[1].status == "error"
+    assert result.results[1].error == "Invalid data: cancer_type must be null when oncological is False."
+    assert [p.name for p in await patient_service.get_all_patients()] == ["John Doe"]
@@ -0,0 +1,99 @@
+import logging
+import pytest
+import httpx
+from datetime import date
+from fastapi import FastAPI
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import create_async_engine
+from model.entities.hospital import Hospital
+from model.entities.patient import Patient
+from model.dtos.pagination import PaginationDTO
+from service.hospital_service import HospitalService
+from service.patient_service import PatientService
+from service.query_inspection_service import QueryInspectionMiddleware, instrument_engine, query_budget, statement_shape
+
+async def add_hospital_with_patients(session, patients=3):
+    hospital = Hospital(name="Test Hospital", address="Test Address", capacity=10)
+    session.add(hospital)
+    session.add_all(
+        Patient(name=f"Patient {i}", age=30, oncological=False, birth_date=date(1993, 5, 20)) for i in range(patients)
+    )
+    await session.commit()
+    return hospital
+
+def test_statement_shape_ignores_list_sizes():
+    # Act & Assert
+    assert statement_shape("SELECT * FROM t WHERE id IN (?, ?)") == statement_shape("SELECT *  FROM t\nWHERE id IN (?)")
+    assert statement_shape("INSERT INTO t (a) VALUES ($1), ($2)") == "INSERT INTO t (a) VALUES (...)"
+
+@pytest.mark.asyncio
+async def test_query_budget_flags_n_plus_one(db_session):
+    # Arrange
+    await add_hospital_with_patients(db_session)
+    service = PatientService(db_session)
+
+    # Act & Assert
+    with pytest.raises(AssertionError, match="ran 3 times"):
+        with query_budget(10, max_repeats=1):
+            for patient_id in (1, 2, 3):
+                await service.get_patient_by_id(patient_id)
+
+@pytest.mark.asyncio
+async def test_query_budget_flags_too_many_queries(db_session):
+    # Act & Assert
+    with pytest.raises(AssertionError, match="at most 1 queries, got 2"):
+        with query_budget(1):
+            await db_session.execute(text("SELECT 1"))
+            await db_session.execute(text("SELECT 2"))
+
+@pytest.mark.asyncio
+async def test_hospital_routes_stay_within_query_budget(db_session):
+    # Arrange
+    hospital = await add_hospital_with_patients(db_session)
+    service = HospitalService(db_session)
+
+    # Act & Assert
+    with query_budget(5):  # patient SELECT, bed UPDATE, patient UPDATE, version UPDATE, change INSERT
+        await service.add_patient_to_hospital(hospital.id, 1)
+    with query_budget(8, max_repeats=2):
+        await service.add_patients_to_hospital(hospital.id, [1, 2, 3])
+    with query_budget(2):
+        await service.get_hospital_patients(hospital.id, PaginationDTO(limit=10))
+
+@pytest.mark.asyncio
+async def test_slow_queries_are_logged_with_plan(tmp_path, caplog):
+    # Arrange
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'slow.db'}")
+    instrument_engine(engine, slow_query_ms=0)
+
+    # Act
+    with caplog.at_level(logging.WARNING, logger="service.query_inspection_service"):
+        async with engine.connect() as conn:
+            await conn.execute(text("CREATE TABLE t (id INTEGER PRIMARY KEY)"))
+            await conn.execute(text("SELECT * FROM t WHERE id = 1"))
+
+    # Assert
+    slow = [record.getMessage() for record in caplog.records if record.getMessage().startswith("Slow query")]
+    assert len(slow) == 1
+    assert "SEARCH t USING INTEGER PRIMARY KEY" in slow[0]
+    await engine.dispose()
+
+@pytest.mark.asyncio
+async def test_middleware_logs_repeated_statements(db_session, caplog):
+    # Arrange
+    await add_hospital_with_patients(db_session)
+    app = FastAPI()
+    app.add_middleware(QueryInspectionMiddleware, n_plus_one_threshold=3)
+
+    @app.get("/patients")
+    async def patients():
+        service = PatientService(db_session)
+        return [(await service.get_patient_by_id(patient_id)).name for patient_id in (1, 2, 3)]
+
+    # Act
+    with caplog.at_level(logging.WARNING, logger="service.query_inspection_service"):
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+            await client.get("/patients")
+
+    # Assert
+    assert any("Possible N+1 in GET /patients: statement ran 3 times" in record.getMessage() for record in caplog.records)
@@ -0,0 +1,140 @@
+import asyncio
+import httpx
+import pytest
+from fastapi import Depends, FastAPI
+from service.auth_service import verify_token
+from service.rate_limit_service import AdmissionController, Bucket, MemoryRateLimitBackend, RateLimitMiddleware, RedisRateLimitBackend
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+def client(app, ip="10.0.0.1"):
+    return httpx.AsyncClient(transport=httpx.ASGITransport(app=app, client=(ip, 1234)), base_url="http://test")
+
+@pytest.fixture
+def release():
+    return asyncio.Event()
+
+@pytest.fixture
+def limited_app(key_store, token_cache, release):
+    app = FastAPI()
+
+    @app.get("/items")
+    async def items(token: dict = Depends(verify_token)):
+        return {"sub": token["sub"]}
+
+    @app.post("/auth/token")
+    async def login():
+        return {"access_token": "token"}
+
+    @app.get("/slow")
+    async def slow():
+        await release.wait()
+        return {}
+
+    @app.get("/health")
+    async def health():
+        return {}
+
+    return RateLimitMiddleware(
+        app,
+        backend=MemoryRateLimitBackend(),
+        admission=AdmissionController(max_concurrent=1, queue_size=1, queue_timeout=0.05),
+        token_cache=token_cache,
+        key_store=key_store,
+        bucket=Bucket("default", rate=0.001, burst=2),
+        auth_bucket=Bucket("auth", rate=0.001, burst=1),
+    )
+
+@pytest.mark.asyncio
+async def test_memory_backend_refills_tokens():
+    # Arrange
+    clock = FakeClock()
+    backend = MemoryRateLimitBackend(clock=clock)
+    bucket = Bucket("test", rate=2, burst=2)
+
+    # Act
+    results = [await backend.take("client", bucket) for _ in range(3)]
+    clock.now = 0.5
+    refilled = await backend.take("client", bucket)
+
+    # Assert
+    assert [allowed for allowed, _ in results] == [True, True, False]
+    assert results[2][1] == pytest.approx(0.5)
+    assert refilled == (True, 0.0)
+    assert (await backend.take("other", bucket))[0]
+
+@pytest.mark.asyncio
+async def test_verified_clients_are_limited_by_subject(limited_app, make_token):
+    # Arrange
+    alice, bob = make_token({"sub": "alice"}), make_token({"sub": "bob"})
+
+    async with client(limited_app) as http:
+        # Act
+        first = await http.get("/items", headers={"Authorization": f"Bearer {alice}"})  # not verified yet: limited by IP
+        alice_codes = [(await http.get("/items", headers={"Authorization": f"Bearer {alice}"})).status_code for _ in range(3)]
+        bob_code = (await http.get("/items", headers={"Authorization": f"Bearer {bob}"})).status_code
+        anonymous = await http.get("/items", headers={"Authorization": "Bearer forged"})
+
+    # Assert
+    assert first.status_code == 200
+    assert alice_codes == [200, 200, 429]
+    assert bob_code == 200
+    assert anonymous.status_code == 429  # shares the IP bucket with the unverified requests
+    assert int(anonymous.headers["Retry-After"]) >= 1
+
+@pytest.mark.asyncio
+async def test_logins_are_limited_per_ip(limited_app):
+    # Act
+    async with client(limited_app) as http:
+        codes = [(await http.post("/auth/token")).status_code for _ in range(2)]
+        health = await http.get("/health")
+    async with client(limited_app, ip="10.0.0.2") as http:
+        other_ip = await http.post("/auth/token")
+
+    # Assert
+    assert codes == [200, 429]
+    assert health.status_code == 200
+    assert other_ip.status_code == 200
+
+@pytest.mark.asyncio
+async def test_admission_sheds_requests_beyond_the_queue(limited_app, release):
+    async with client(limited_app) as http, client(limited_app, ip="10.0.0.2") as other, client(limited_app, ip="10.0.0.3") as third:
+        # Arrange
+        running = asyncio.ensure_future(http.get("/slow"))
+        await asyncio.sleep(0.01)
+        queued = asyncio.ensure_future(other.get("/slow"))
+        await asyncio.sleep(0.01)
+
+        # Act
+        shed = await third.get("/slow")
+        timed_out = await queued
+        release.set()
+        completed = await running
+
+    # Assert
+    assert shed.status_code == 503
+    assert shed.json() == {"detail": "The service is overloaded, please retry later."}
+    assert timed_out.status_code == 503
+    assert completed.status_code == 200
+
+@pytest.mark.asyncio
+async def test_redis_backend_lets_requests_through_when_redis_fails():
+    # Arrange
+    class FailingRedis:
+        def register_script(self, script):
+            async def run(keys, args):
+                raise ConnectionError("redis is down")
+            return run
+
+    backend = RedisRateLimitBackend(FailingRedis())
+
+    # Act
+    result = await backend.take("client", Bucket("test", rate=1, burst=1))
+
+    # Assert
+    assert result == (True, 0.0)
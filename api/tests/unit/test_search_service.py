@@ -0,0 +1,71 @@
+import pytest
+import pytest_asyncio
+from datetime import date
+from model.dtos.patient import PatientCreateDTO, PatientUpdateDTO
+from service.patient_service import PatientService
+from service.search_service import NameSearchIndex, trigrams, word_similarity
+
+NAMES = ["Alexander Hamilton", "Alexandra Smith", "John Alexander", "Jonathan Doe", "Maria Garcia", "100%_done"]
+
+@pytest_asyncio.fixture
+async def patient_service(db_session):
+    service = PatientService(db_session)
+    for name in NAMES:
+        await service.create_patient(PatientCreateDTO(name=name, age=40, oncological=False, birth_date=date(1984, 1, 1)))
+    return service
+
+def test_trigrams_match_pg_trgm():
+    # Act & Assert
+    assert trigrams("Cat") == {"  c", " ca", "cat", "at "}
+    assert trigrams("a-b") == {"  a", " a ", "  b", " b "}
+    assert word_similarity("Alexnder", "John Alexander") > 0.5
+    assert word_similarity("zzz", "John Alexander") == 0.0
+
+def test_index_ranks_prefix_then_substring_then_similarity():
+    # Arrange
+    index = NameSearchIndex()
+    index.build([(1, "John Alexander"), (2, "Alexander Hamilton"), (3, "Alexandria"), (4, "Bob")], version=1)
+
+    # Act
+    matches = [patient_id for patient_id, _ in index.search("alexander", limit=10)]
+
+    # Assert
+    assert matches == [2, 1, 3]
+
+@pytest.mark.asyncio
+async def test_search_tolerates_typos(patient_service):
+    # Act
+    results = await patient_service.search_patients("Hamiltn")
+
+    # Assert
+    assert [result.name for result in results] == ["Alexander Hamilton"]
+    assert 0 < results[0].score <= 1
+
+@pytest.mark.asyncio
+async def test_search_substring_and_limit(patient_service):
+    # Act
+    results = await patient_service.search_patients("ander", limit=1)
+
+    # Assert
+    assert [result.name for result in results] == ["Alexander Hamilton"]
+
+@pytest.mark.asyncio
+async def test_search_treats_like_wildcards_literally(patient_service):
+    # Act
+    results = await patient_service.search_patients("%_")
+
+    # Assert
+    assert [result.name for result in results] == ["100%_done"]
+
+@pytest.mark.asyncio
+async def test_search_sees_committed_writes(patient_service):
+    # Arrange
+    before = await patient_service.search_patients("Garcia")
+
+    # Act
+    await patient_service.update_patient(before[0].id, PatientUpdateDTO(name="Maria Lopez", age=40, oncological=False, birth_date=date(1984, 1, 1)))
+    after = await patient_service.search_patients("Garcia")
+
+    # Assert
+    assert [result.name for result in before] == ["Maria Garcia"]
+    assert after == []
@@ -0,0 +1,52 @@
+import pytest
+from datetime import date
+from fastapi import Response
+from sqlalchemy import select
+from model.dtos.hospital import HospitalCreateDTO
+from model.dtos.patient import PatientCreateDTO
+from model.entities.patient import CancerType, Patient
+from service.hospital_service import HOSPITAL_COLUMNS, HOSPITAL_PAGE_ADAPTER, HospitalService
+from service.patient_service import PATIENT_COLUMNS, PATIENT_PAGE_ADAPTER, PatientService
+from service.serialization_utils import encode_rows, json_response
+
+@pytest.mark.asyncio
+async def test_encode_rows_matches_dto_serialization(db_session):
+    # Arrange
+    service = PatientService(db_session)
+    await service.create_patient(PatientCreateDTO(name="A", age=40, oncological=True, birth_date=date(1984, 1, 2), cancer_type=CancerType.lung))
+    await service.create_patient(PatientCreateDTO(name="B", age=30, oncological=False, birth_date=date(1994, 3, 4)))
+    rows = (await db_session.execute(select(*PATIENT_COLUMNS).order_by(Patient.id))).all()
+
+    # Act
+    encoded = encode_rows(rows)
+
+    # Assert
+    assert encoded == PATIENT_PAGE_ADAPTER.dump_json(await service.get_all_patients())
+    assert encode_rows([]) == b"[]"
+
+@pytest.mark.asyncio
+async def test_hospital_columns_match_dto_serialization(db_session):
+    # Arrange
+    service = HospitalService(db_session)
+    await service.create_hospital(HospitalCreateDTO(name="H", address="A", capacity=5))
+    rows = (await db_session.execute(select(*HOSPITAL_COLUMNS))).all()
+
+    # Act & Assert
+    assert encode_rows(rows) == HOSPITAL_PAGE_ADAPTER.dump_json(await service.get_all_hospitals())
+
+def test_json_response_keeps_headers_of_injected_response():
+    # Arrange
+    injected = Response()
+    del injected.headers["content-length"]
+    injected.headers["ETag"] = '"patients.1-abc"'
+    injected.headers["X-Next-Cursor"] = "10"
+
+    # Act
+    response = json_response(b'[{"id":1}]', injected)
+
+    # Assert
+    assert response.body == b'[{"id":1}]'
+    assert response.headers["content-type"] == "application/json"
+    assert response.headers["content-length"] == "10"
+    assert response.headers["etag"] == '"patients.1-abc"'
+    assert response.headers["x-next-cursor"] == "10"
@@ -0,0 +1,72 @@
+import pytest
+from datetime import date
+from model.dtos.hospital import HospitalCreateDTO
+from model.dtos.pagination import PaginationDTO
+from model.dtos.patient import PatientCreateDTO
+from model.entities.patient import CancerType
+from service.cache_service import LRUCacheBackend, ReadThroughCache
+from service.hospital_service import HospitalService
+from service.patient_service import PatientService
+from service.query_inspection_service import query_budget
+from service.stats_service import StatsService
+
+@pytest.fixture
+def cache():
+    return ReadThroughCache(LRUCacheBackend(max_entries=100), ttl=60)
+
+async def create_registry(db_session, cache):
+    hospitals = HospitalService(db_session, cache)
+    patients = PatientService(db_session, cache)
+    first = await hospitals.create_hospital(HospitalCreateDTO(name="First", address="A", capacity=4))
+    second = await hospitals.create_hospital(HospitalCreateDTO(name="Second", address="B", capacity=10))
+    for name, cancer_type, hospital in [("A", CancerType.lung, first), ("B", CancerType.lung, first), ("C", CancerType.breast, second), ("D", None, second), ("E", None, None)]:
+        patient = await patients.create_patient(PatientCreateDTO(name=name, age=50, oncological=cancer_type is not None, birth_date=date(1975, 1, 1), cancer_type=cancer_type))
+        if hospital is not None:
+            await hospitals.add_patient_to_hospital(hospital.id, patient.id)
+    return first, second
+
+@pytest.mark.asyncio
+async def test_registry_stats(db_session, cache):
+    # Arrange
+    await create_registry(db_session, cache)
+
+    # Act
+    stats = await StatsService(db_session, cache).get_registry_stats()
+
+    # Assert
+    assert (stats.hospitals, stats.total_capacity) == (2, 14)
+    assert (stats.patients, stats.assigned_patients, stats.unassigned_patients) == (5, 4, 1)
+    assert stats.oncological_patients == 3
+    assert stats.occupancy_rate == round(4 / 14, 4)
+    assert [(entry.cancer_type, entry.patients) for entry in stats.by_cancer_type] == [(CancerType.lung, 2), (CancerType.breast, 1)]
+
+@pytest.mark.asyncio
+async def test_hospital_stats_page(db_session, cache):
+    # Arrange
+    first, second = await create_registry(db_session, cache)
+
+    # Act
+    page = await StatsService(db_session, cache).get_hospital_stats(PaginationDTO(limit=1, cursor=first.id))
+
+    # Assert
+    assert len(page) == 1
+    assert page[0].id == second.id
+    assert (page[0].patients, page[0].free_beds, page[0].occupancy_rate) == (2, 8, 0.2)
+    assert page[0].by_cancer_type == {CancerType.breast: 1}
+
+@pytest.mark.asyncio
+async def test_stats_cached_until_data_changes(db_session, cache):
+    # Arrange
+    first, _ = await create_registry(db_session, cache)
+    service = StatsService(db_session, cache)
+    await service.get_registry_stats()
+
+    # Act
+    with query_budget(1):  # only the version lookup
+        cached = await service.get_registry_stats()
+    await HospitalService(db_session, cache).delete_hospital(first.id)
+    recomputed = await service.get_registry_stats()
+
+    # Assert
+    assert cached.assigned_patients == 4
+    assert (recomputed.hospitals, recomputed.assigned_patients) == (1, 2)